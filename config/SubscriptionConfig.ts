@@ -27,6 +27,9 @@ export const subscriptionConfig = (): ISubscriptionConfig => {
     JIRA_DOMAIN: string;
     RESILIENCY_ENABLED: boolean;
     JIRA_POLLING_FREQUENCY: number;
+    JIRA_POLLING_MAX_INTERVAL: number;
+    JIRA_WEBHOOK_ENABLED: boolean;
+    JIRA_WEBHOOK_FALLBACK_POLLING_SECONDS: number;
   } = {
     SUBSCRIPTION_DEFAULT_APPROVER_ID: '*',
     WORKFLOW_TYPE: 'JIRA',
@@ -34,6 +37,9 @@ export const subscriptionConfig = (): ISubscriptionConfig => {
     JIRA_DOMAIN: '*',
     RESILIENCY_ENABLED: false,
     JIRA_POLLING_FREQUENCY: 60,
+    JIRA_POLLING_MAX_INTERVAL: 3600,
+    JIRA_WEBHOOK_ENABLED: false,
+    JIRA_WEBHOOK_FALLBACK_POLLING_SECONDS: 3600,
   };
   return environmentMapper;
 };
\ No newline at end of file
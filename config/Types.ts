@@ -31,5 +31,10 @@ export interface ISubscriptionConfig {
   readonly JIRA_DOMAIN: string;
   RESILIENCY_ENABLED: boolean;
   JIRA_POLLING_FREQUENCY: number;
+  // Upper bound in seconds of the adaptive polling interval, polls of inactive issues back off from JIRA_POLLING_FREQUENCY up to it
+  JIRA_POLLING_MAX_INTERVAL: number;
+  // Complete waiting tasks from Jira webhooks, polling then only runs every JIRA_WEBHOOK_FALLBACK_POLLING_SECONDS (requires RESILIENCY_ENABLED)
+  JIRA_WEBHOOK_ENABLED: boolean;
+  JIRA_WEBHOOK_FALLBACK_POLLING_SECONDS: number;
 }
 
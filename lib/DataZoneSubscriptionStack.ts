@@ -27,6 +27,7 @@ import {
   RemovalPolicy,
 } from 'aws-cdk-lib';
 import * as cdk from 'aws-cdk-lib';
+import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as events from 'aws-cdk-lib/aws-events';
 import * as targets from 'aws-cdk-lib/aws-events-targets';
 import * as iam from 'aws-cdk-lib/aws-iam';
@@ -83,6 +84,7 @@ export class DataZoneSubscriptionStack extends cdk.Stack {
           'datazone:GetProject',
           'datazone:GetSubscriptionRequestDetails',
           'datazone:getUserProfile',
+          'datazone:GetListing',
         ],
         resources: [`arn:aws:datazone:${this.region}:${this.account}:domain/${props.domainId}`],
       }),
@@ -188,6 +190,9 @@ export class DataZoneSubscriptionStack extends cdk.Stack {
         JIRA_PROJECT_KEY: subscriptionConfigForStage.JIRA_PROJECT_KEY,
         JIRA_ISSUETYPE_ID: '10004', // Task id
         JIRA_SECRET_ARN: secret.secretArn,
+        // the wait between two polls of an issue grows from the min to the max interval while the issue sees no activity
+        POLLING_MIN_SECONDS: subscriptionConfigForStage.JIRA_POLLING_FREQUENCY.toString(),
+        POLLING_MAX_SECONDS: subscriptionConfigForStage.JIRA_POLLING_MAX_INTERVAL.toString(),
       },
       logGroup: createGetIssueLogGroup,
     });
@@ -310,7 +315,6 @@ export class DataZoneSubscriptionStack extends cdk.Stack {
     // Load from file and replace ARN placeholders
     let stepFunctionDefinitionJson = readFileSync(sfnConfigFile, 'utf-8');
     stepFunctionDefinitionJson = stepFunctionDefinitionJson.replace(new RegExp('\\$\\{ChangeSubscriptionStatusLambdaARN\\}', 'g'), this.changeSubscriptionStatusFunction.functionArn);
-    stepFunctionDefinitionJson = stepFunctionDefinitionJson.replace(new RegExp('\\"\\$\\{jiraPollingFrequency\\}\\"', 'g'), subscriptionConfigForStage.JIRA_POLLING_FREQUENCY.toString());
 
     // "${JiraResiliencyQueueARN}",
     if (subscriptionConfigForStage.RESILIENCY_ENABLED) {
@@ -387,9 +391,25 @@ export class DataZoneSubscriptionStack extends cdk.Stack {
           ],
         }),
       );
+      // A failed batch is delivered again as a whole, the issues already created by its records are remembered in this table
+      const idempotencyTable = new dynamodb.Table(this, 'JiraIdempotencyTable', {
+        partitionKey: { name: 'subscription_req_id', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        encryption: dynamodb.TableEncryption.AWS_MANAGED,
+        timeToLiveAttribute: 'expires_at',
+        pointInTimeRecovery: true,
+        removalPolicy: RemovalPolicy.DESTROY,
+      });
+      idempotencyTable.grantReadWriteData(createGetIssueExecRole);
+      this.createGetIssueFunction.addEnvironment('IDEMPOTENCY_STORE_TYPE', 'DYNAMODB');
+      this.createGetIssueFunction.addEnvironment('IDEMPOTENCY_TABLE_NAME', idempotencyTable.tableName);
+      // entries are kept as long as the queue retains its messages
+      this.createGetIssueFunction.addEnvironment('IDEMPOTENCY_TTL_SECS', Duration.hours(24).toSeconds().toString());
+
       // allow the function to be triggered by the SQS queue
+      // the function reports the records it could not process, e.g. when running out of time, only those are delivered again
       this.createGetIssueFunction .addEventSource(
-        new SqsEventSource(resiliencyQueue, { batchSize: 5 }),
+        new SqsEventSource(resiliencyQueue, { batchSize: 5, reportBatchItemFailures: true }),
       );
 
       // add SQS permissions to the step function
@@ -417,6 +437,80 @@ export class DataZoneSubscriptionStack extends cdk.Stack {
       // add the queue arn to the sfn definition
       stepFunctionDefinitionJson = stepFunctionDefinitionJson.replace(new RegExp('\\$\\{JiraResiliencyQueueARN\\}', 'g'), resiliencyQueue.queueUrl);
 
+      /*****
+        Jira webhook
+        Pending issues park their task token in a table, the webhook lambda completes the task when Jira reports a change.
+        A parked task times out after the fallback polling period and the step function polls the issue again.
+      ******/
+      let jiraStatusTaskTimeout = 86400;
+      if (subscriptionConfigForStage.JIRA_WEBHOOK_ENABLED) {
+        jiraStatusTaskTimeout = subscriptionConfigForStage.JIRA_WEBHOOK_FALLBACK_POLLING_SECONDS;
+
+        const taskTokenTable = new dynamodb.Table(this, 'JiraTaskTokenTable', {
+          partitionKey: { name: 'issue_key', type: dynamodb.AttributeType.STRING },
+          billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+          encryption: dynamodb.TableEncryption.AWS_MANAGED,
+          timeToLiveAttribute: 'expires_at',
+          pointInTimeRecovery: true,
+          removalPolicy: RemovalPolicy.DESTROY,
+        });
+        taskTokenTable.grantReadWriteData(createGetIssueExecRole);
+
+        // Secret to configure on the Jira webhook, Jira signs every delivery with it
+        const webhookSecret = new secretsmanager.Secret(this, 'JiraWebhookSecret', {
+          description: 'Secret shared with the Jira webhook. Jira signs every webhook delivery with it in the X-Hub-Signature header.',
+          generateSecretString: {
+            excludePunctuation: true,
+            passwordLength: 32,
+          },
+        });
+        webhookSecret.grantRead(createGetIssueExecRole);
+        NagSuppressions.addResourceSuppressions(webhookSecret, [{
+          id: 'AwsSolutions-SMG4',
+          reason: 'The webhook secret is also configured in Jira, its rotation cannot be controlled by us. Suppress this warning.',
+        }], true);
+
+        const taskTokenEnvironment: { [key: string]: string } = {
+          TASK_TOKEN_STORE_TYPE: 'DYNAMODB',
+          TASK_TOKEN_TABLE_NAME: taskTokenTable.tableName,
+          TASK_TOKEN_TTL_SECS: jiraStatusTaskTimeout.toString(),
+        };
+        for (const [key, value] of Object.entries(taskTokenEnvironment)) {
+          this.createGetIssueFunction.addEnvironment(key, value);
+        }
+
+        // The webhook lambda reads the issue status from Jira, it shares the role allowed to read the Jira credentials
+        const webhookLambdaName = 'dataZone-jira-webhook';
+        const webhookLogGroup = this.createLogGroup(webhookLambdaName);
+        const webhookFunction = new aws_lambda.Function(this, webhookLambdaName, {
+          functionName: webhookLambdaName,
+          runtime: aws_lambda.Runtime.PYTHON_3_12,
+          role: createGetIssueExecRole,
+          code: assetCode,
+          handler: 'handler_jira_webhook.lambda_handler',
+          timeout: Duration.seconds(30),
+          memorySize: 128,
+          environment: {
+            WORKFLOW_TYPE: subscriptionConfigForStage.WORKFLOW_TYPE,
+            JIRA_DOMAIN: subscriptionConfigForStage.JIRA_DOMAIN,
+            JIRA_PROJECT_KEY: subscriptionConfigForStage.JIRA_PROJECT_KEY,
+            JIRA_ISSUETYPE_ID: '10004', // Task id
+            JIRA_SECRET_ARN: secret.secretArn,
+            JIRA_WEBHOOK_SECRET_ARN: webhookSecret.secretArn,
+            ...taskTokenEnvironment,
+          },
+          logGroup: webhookLogGroup,
+        });
+        webhookLogGroup.grantWrite(webhookFunction);
+
+        // Jira can not sign requests with AWS credentials, deliveries are authenticated with the webhook secret instead
+        const webhookUrl = webhookFunction.addFunctionUrl({
+          authType: aws_lambda.FunctionUrlAuthType.NONE,
+        });
+        new cdk.CfnOutput(this, 'JiraWebhookUrl', { value: webhookUrl.url });
+      }
+      stepFunctionDefinitionJson = stepFunctionDefinitionJson.replace(new RegExp('\\"\\$\\{jiraStatusTaskTimeout\\}\\"', 'g'), jiraStatusTaskTimeout.toString());
+
     } else {
       // If the resiliency is not enabled, then the function create and get issue is directly called by the step function
       stepFunctionDefinitionJson = stepFunctionDefinitionJson.replace(new RegExp('\\$\\{CreateGetIssueLambdaARN\\}', 'g'), this.createGetIssueFunction.functionArn);
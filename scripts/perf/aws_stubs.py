@@ -0,0 +1,180 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Stubs the AWS APIs called by the handlers: DataZone, STS, Step Functions and Secrets Manager.
+A responder can be replaced through the responders dict, e.g. to route the Step Functions callbacks to a simulator.
+The details of a subscription request list one generic listing per listings_per_request, or the listings of its event once added with add_subscription_request.
+
+The stubs hook into botocore's before-call event. The boto3 clients go through the whole botocore call path,
+parameter validation and serialization included, but no request leaves the process. Every call is counted per
+operation and answered after a fixed latency.
+
+Call install() before the handler modules are imported, their module level clients have to be created on a stubbed session.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import boto3.session
+
+SAMPLE_FORMS = {
+    'DataSourceReferenceForm': {'dataSourceIdentifier': {
+        'GlueConfigurationForm': {'accountId': '111122223333'},
+        'DataSourceCommonForm': {'type': 'GLUE'},
+    }},
+    'GlueTableForm': {
+        'region': 'us-east-1',
+        'tableName': 'orders',
+        'tableArn': 'arn:aws:glue:us-east-1:111122223333:table/sales/orders',
+        'sourceLocation': 's3://bench-bucket/orders/',
+    },
+}
+
+
+class StubHttpResponse:
+    '''Minimal stand-in for the botocore HTTP response, botocore only checks the status code of short-circuited calls.'''
+    def __init__(self) -> None:
+        self.status_code = 200
+        self.headers = {}
+        self.content = b''
+
+
+class AwsApiStubs:
+    '''Answers the stubbed AWS operations in process and counts the calls by "<service>.<Operation>".'''
+    def __init__(self, latency_secs=0.0, jira_admin='bench@example.com', jira_token='bench-token', listings_per_request=1) -> None:
+        self.latency_secs = latency_secs
+        self.listings_per_request = listings_per_request
+        self.subscription_requests = {}
+        self.call_counts = Counter()
+        self.lock = threading.Lock()
+        self.responders = {
+            ('datazone', 'GetProject'): lambda params: {
+                'id': params['identifier'], 'domainId': params['domainIdentifier'], 'name': f"project-{params['identifier']}",
+            },
+            ('datazone', 'GetUserProfile'): lambda params: {
+                'type': 'SSO', 'details': {'sso': {'username': f"{params['userIdentifier']}@example.com"}},
+            },
+            ('datazone', 'GetSubscriptionRequestDetails'): self.__subscription_request_details,
+            ('datazone', 'GetListing'): lambda params: {
+                'id': params['identifier'], 'listingRevision': params.get('listingRevision', '1'),
+                'item': {'assetListing': {'forms': json.dumps(SAMPLE_FORMS)}},
+            },
+            ('datazone', 'AcceptSubscriptionRequest'): lambda params: {
+                'id': params['identifier'], 'domainId': params['domainIdentifier'], 'status': 'ACCEPTED', 'decisionComment': params.get('decisionComment'),
+            },
+            ('datazone', 'RejectSubscriptionRequest'): lambda params: {
+                'id': params['identifier'], 'domainId': params['domainIdentifier'], 'status': 'REJECTED', 'decisionComment': params.get('decisionComment'),
+            },
+            ('sts', 'AssumeRole'): self.__assume_role,
+            ('stepfunctions', 'SendTaskSuccess'): lambda params: {},
+            ('stepfunctions', 'SendTaskFailure'): lambda params: {},
+            ('secretsmanager', 'GetSecretValue'): lambda params: {
+                'ARN': params['SecretId'], 'Name': 'jira', 'SecretString': json.dumps({'Admin': jira_admin, 'Token': jira_token}),
+            },
+        }
+
+    def install(self):
+        '''Stubs the default boto3 session and every boto3 session created from now on, e.g. for assumed roles.'''
+        # dummy credentials keep botocore from probing the instance metadata endpoint
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'AKIABENCHMARK')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+        stubs = self
+
+        class StubbedSession(boto3.session.Session):
+            def __init__(self, *args, **kwargs) -> None:
+                super().__init__(*args, **kwargs)
+                stubs.register(self)
+
+        boto3.Session = StubbedSession
+        boto3.session.Session = StubbedSession
+        boto3.setup_default_session()
+        return self
+
+    def register(self, session):
+        session.events.register('before-parameter-build', self.__keep_api_params)
+        session.events.register('before-call', self.__respond)
+
+    def add_subscription_request(self, event):
+        '''Answers the details of the subscription request of a DataZone event with the listings the event names.'''
+        with self.lock:
+            self.subscription_requests[event['detail']['metadata']['id']] = event['detail']['data']['subscribedListings']
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.call_counts.values())
+
+    def __keep_api_params(self, params, context, **kwargs):
+        # the before-call event only sees the serialized request, the responders need the original parameters
+        context['stub_api_params'] = params
+
+    def __respond(self, model, context, **kwargs):
+        service_name = model.service_model.service_name
+        responder = self.responders.get((service_name, model.name))
+        if responder is None:
+            raise NotImplementedError(f"No stub for {service_name}.{model.name}, the benchmark must not call AWS.")
+
+        with self.lock:
+            self.call_counts[f'{service_name}.{model.name}'] += 1
+        if self.latency_secs:
+            time.sleep(self.latency_secs)
+        response = responder(context.get('stub_api_params', {}))
+        response['ResponseMetadata'] = {'HTTPStatusCode': 200, 'RetryAttempts': 0}
+        return StubHttpResponse(), response
+
+    def __subscription_request_details(self, params):
+        with self.lock:
+            subscribed_listings = self.subscription_requests.get(params['identifier'])
+        if subscribed_listings is None:
+            subscribed_listings = [
+                {'id': f'lst_bench_{position}', 'version': '1', 'name': f'orders_{position}', 'ownerProjectName': 'producer'}
+                for position in range(self.listings_per_request)
+            ]
+        return {
+            'id': params['identifier'],
+            'domainId': params['domainIdentifier'],
+            'requestReason': 'benchmark',
+            'subscribedListings': [
+                {
+                    'id': listing['id'],
+                    'revision': listing.get('version', '1'),
+                    'name': listing.get('name', listing['id']),
+                    'ownerProjectName': listing.get('ownerProjectName', f"project-{listing.get('ownerProjectId')}"),
+                    'item': {'assetListing': {'forms': json.dumps(SAMPLE_FORMS)}},
+                }
+                for listing in subscribed_listings
+            ],
+        }
+
+    def __assume_role(self, params):
+        return {
+            'Credentials': {
+                'AccessKeyId': 'ASIABENCHMARK',
+                'SecretAccessKey': 'benchmark',
+                'SessionToken': 'benchmark',
+                'Expiration': datetime.now(timezone.utc) + timedelta(hours=1),
+            },
+            'AssumedRoleUser': {'AssumedRoleId': 'AROABENCHMARK:bench', 'Arn': params['RoleArn']},
+        }
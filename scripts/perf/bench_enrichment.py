@@ -0,0 +1,169 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+Benchmarks DataZoneSubscription.get_subscription_info against a DataZone client stub with fixed latencies.
+Compares the concurrent enrichment with the three lookups called one after another, and with warm metadata caches.
+With --detached-forms the listings come without their forms, every listing is then resolved with a GetListing call.
+
+Usage: python scripts/perf/bench_enrichment.py [--iterations 20] [--project-ms 80] [--user-ms 60] [--details-ms 120]
+                                               [--listings 1] [--listing-ms 60] [--detached-forms]
+"""
+import argparse
+import copy
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'datazone-subscription'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+# the EMF lines of every stubbed call would drown the results
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+from data_zone_subscription import DataZoneSubscription
+
+
+SAMPLE_EVENT = {
+    'time': '2024-08-21T10:00:00Z',
+    'detail': {
+        'metadata': {'domain': 'dzd_bench', 'id': 'subreq_bench', 'owningProjectId': 'prj_consumer'},
+        'data': {'requesterId': 'usr_bench', 'subscribedListings': [{'ownerProjectId': 'prj_producer'}]},
+    },
+}
+
+SAMPLE_FORMS = {
+    'DataSourceReferenceForm': {'dataSourceIdentifier': {
+        'GlueConfigurationForm': {'accountId': '111122223333'},
+        'DataSourceCommonForm': {'type': 'GLUE'},
+    }},
+    'GlueTableForm': {
+        'region': 'us-east-1',
+        'tableName': 'orders',
+        'tableArn': 'arn:aws:glue:us-east-1:111122223333:table/sales/orders',
+        'sourceLocation': 's3://bench-bucket/orders/',
+    },
+}
+
+
+cold_requests = itertools.count()
+
+
+class SlowDataZoneClientStub:
+    '''Answers the DataZone calls made during enrichment after a fixed latency.'''
+    def __init__(self, project_secs, user_secs, details_secs, listings, listing_secs, detached_forms) -> None:
+        self.project_secs = project_secs
+        self.user_secs = user_secs
+        self.details_secs = details_secs
+        self.listings = listings
+        self.listing_secs = listing_secs
+        self.detached_forms = detached_forms
+
+    def get_project(self, domainIdentifier, identifier):
+        time.sleep(self.project_secs)
+        return {'name': f'project-{identifier}'}
+
+    def get_user_profile(self, domainIdentifier, type, userIdentifier):
+        time.sleep(self.user_secs)
+        return {'type': 'SSO', 'details': {'sso': {'username': f'{userIdentifier}@example.com'}}}
+
+    def get_subscription_request_details(self, domainIdentifier, identifier):
+        time.sleep(self.details_secs)
+        # listings are distinct per request, so that the listings cache stays cold
+        return {
+            'requestReason': 'benchmark',
+            'subscribedListings': [
+                {
+                    'id': f'lst_{identifier}_{position}',
+                    'revision': '1',
+                    'name': f'orders_{position}',
+                    'ownerProjectName': 'producer',
+                    'item': {'assetListing': {} if self.detached_forms else {'forms': json.dumps(SAMPLE_FORMS)}},
+                }
+                for position in range(self.listings)
+            ],
+        }
+
+    def get_listing(self, domainIdentifier, identifier, listingRevision):
+        time.sleep(self.listing_secs)
+        return {'item': {'assetListing': {'forms': json.dumps(SAMPLE_FORMS)}}}
+
+
+def enrich_sequentially(dz_subscription):
+    # the lookups as they were called before they ran concurrently
+    dz_subscription._DataZoneSubscription__get_project_name_from_id()
+    dz_subscription._DataZoneSubscription__get_user_from_dz_id('SSO')
+    dz_subscription._DataZoneSubscription__get_subscription_details()
+
+
+def make_event(warm_cache):
+    # distinct projects, users and listings on every cold request keep the metadata caches cold, across the measured variants too
+    event = copy.deepcopy(SAMPLE_EVENT)
+    if not warm_cache:
+        sequence = next(cold_requests)
+        event['detail']['metadata']['owningProjectId'] += f'_{sequence}'
+        event['detail']['metadata']['id'] += f'_{sequence}'
+        event['detail']['data']['requesterId'] += f'_{sequence}'
+    return event
+
+
+def measure(enrich, client, iterations, warm_cache=False):
+    durations = []
+    for _ in range(iterations):
+        dz_subscription = DataZoneSubscription.fromEvent(make_event(warm_cache))
+        dz_subscription.dz_client = client
+        start = time.perf_counter()
+        enrich(dz_subscription)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--project-ms', type=float, default=80)
+    parser.add_argument('--user-ms', type=float, default=60)
+    parser.add_argument('--details-ms', type=float, default=120)
+    parser.add_argument('--listings', type=int, default=1, help='listings per subscription request')
+    parser.add_argument('--listing-ms', type=float, default=60)
+    parser.add_argument('--detached-forms', action='store_true', help='return the listings without their forms')
+    args = parser.parse_args()
+
+    client = SlowDataZoneClientStub(
+        args.project_ms / 1000, args.user_ms / 1000, args.details_ms / 1000, args.listings, args.listing_ms / 1000, args.detached_forms
+    )
+
+    results = {
+        'sequential': measure(enrich_sequentially, client, args.iterations),
+        'concurrent': measure(DataZoneSubscription.get_subscription_info, client, args.iterations),
+        'warm cache': measure(DataZoneSubscription.get_subscription_info, client, args.iterations, warm_cache=True),
+    }
+
+    print(f"Stubbed latencies: get_project={args.project_ms}ms get_user_profile={args.user_ms}ms get_subscription_request_details={args.details_ms}ms")
+    print(f"{args.listings} listings per request, forms {'fetched with get_listing=' + str(args.listing_ms) + 'ms' if args.detached_forms else 'in the request details'}")
+    for name, durations in results.items():
+        print(f"{name:>10}: p50={statistics.median(durations) * 1000:.1f}ms max={max(durations) * 1000:.1f}ms over {len(durations)} runs")
+    speedup = statistics.median(results['sequential']) / statistics.median(results['concurrent'])
+    print(f"   speedup: {speedup:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
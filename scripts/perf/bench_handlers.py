@@ -0,0 +1,236 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+End-to-end throughput benchmark of the create-get-issue-status handlers.
+
+The handlers run unchanged with the JIRA workflow type against the local Jira stand-in of local_jira_server.py,
+while DataZone, STS, Step Functions and Secrets Manager are answered by the botocore stubs of aws_stubs.py.
+The resilient handler is driven with synthetic SQS batches of every requested size, the step function handler with one command per invocation.
+Both run in one warm process, as in a reused Lambda container.
+
+Reported per row: records per second, p50/p99 invocation latency, Jira and AWS API calls per record, and records not completed.
+
+Usage: python scripts/perf/bench_handlers.py [--batch-sizes 1,5,10] [--batches 20] [--create-ratio 0.5]
+                                             [--jira-latency-ms 50] [--aws-latency-ms 20] [--rate-429 0.0] [--rate-5xx 0.0]
+                                             [--listings 1] [--timeout-ms 0]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'datazone-subscription'))
+
+from aws_stubs import AwsApiStubs
+from local_jira_server import LocalJiraServer
+
+PROJECT_KEY = 'DZ'
+# Requests come from a few projects and users, as in a real domain, so the metadata caches see repeated keys
+DISTINCT_PROJECTS = 10
+DISTINCT_USERS = 25
+
+message_ids = itertools.count(1)
+command_mix = random.Random(42)
+
+
+def configure_handlers(jira_server, args):
+    # the handler modules read their configuration at import time
+    os.environ.update({
+        'SUBSCRIPTION_DEFAULT_APPROVER_ID': 'bench-approver',
+        'WORKFLOW_TYPE': 'JIRA',
+        'JIRA_DOMAIN': jira_server.domain,
+        'JIRA_URL_SCHEME': 'http',
+        'JIRA_PROJECT_KEY': PROJECT_KEY,
+        'JIRA_ISSUETYPE_ID': '10001',
+        'JIRA_SECRET_ARN': 'arn:aws:secretsmanager:us-east-1:111122223333:secret:bench-jira',
+        'JIRA_RATE_LIMIT_PER_SEC': str(args.jira_rate_limit),
+        'JIRA_RATE_LIMIT_MAX_PER_SEC': str(max(args.jira_rate_limit, 10.0)),
+        'JIRA_RATE_LIMIT_BURST': str(args.jira_rate_limit_burst),
+        'TASK_TOKEN_STORE_TYPE': 'NONE',
+    })
+
+
+def make_create_payload(sequence):
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'detail': {
+            'metadata': {'domain': 'dzd_bench', 'id': f'subreq_{sequence}', 'owningProjectId': f'prj_{sequence % DISTINCT_PROJECTS}'},
+            'data': {'requesterId': f'usr_{sequence % DISTINCT_USERS}', 'subscribedListings': [{'ownerProjectId': 'prj_producer'}]},
+        },
+    }
+
+
+def make_get_payload(sequence, issue_key):
+    created_at = datetime.now(timezone.utc).isoformat()
+    return {
+        'statusCode': 200,
+        'domain_id': 'dzd_bench',
+        'subscription_req_id': f'subreq_{sequence}',
+        'issue_key': issue_key,
+        'issue_created_at': created_at,
+        'status_changed_at': created_at,
+    }
+
+
+def make_commands(count, create_ratio, issue_keys):
+    commands = []
+    for _ in range(count):
+        sequence = next(message_ids)
+        if command_mix.random() < create_ratio:
+            commands.append((sequence, 'CREATE_ISSUE', make_create_payload(sequence)))
+        else:
+            commands.append((sequence, 'GET_ISSUE_STATUS', make_get_payload(sequence, issue_keys[sequence % len(issue_keys)])))
+    return commands
+
+
+def make_sqs_event(commands):
+    return {'Records': [
+        {
+            'messageId': f'msg-{sequence}',
+            'attributes': {'MessageGroupId': f'group-{sequence}'},
+            'body': json.dumps({'TaskToken': f'token-{sequence}', 'Command': command, 'Payload': payload}),
+            'eventSource': 'aws:sqs',
+        }
+        for sequence, command, payload in commands
+    ]}
+
+
+class LambdaContext:
+    '''Lambda context of one invocation, only the remaining time is used by the handlers.'''
+    def __init__(self, timeout_ms) -> None:
+        self.deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def percentile(durations, pct):
+    if len(durations) == 1:
+        return durations[0]
+    return statistics.quantiles(durations, n=100, method='inclusive')[pct - 1]
+
+
+def run(name, invocations, jira_server, aws_stubs, verbose):
+    '''Calls every invocation in turn. Each returns the number of records it handled and how many of them were not completed.'''
+    durations = []
+    records = 0
+    not_completed = 0
+    jira_calls = jira_server.total_requests()
+    aws_calls = aws_stubs.total_calls()
+
+    start = time.perf_counter()
+    for invocation in invocations:
+        invocation_start = time.perf_counter()
+        # the handlers also print some diagnostics
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+            handled, failed = invocation()
+        durations.append(time.perf_counter() - invocation_start)
+        records += handled
+        not_completed += failed
+    elapsed = time.perf_counter() - start
+
+    jira_calls = jira_server.total_requests() - jira_calls
+    aws_calls = aws_stubs.total_calls() - aws_calls
+    print(
+        f"{name:>22} | {records / elapsed:9.1f} | {percentile(durations, 50) * 1000:8.1f} | {percentile(durations, 99) * 1000:8.1f} | "
+        f"{jira_calls / records:10.2f} | {aws_calls / records:9.2f} | {not_completed:6}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', default='1,5,10', help='comma separated SQS batch sizes for the resilient handler')
+    parser.add_argument('--batches', type=int, default=20, help='invocations per batch size')
+    parser.add_argument('--create-ratio', type=float, default=0.5, help='share of CREATE_ISSUE commands, the others are GET_ISSUE_STATUS')
+    parser.add_argument('--jira-latency-ms', type=float, default=50)
+    parser.add_argument('--aws-latency-ms', type=float, default=20)
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of Jira requests answered with 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='share of Jira requests answered with 503')
+    parser.add_argument('--jira-rate-limit', type=float, default=1000.0, help='client side Jira requests per second, lower it to include the pacing')
+    parser.add_argument('--jira-rate-limit-burst', type=int, default=1000)
+    parser.add_argument('--listings', type=int, default=1, help='listings per subscription request')
+    parser.add_argument('--timeout-ms', type=float, default=0, help='lambda timeout of the resilient handler, 0 for no deadline')
+    parser.add_argument('--verbose', action='store_true', help='show the handler logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    jira_server = LocalJiraServer(
+        latency_secs=args.jira_latency_ms / 1000, rate_429=args.rate_429, rate_5xx=args.rate_5xx, project_key=PROJECT_KEY
+    ).start()
+    aws_stubs = AwsApiStubs(latency_secs=args.aws_latency_ms / 1000, listings_per_request=args.listings).install()
+    configure_handlers(jira_server, args)
+
+    import handler_create_get_issue_status
+    import handler_create_get_issue_status_resilient
+
+    # the polled issues: half still pending, half resolved
+    issue_keys = jira_server.seed_issues(100)
+    for issue_key in issue_keys[::2]:
+        jira_server.set_status(issue_key, 'Done')
+
+    def resilient_invocation(batch_size):
+        def invoke():
+            event = make_sqs_event(make_commands(batch_size, args.create_ratio, issue_keys))
+            try:
+                context = LambdaContext(args.timeout_ms) if args.timeout_ms else None
+                response = handler_create_get_issue_status_resilient.lambda_handler(event, context)
+            except Exception:
+                # an unreachable Jira fails the whole batch, SQS delivers every record again
+                return batch_size, batch_size
+            return batch_size, len(response['batchItemFailures'])
+        return invoke
+
+    def step_function_invocation():
+        [(_, command, payload)] = make_commands(1, args.create_ratio, issue_keys)
+        try:
+            handler_create_get_issue_status.lambda_handler({'Command': command, 'Payload': payload}, None)
+        except Exception:
+            # the step function retries or fails the task
+            return 1, 1
+        return 1, 0
+
+    print(
+        f"Jira latency={args.jira_latency_ms}ms 429={args.rate_429:.0%} 5xx={args.rate_5xx:.0%}, AWS latency={args.aws_latency_ms}ms, "
+        f"CREATE_ISSUE share={args.create_ratio:.0%}, {args.batches} invocations per row"
+    )
+    print(f"{'handler':>22} | {'records/s':>9} | {'p50 ms':>8} | {'p99 ms':>8} | {'jira/rec':>10} | {'aws/rec':>9} | {'failed':>6}")
+    run('step function', [step_function_invocation] * args.batches, jira_server, aws_stubs, args.verbose)
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        run(f'resilient batch={batch_size}', [resilient_invocation(batch_size)] * args.batches, jira_server, aws_stubs, args.verbose)
+
+    print(f"Jira requests by endpoint: {dict(jira_server.request_counts)}")
+    print(f"Jira connections opened: {jira_server.connection_count} for {jira_server.total_requests()} requests")
+    print(f"AWS calls by operation: {dict(aws_stubs.call_counts)}")
+    jira_server.stop()
+
+
+if __name__ == '__main__':
+    main()
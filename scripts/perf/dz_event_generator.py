@@ -0,0 +1,314 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+Generates and replays DataZone "Subscription Request Created" EventBridge events, one JSON event per line.
+
+generate writes synthetic events over a catalog of domains, projects, users and listings. Projects and users are picked
+with a Zipf-like popularity, so a few of them make most of the requests as in a real domain. Each request subscribes to
+1 to --max-listings-per-request listings. Arrivals are poisson, uniform or in bursts, at --rate events per second on average.
+
+replay sends the events of a JSONL file, generated or captured, to a handler at their original pace divided by --speed:
+- step-function: handler_create_get_issue_status, one CREATE_ISSUE command per invocation
+- resilient: handler_create_get_issue_status_resilient, the events already due are batched up to --batch-size records
+The handlers run against the local Jira stand-in and the botocore stubs, as in bench_handlers.py. A single invoker sends
+the events, the lag behind the schedule tells when a handler cannot keep up with the replayed rate.
+To replay the events through the state machine and its FIFO queue on a virtual clock, use sfn_simulator.py --events.
+
+Usage: python scripts/perf/dz_event_generator.py generate [--count 1000] [--domains 1] [--projects 50] [--users 200] [--listings 500]
+                                                          [--max-listings-per-request 3] [--arrival poisson] [--rate 1.0] [--output events.jsonl]
+       python scripts/perf/dz_event_generator.py replay events.jsonl [--target resilient] [--speed 10] [--batch-size 5]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+ARRIVALS = ('poisson', 'uniform', 'burst')
+DETAIL_TYPE = 'Subscription Request Created'
+ID_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def parse_event_time(event):
+    return datetime.fromisoformat(event['time'].replace('Z', '+00:00'))
+
+
+def format_event_time(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class EventGenerator:
+    '''Builds subscription request events over a fixed catalog, the same seed gives the same events.'''
+    def __init__(self, domains=1, projects=50, users=200, listings=500, max_listings_per_request=3, skew=1.0,
+                 account='111122223333', region='us-east-1', seed=42) -> None:
+        self.random = random.Random(seed)
+        self.max_listings_per_request = max_listings_per_request
+        self.account = account
+        self.region = region
+        self.sequence = itertools.count(1)
+        self.domains = [self.__identifier('dzd_') for _ in range(domains)]
+        self.projects = {domain: [self.__identifier('prj_') for _ in range(projects)] for domain in self.domains}
+        self.users = {domain: [self.__uuid() for _ in range(users)] for domain in self.domains}
+        self.listings = {
+            domain: [
+                {
+                    'id': self.__identifier('lst_'),
+                    'ownerProjectId': self.random.choice(self.projects[domain]),
+                    'version': str(self.random.randint(1, 3)),
+                    'name': f'table_{position}',
+                }
+                for position in range(listings)
+            ]
+            for domain in self.domains
+        }
+        # Zipf-like popularity: the n-th project, user or listing is picked in proportion to 1 / n^skew
+        self.project_weights = [1 / rank ** skew for rank in range(1, projects + 1)]
+        self.user_weights = [1 / rank ** skew for rank in range(1, users + 1)]
+        self.listing_weights = [1 / rank ** skew for rank in range(1, listings + 1)]
+
+    def event(self, moment):
+        domain = self.random.choice(self.domains)
+        [project] = self.random.choices(self.projects[domain], self.project_weights)
+        [user] = self.random.choices(self.users[domain], self.user_weights)
+        subscribed = {}
+        for _ in range(self.random.randint(1, self.max_listings_per_request)):
+            [listing] = self.random.choices(self.listings[domain], self.listing_weights)
+            subscribed[listing['id']] = listing
+        subscription_req_id = self.__identifier('subreq_', sequence=next(self.sequence))
+
+        return {
+            'version': '0',
+            'id': self.__uuid(),
+            'detail-type': DETAIL_TYPE,
+            'source': 'aws.datazone',
+            'account': self.account,
+            'time': format_event_time(moment),
+            'region': self.region,
+            'resources': [],
+            'detail': {
+                'version': '1',
+                'metadata': {
+                    'id': subscription_req_id,
+                    'version': '1',
+                    'typeName': 'SubscriptionRequestEntityType',
+                    'domain': domain,
+                    'user': user,
+                    'awsAccountId': self.account,
+                    'owningProjectId': project,
+                },
+                'data': {
+                    'autoApproved': False,
+                    'requesterId': user,
+                    'status': 'PENDING',
+                    'subscribedListings': list(subscribed.values()),
+                    'subscribedPrincipals': [{'id': project, 'type': 'PROJECT'}],
+                },
+            },
+        }
+
+    def __identifier(self, prefix, sequence=None):
+        # DataZone identifiers are 14 lowercase alphanumerics, the sequence keeps generated request ids unique
+        suffix = ''.join(self.random.choices(ID_ALPHABET, k=14))
+        return f'{prefix}{suffix}' if sequence is None else f'{prefix}{suffix[:8]}{sequence:06d}'
+
+    def __uuid(self):
+        return '{:08x}-{:04x}-{:04x}-{:04x}-{:012x}'.format(*(self.random.getrandbits(bits) for bits in (32, 16, 16, 16, 48)))
+
+
+def arrival_offsets(count, arrival, rate, burst_size=10, seed=42):
+    '''Returns count offsets in seconds from the first arrival, averaging rate arrivals per second.'''
+    draw = random.Random(seed)
+    offsets, offset = [], 0.0
+    for position in range(count):
+        if position:
+            if arrival == 'poisson':
+                offset += draw.expovariate(rate)
+            elif arrival == 'uniform':
+                offset += 1 / rate
+            elif arrival == 'burst' and position % burst_size == 0:
+                offset += burst_size / rate
+        offsets.append(offset)
+    return offsets
+
+
+def generate_events(generator, count, arrival, rate, start, burst_size=10, seed=42):
+    return [generator.event(start + timedelta(seconds=offset)) for offset in arrival_offsets(count, arrival, rate, burst_size, seed)]
+
+
+def read_events(path):
+    '''Reads a JSONL file of events. Returns (offset in seconds from the first event, event) pairs in time order.'''
+    with open(path) as lines:
+        events = [json.loads(line) for line in lines if line.strip()]
+    events = [event for event in events if event.get('detail-type', DETAIL_TYPE) == DETAIL_TYPE]
+    if not events:
+        return []
+    events.sort(key=parse_event_time)
+    first = parse_event_time(events[0])
+    return [((parse_event_time(event) - first).total_seconds(), event) for event in events]
+
+
+def generate(args):
+    generator = EventGenerator(
+        args.domains, args.projects, args.users, args.listings, args.max_listings_per_request, args.skew, seed=args.seed
+    )
+    start = datetime.fromisoformat(args.start) if args.start else datetime.now(timezone.utc)
+    events = generate_events(generator, args.count, args.arrival, args.rate, start, args.burst_size, args.seed)
+    with open(args.output, 'w') if args.output else contextlib.nullcontext(sys.stdout) as output:
+        for event in events:
+            output.write(json.dumps(event) + '\n')
+    if args.output:
+        span = parse_event_time(events[-1]) - parse_event_time(events[0]) if events else timedelta()
+        print(f"Wrote {len(events)} events over {span} to {args.output}")
+
+
+def replay(args):
+    # the handler harness of the benchmark, imported here so that generate does not need boto3
+    from aws_stubs import AwsApiStubs
+    from bench_handlers import LambdaContext, configure_handlers, percentile
+    from local_jira_server import LocalJiraServer
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    events = read_events(args.events)
+    if not events:
+        print(f"No {DETAIL_TYPE} events in {args.events}")
+        return
+
+    jira_server = LocalJiraServer(latency_secs=args.jira_latency_ms / 1000, rate_5xx=args.rate_5xx).start()
+    aws_stubs = AwsApiStubs(latency_secs=args.aws_latency_ms / 1000).install()
+    for _, event in events:
+        aws_stubs.add_subscription_request(event)
+    configure_handlers(jira_server, args)
+    os.environ['METRICS_ENABLED'] = 'false'
+
+    if args.target == 'step-function':
+        import handler_create_get_issue_status
+
+        def invoke(batch):
+            [(_, event)] = batch
+            handler_create_get_issue_status.lambda_handler({'Command': 'CREATE_ISSUE', 'Payload': event}, None)
+            return 0
+    else:
+        import handler_create_get_issue_status_resilient
+
+        def invoke(batch):
+            records = [
+                {
+                    'messageId': f'replay-{sequence}',
+                    'attributes': {'MessageGroupId': 'JIRA', 'ApproximateReceiveCount': '1'},
+                    'body': json.dumps({'TaskToken': f'replay-token-{sequence}', 'Command': 'CREATE_ISSUE', 'Payload': event}),
+                    'eventSource': 'aws:sqs',
+                }
+                for sequence, event in batch
+            ]
+            context = LambdaContext(args.timeout_ms) if args.timeout_ms else None
+            return len(handler_create_get_issue_status_resilient.lambda_handler({'Records': records}, context)['batchItemFailures'])
+
+    batch_size = args.batch_size if args.target == 'resilient' else 1
+    pending = [(sequence, offset / args.speed, event) for sequence, (offset, event) in enumerate(events, start=1)]
+    durations, lags, failed = [], [], 0
+    started = time.perf_counter()
+    position = 0
+    while position < len(pending):
+        due_at = pending[position][1]
+        delay = due_at - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter() - started
+        batch = []
+        while position < len(pending) and len(batch) < batch_size and pending[position][1] <= now:
+            sequence, due_at, event = pending[position]
+            lags.append(now - due_at)
+            batch.append((sequence, event))
+            position += 1
+
+        invocation_start = time.perf_counter()
+        # the handlers also print some diagnostics
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            try:
+                failed += invoke(batch)
+            except Exception:
+                failed += len(batch)
+        durations.append(time.perf_counter() - invocation_start)
+    elapsed = time.perf_counter() - started
+
+    capture_secs = events[-1][0]
+    print(f"Replayed {len(events)} events of a {timedelta(seconds=round(capture_secs))} capture at {args.speed}x into the {args.target} handler")
+    print(f"Offered {len(events) / max(capture_secs / args.speed, 1e-9):.1f} events/s, handled {len(events) / elapsed:.1f} events/s in {elapsed:.1f}s")
+    print(f"Lag behind schedule: p50 {percentile(lags, 50) * 1000:.0f}ms, max {max(lags) * 1000:.0f}ms")
+    print(
+        f"Invocations: {len(durations)}, {len(events) / len(durations):.1f} events each, "
+        f"p50 {percentile(durations, 50) * 1000:.1f}ms p99 {percentile(durations, 99) * 1000:.1f}ms, {failed} events failed"
+    )
+    print(f"Jira requests: {jira_server.total_requests() / len(events):.2f} per event {dict(jira_server.request_counts)}")
+    print(f"AWS calls: {aws_stubs.total_calls() / len(events):.2f} per event {dict(aws_stubs.call_counts)}")
+    jira_server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='write synthetic events as JSONL')
+    generate_parser.add_argument('--count', type=int, default=1000)
+    generate_parser.add_argument('--domains', type=int, default=1)
+    generate_parser.add_argument('--projects', type=int, default=50, help='projects per domain, owning the listings and subscribing to them')
+    generate_parser.add_argument('--users', type=int, default=200, help='requesters per domain')
+    generate_parser.add_argument('--listings', type=int, default=500, help='listings per domain')
+    generate_parser.add_argument('--max-listings-per-request', type=int, default=3)
+    generate_parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of the popularity, 0 for uniform picks')
+    generate_parser.add_argument('--arrival', choices=ARRIVALS, default='poisson')
+    generate_parser.add_argument('--rate', type=float, default=1.0, help='mean arrivals per second')
+    generate_parser.add_argument('--burst-size', type=int, default=10, help='events arriving together with --arrival burst')
+    generate_parser.add_argument('--start', help='ISO 8601 time of the first event, now by default')
+    generate_parser.add_argument('--seed', type=int, default=42)
+    generate_parser.add_argument('--output', help='JSONL file, stdout by default')
+
+    replay_parser = commands.add_parser('replay', help='send the events of a JSONL file to a handler')
+    replay_parser.add_argument('events', help='JSONL file of events')
+    replay_parser.add_argument('--target', choices=('step-function', 'resilient'), default='resilient')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='replay speed, 10 replays an hour of events in 6 minutes')
+    replay_parser.add_argument('--batch-size', type=int, default=5, help='records per invocation of the resilient handler at most')
+    replay_parser.add_argument('--jira-latency-ms', type=float, default=50)
+    replay_parser.add_argument('--aws-latency-ms', type=float, default=20)
+    replay_parser.add_argument('--rate-5xx', type=float, default=0.0, help='share of Jira requests answered with 503')
+    replay_parser.add_argument('--jira-rate-limit', type=float, default=1000.0, help='client side Jira requests per second')
+    replay_parser.add_argument('--jira-rate-limit-burst', type=int, default=1000)
+    replay_parser.add_argument('--timeout-ms', type=float, default=0, help='lambda timeout of the resilient handler, 0 for no deadline')
+    replay_parser.add_argument('--verbose', action='store_true', help='show the handler logs')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args)
+    else:
+        replay(args)
+
+
+if __name__ == '__main__':
+    main()
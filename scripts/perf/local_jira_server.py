@@ -0,0 +1,249 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+Local HTTP stand-in for the Jira REST API endpoints used by JiraWorkflow: issue create, bulk create, issue get and JQL search by issue keys or label
+with the enhanced search endpoint /rest/api/3/search/jql. Like Jira, a search by issue keys is rejected with 400 when one of the keys does not exist.
+Latency as well as 429 and 5xx responses can be injected. Every request is counted per endpoint, and every accepted connection.
+
+Point the handlers to it with JIRA_DOMAIN=127.0.0.1:<port> and JIRA_URL_SCHEME=http.
+
+Usage: python scripts/perf/local_jira_server.py [--port 8080] [--latency-ms 50] [--rate-429 0.0] [--rate-5xx 0.0]
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/rest/api/latest'
+SEARCH_PATH = '/rest/api/3/search/jql'
+JQL_KEYS_PATTERN = re.compile(r'key\s+in\s*\(([^)]*)\)', re.IGNORECASE)
+JQL_LABEL_PATTERN = re.compile(r'labels\s*=\s*"([^"]*)"', re.IGNORECASE)
+
+
+class LocalJiraServer:
+    '''In-memory Jira serving requests on a background thread. Issues start in status "To Do" and can be resolved with set_status.'''
+    def __init__(self, port=0, latency_secs=0.0, rate_429=0.0, rate_5xx=0.0, retry_after_secs=1, project_key='DZ') -> None:
+        self.latency_secs = latency_secs
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after_secs = retry_after_secs
+        self.project_key = project_key
+        self.issues = {}
+        self.issue_counter = 0
+        self.request_counts = Counter()
+        self.connection_count = 0
+        self.lock = threading.Lock()
+        self.random = random.Random(42)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, Nagle's algorithm would delay the body of responses on kept-alive connections
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                # called once per TCP connection, kept-alive connections serve several requests
+                super().setup()
+                with server.lock:
+                    server.connection_count += 1
+
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def domain(self):
+        return f'127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def seed_issues(self, count, status='To Do'):
+        '''Creates issues directly in the store and returns their keys.'''
+        return [self.__add_issue({'summary': 'seeded'}, status) for _ in range(count)]
+
+    def set_status(self, issue_key, status, assignee='Local Approver'):
+        with self.lock:
+            issue = self.issues[issue_key]
+            issue['status'] = status
+            issue['assignee'] = assignee
+            issue['updated'] = datetime.now(timezone.utc).isoformat()
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.request_counts.values())
+
+    def __add_issue(self, fields, status='To Do'):
+        with self.lock:
+            self.issue_counter += 1
+            issue_key = f'{self.project_key}-{self.issue_counter}'
+            self.issues[issue_key] = {
+                'id': str(10000 + self.issue_counter),
+                'fields': fields,
+                'status': status,
+                'assignee': None,
+                'updated': datetime.now(timezone.utc).isoformat(),
+            }
+            return issue_key
+
+    def __issue_resource(self, issue_key):
+        issue = self.issues[issue_key]
+        return {
+            'id': issue['id'],
+            'key': issue_key,
+            'fields': {
+                'status': {'name': issue['status']},
+                'assignee': {'displayName': issue['assignee']} if issue['assignee'] else None,
+                'updated': issue['updated'],
+            },
+        }
+
+    def handle(self, request, method):
+        url = urlparse(request.path)
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        endpoint = self.__endpoint(method, url.path)
+        with self.lock:
+            self.request_counts[endpoint] += 1
+
+        if self.latency_secs:
+            time.sleep(self.latency_secs)
+
+        draw = self.random.random()
+        if draw < self.rate_429:
+            return self.__send(request, 429, {'errorMessages': ['Rate limit exceeded']}, {'Retry-After': str(self.retry_after_secs)})
+        if draw < self.rate_429 + self.rate_5xx:
+            return self.__send(request, 503, {'errorMessages': ['Service unavailable']})
+
+        status, payload = self.__route(endpoint, url, body)
+        self.__send(request, status, payload)
+
+    def __endpoint(self, method, path):
+        if path.rstrip('/') == SEARCH_PATH:
+            return f'{method} search/jql'
+        if not path.startswith(API_PREFIX):
+            return f'{method} unknown'
+        resource = path[len(API_PREFIX):].rstrip('/')
+        if resource == '/issue':
+            return 'POST issue' if method == 'POST' else f'{method} unknown'
+        if resource == '/issue/bulk':
+            return 'POST issue/bulk'
+        if resource.startswith('/issue/'):
+            return f'{method} issue/{{key}}'
+        return f'{method} unknown'
+
+    def __route(self, endpoint, url, body):
+        if endpoint == 'POST issue':
+            fields = json.loads(body or b'{}').get('fields', {})
+            issue_key = self.__add_issue(fields)
+            return 201, {'id': self.issues[issue_key]['id'], 'key': issue_key, 'self': f'{API_PREFIX}/issue/{issue_key}'}
+
+        if endpoint == 'POST issue/bulk':
+            issues, errors = [], []
+            for element, update in enumerate(json.loads(body or b'{}').get('issueUpdates', [])):
+                fields = update.get('fields', {})
+                if not fields.get('summary'):
+                    errors.append({'status': 400, 'elementErrors': {'errors': {'summary': 'You must specify a summary of the issue.'}}, 'failedElementNumber': element})
+                    continue
+                issue_key = self.__add_issue(fields)
+                issues.append({'id': self.issues[issue_key]['id'], 'key': issue_key, 'self': f'{API_PREFIX}/issue/{issue_key}'})
+            return 201 if issues else 400, {'issues': issues, 'errors': errors}
+
+        if endpoint == 'GET issue/{key}':
+            issue_key = url.path.rstrip('/').rsplit('/', 1)[1]
+            with self.lock:
+                if issue_key not in self.issues:
+                    return 404, {'errorMessages': ['Issue does not exist or you do not have permission to see it.']}
+                return 200, self.__issue_resource(issue_key)
+
+        if endpoint == 'GET search/jql':
+            jql = parse_qs(url.query).get('jql', [''])[0]
+            keys_match = JQL_KEYS_PATTERN.search(jql)
+            label_match = JQL_LABEL_PATTERN.search(jql)
+            with self.lock:
+                if keys_match:
+                    issue_keys = [key.strip().strip('"') for key in keys_match.group(1).split(',')]
+                elif label_match:
+                    issue_keys = [key for key, issue in self.issues.items() if label_match.group(1) in issue['fields'].get('labels', [])]
+                else:
+                    issue_keys = []
+                unknown_keys = [key for key in issue_keys if key not in self.issues]
+                if keys_match and unknown_keys:
+                    return 400, {'errorMessages': [f"An issue with key '{unknown_keys[0]}' does not exist for field 'key'."]}
+                issues = [self.__issue_resource(key) for key in issue_keys if key in self.issues]
+            return 200, {'issues': issues, 'isLast': True}
+
+        return 404, {'errorMessages': [f'Unsupported endpoint {endpoint}']}
+
+    def __send(self, request, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        try:
+            request.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up on the request, e.g. its timeout was capped to the invocation deadline
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-5xx', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = LocalJiraServer(args.port, args.latency_ms / 1000, args.rate_429, args.rate_5xx).start()
+    print(f"Local Jira listening on http://{server.domain}{API_PREFIX}/ - Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"Requests served: {dict(server.request_counts)}")
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
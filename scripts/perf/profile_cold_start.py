@@ -0,0 +1,101 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+Reports the import time of every lambda handler, as paid by the INIT phase of a cold start.
+
+Each handler is imported in a fresh interpreter with python -X importtime, several times to smooth out the noise.
+For the handlers creating an external workflow, the module of the workflow is imported too, as on the first invocation.
+The packages contributing most to the import time are listed per handler.
+The totals include the modules imported by the interpreter startup itself. boto3 is imported with the first AWS client, on the first invocation.
+
+Usage: python scripts/perf/profile_cold_start.py [--repeat 5] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+SOURCE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'datazone-subscription')
+
+BASE_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'SUBSCRIPTION_DEFAULT_APPROVER_ID': 'profile-approver',
+    'SUBSCRIPTION_CHANGE_ROLE_ARN': 'arn:aws:iam::111122223333:role/profile',
+    'TASK_TOKEN_STORE_TYPE': 'MEMORY',
+}
+
+# (handler module, WORKFLOW_TYPE or None for handlers without external workflow)
+PROFILES = [
+    ('handler_create_get_issue_status', 'MOCK_ACCEPT'),
+    ('handler_create_get_issue_status', 'JIRA'),
+    ('handler_create_get_issue_status_resilient', 'MOCK_ACCEPT'),
+    ('handler_create_get_issue_status_resilient', 'JIRA'),
+    ('handler_jira_webhook', 'JIRA'),
+    ('handler_change_subscription_status', None),
+]
+
+
+def profile_imports(handler, workflow_type):
+    '''Imports the handler in a new interpreter. Returns the total import time and the self time by top level package, in microseconds.'''
+    statements = [f'import {handler}']
+    if workflow_type is not None:
+        statements += ['import importlib, common', f"importlib.import_module(common.WORKFLOW_REGISTRY['{workflow_type}'][0])"]
+
+    env = {**os.environ, **BASE_ENV, 'WORKFLOW_TYPE': workflow_type or 'MOCK_ACCEPT'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', '; '.join(statements)],
+        cwd=SOURCE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    self_us_by_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        self_us_by_package[package] += int(self_us)
+        # top level imports are the least indented ones
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative_us)
+    return total_us, self_us_by_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per handler, the median is reported')
+    parser.add_argument('--top', type=int, default=8, help='packages listed per handler')
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, median of {args.repeat} runs")
+    for handler, workflow_type in PROFILES:
+        runs = [profile_imports(handler, workflow_type) for _ in range(args.repeat)]
+        total_ms = statistics.median(total for total, _ in runs) / 1000
+        packages = {package: statistics.median(run[1].get(package, 0) for run in runs) / 1000 for package in runs[0][1]}
+
+        print(f"\n{handler} [{workflow_type or 'no workflow'}]: {total_ms:.1f}ms")
+        for package, self_ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"  {package:<32} {self_ms:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,647 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+DESCRIPTION = """
+Discrete-event simulation of the resilient subscription workflow, on a virtual clock.
+
+The resilient state machine definition is interpreted as deployed: Pass, Choice, Wait, Succeed and Fail states,
+SQS sendMessage.waitForTaskToken tasks with their TimeoutSeconds, Retry and Catch, and lambda:invoke tasks.
+The SQS messages go through a FIFO queue with the settings of the stack: delivery delay, visibility timeout,
+message groups blocked while a message is in flight, redrive to the DLQ after maxReceiveCount receives,
+and the batch size of the event source mapping.
+
+The real handlers process the batches and the DataZone status changes, against the local Jira stand-in of local_jira_server.py
+and the botocore stubs of aws_stubs.py. Their task callbacks complete the waiting tasks of the simulated executions.
+The subscription requests are synthetic events of dz_event_generator.py, or the events of a JSONL file replayed at --speed.
+Approvers resolve every created issue after an exponentially distributed delay.
+
+Each invocation takes the wall time the handler actually spent, everything else is virtual: Wait states, delays, timeouts.
+The clocks of the polling schedule and of the circuit breaker are replaced by the virtual one, so the poll intervals
+follow the polling schedule over the simulated hours and an open circuit closes again after its virtual open period.
+
+Reported: executions by outcome, end-to-end and approval detection latency, queue depth, lambda invocations and Jira requests.
+
+Usage: python scripts/perf/sfn_simulator.py [--subscriptions 1000] [--arrival-window-secs 3600] [--events events.jsonl] [--speed 1]
+                                            [--approval-mean-secs 1800]
+                                            [--reject-ratio 0.1] [--batch-size 5] [--max-concurrency 10] [--status-task-timeout 86400]
+"""
+import argparse
+import contextlib
+import copy
+import heapq
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'datazone-subscription'))
+
+from botocore.exceptions import ClientError
+
+from aws_stubs import AwsApiStubs
+from dz_event_generator import EventGenerator, format_event_time, read_events
+from local_jira_server import LocalJiraServer
+
+DEFINITION_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'config', 'dz-subscription-step-function-resilient.json')
+PROJECT_KEY = 'DZ'
+
+# Settings of the Jira resiliency queue and its event source mapping in DataZoneSubscriptionStack.ts
+QUEUE_DELIVERY_DELAY_SECS = 20
+QUEUE_VISIBILITY_TIMEOUT_SECS = 15 * 60
+QUEUE_MAX_RECEIVE_COUNT = 6
+LAMBDA_BATCH_SIZE = 5
+
+
+class SimulationError(Exception):
+    '''Raised for a state machine definition using features the simulator does not interpret.'''
+
+
+class States:
+    '''Errors raised by the simulated Step Functions runtime.'''
+    TIMEOUT = 'States.Timeout'
+    TASK_FAILED = 'States.TaskFailed'
+    RUNTIME = 'States.Runtime'
+
+
+class VirtualClock:
+    '''Seconds elapsed since the start of the simulation, and the matching datetime.'''
+    def __init__(self, start) -> None:
+        self.start = start
+        self.now = 0.0
+
+    def datetime(self, tz=None):
+        moment = self.start + timedelta(seconds=self.now)
+        return moment.astimezone(tz) if tz else moment.replace(tzinfo=None)
+
+
+def install_virtual_clock(clock, datetime_modules, monotonic_modules):
+    '''Replaces datetime.now() and time.monotonic() in the given modules by readings of the virtual clock.'''
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.datetime(tz)
+
+    class VirtualTime:
+        def __getattr__(self, name):
+            return getattr(time, name)
+
+        def monotonic(self):
+            return clock.now
+
+    for module in datetime_modules:
+        module.datetime = VirtualDatetime
+    for module in monotonic_modules:
+        module.time = VirtualTime()
+
+
+def read_path(data, path):
+    '''Reads a reference path, limited to the $.field.field form used by the definitions.'''
+    if path == '$':
+        return data
+    if not path.startswith('$.'):
+        raise SimulationError(f"Unsupported path {path}")
+    value = data
+    for field in path[2:].split('.'):
+        if not isinstance(value, dict) or field not in value:
+            raise KeyError(path)
+        value = value[field]
+    return value
+
+
+def write_path(data, path, value):
+    '''Returns a copy of data with value at path. A null path discards the value, $ replaces data.'''
+    if path is None:
+        return data
+    if path == '$':
+        return value
+    result = copy.deepcopy(data) if isinstance(data, dict) else {}
+    target = result
+    *parents, field = path[2:].split('.')
+    for parent in parents:
+        target = target.setdefault(parent, {})
+    target[field] = value
+    return result
+
+
+def apply_parameters(template, data, context):
+    '''Resolves the .$ fields of a Parameters template, from the state input or the context object for $$ paths.'''
+    if isinstance(template, dict):
+        resolved = {}
+        for name, value in template.items():
+            if name.endswith('.$'):
+                resolved[name[:-2]] = read_path(context, value[1:]) if value.startswith('$$') else read_path(data, value)
+            else:
+                resolved[name] = apply_parameters(value, data, context)
+        return resolved
+    if isinstance(template, list):
+        return [apply_parameters(value, data, context) for value in template]
+    return template
+
+
+def error_matches(error, error_equals):
+    # States.TaskFailed matches any task error but the timeout
+    return error in error_equals or 'States.ALL' in error_equals or ('States.TaskFailed' in error_equals and error != States.TIMEOUT)
+
+
+def choice_matches(rule, data):
+    if 'And' in rule:
+        return all(choice_matches(nested, data) for nested in rule['And'])
+    if 'Or' in rule:
+        return any(choice_matches(nested, data) for nested in rule['Or'])
+    if 'Not' in rule:
+        return not choice_matches(rule['Not'], data)
+
+    try:
+        value = read_path(data, rule['Variable'])
+        present = True
+    except KeyError:
+        value, present = None, False
+
+    if 'IsPresent' in rule:
+        return present == rule['IsPresent']
+    if not present:
+        return False
+    if 'IsNull' in rule:
+        return (value is None) == rule['IsNull']
+    if 'StringEquals' in rule:
+        return isinstance(value, str) and value == rule['StringEquals']
+    if 'BooleanEquals' in rule:
+        return isinstance(value, bool) and value == rule['BooleanEquals']
+    comparisons = {
+        'NumericEquals': lambda a, b: a == b,
+        'NumericLessThan': lambda a, b: a < b,
+        'NumericLessThanEquals': lambda a, b: a <= b,
+        'NumericGreaterThan': lambda a, b: a > b,
+        'NumericGreaterThanEquals': lambda a, b: a >= b,
+    }
+    for operator, compare in comparisons.items():
+        if operator in rule:
+            return isinstance(value, (int, float)) and not isinstance(value, bool) and compare(value, rule[operator])
+    raise SimulationError(f"Unsupported choice rule {rule}")
+
+
+def load_definition(path, status_task_timeout):
+    '''Loads the state machine definition with its placeholders replaced, as the stack does on deployment.'''
+    with open(path) as definition:
+        text = definition.read()
+    # the timeout placeholder stands for a number, the other placeholders are resource ARNs kept as they are
+    return json.loads(text.replace('"${jiraStatusTaskTimeout}"', str(status_task_timeout)))
+
+
+class FifoQueue:
+    '''SQS FIFO queue. A message group delivers nothing while one of its messages is in flight.'''
+    def __init__(self, delivery_delay_secs, visibility_timeout_secs, max_receive_count) -> None:
+        self.delivery_delay_secs = delivery_delay_secs
+        self.visibility_timeout_secs = visibility_timeout_secs
+        self.max_receive_count = max_receive_count
+        self.groups = {}
+        self.dead_letters = []
+        self.message_ids = itertools.count(1)
+
+    def __len__(self):
+        return sum(len(messages) for messages in self.groups.values())
+
+    def send(self, now, group_id, body):
+        self.groups.setdefault(group_id, deque()).append({
+            'messageId': f'msg-{next(self.message_ids)}', 'group_id': group_id, 'body': body,
+            'visible_at': now + self.delivery_delay_secs, 'receive_count': 0, 'in_flight': False,
+        })
+
+    def receive(self, now, max_messages):
+        '''Returns up to max_messages visible messages, in group order, and makes them in flight.'''
+        batch = []
+        for messages in sorted(self.groups.values(), key=lambda messages: messages[0]['visible_at'] if messages else float('inf')):
+            if any(message['in_flight'] for message in messages):
+                continue
+            for message in list(messages):
+                if len(batch) == max_messages or message['visible_at'] > now:
+                    break
+                if message['receive_count'] >= self.max_receive_count:
+                    messages.remove(message)
+                    self.dead_letters.append(message)
+                    continue
+                message['in_flight'] = True
+                message['receive_count'] += 1
+                message['visible_at'] = now + self.visibility_timeout_secs
+                batch.append(message)
+        return batch
+
+    def delete(self, message):
+        self.groups[message['group_id']].remove(message)
+
+    def release(self, message):
+        '''Leaves a failed message in the queue, it becomes visible again when its visibility timeout expires.'''
+        message['in_flight'] = False
+
+    def in_flight(self):
+        return sum(message['in_flight'] for messages in self.groups.values() for message in messages)
+
+    def next_visible_at(self, now):
+        '''Returns the next time a message of an unblocked group becomes visible, None when the queue is empty.'''
+        times = [message['visible_at'] for messages in self.groups.values() for message in messages if message['visible_at'] > now]
+        return min(times) if times else None
+
+
+class Execution:
+    def __init__(self, execution_id, data, started_at) -> None:
+        self.execution_id = execution_id
+        self.data = data
+        self.started_at = started_at
+        self.ended_at = None
+        self.status = 'RUNNING'
+        self.issue_key = None
+        self.resolved_at = None
+        self.attempts = {}
+
+
+class Simulator:
+    '''Runs the executions of one state machine definition, the SQS tasks being handled by the resilient batch handler.'''
+    def __init__(self, definition, clock, jira_server, aws_stubs, args) -> None:
+        self.definition = definition
+        self.clock = clock
+        self.jira_server = jira_server
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.events = []
+        self.event_sequence = itertools.count()
+        self.queue = FifoQueue(args.delivery_delay_secs, args.visibility_timeout_secs, args.max_receive_count)
+        self.executions = []
+        self.tasks = {}
+        self.task_tokens = itertools.count(1)
+        self.executions_by_issue = {}
+        self.running_invocations = 0
+        self.scheduled_polls = set()
+
+        # callbacks are sent from the dispatcher threads during an invocation, and applied when the invocation completes
+        self.callbacks = []
+        self.answered_tokens = set()
+        self.callback_lock = threading.Lock()
+        aws_stubs.responders[('stepfunctions', 'SendTaskSuccess')] = lambda params: self.__capture_callback(params['taskToken'], output=json.loads(params['output']))
+        aws_stubs.responders[('stepfunctions', 'SendTaskFailure')] = lambda params: self.__capture_callback(params['taskToken'], error=params.get('error'))
+
+        import handler_change_subscription_status
+        import handler_create_get_issue_status_resilient
+        self.batch_handler = handler_create_get_issue_status_resilient.lambda_handler
+        self.functions = {'${ChangeSubscriptionStatusLambdaARN}': handler_change_subscription_status.lambda_handler}
+
+        self.stats = {
+            'invocations': 0, 'records': 0, 'failed_records': 0, 'invocation_errors': 0, 'invocation_wall_secs': [],
+            'max_depth': 0, 'depth_area': 0.0, 'rejected_callbacks': 0,
+        }
+
+    def schedule(self, at, action):
+        heapq.heappush(self.events, (at, next(self.event_sequence), action))
+
+    def run(self):
+        while self.events:
+            at, _, action = heapq.heappop(self.events)
+            depth = len(self.queue)
+            self.stats['depth_area'] += depth * (at - self.clock.now)
+            self.clock.now = at
+            action()
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self.queue))
+
+    def start_execution(self, data):
+        execution = Execution(f'execution-{len(self.executions) + 1}', data, self.clock.now)
+        self.executions.append(execution)
+        self.__enter(execution, self.definition['StartAt'])
+
+    # States
+
+    def __enter(self, execution, state_name):
+        # Pass and Choice states are instantaneous, the loop goes on until a state waits for something
+        while state_name is not None:
+            state = self.definition['States'][state_name]
+            try:
+                state_name = self.__run_state(execution, state_name, state)
+            except KeyError as e:
+                self.__end(execution, 'FAILED', f"{States.RUNTIME}: path {e} not found in the input of {state_name}")
+                return
+
+    def __run_state(self, execution, state_name, state):
+        state_type = state['Type']
+        if state_type == 'Pass':
+            output = apply_parameters(state['Parameters'], execution.data, {}) if 'Parameters' in state else state.get('Result', execution.data)
+            execution.data = write_path(execution.data, state.get('ResultPath', '$'), output)
+            return self.__next(execution, state)
+        if state_type == 'Choice':
+            for rule in state['Choices']:
+                if choice_matches(rule, execution.data):
+                    return rule['Next']
+            if 'Default' not in state:
+                self.__end(execution, 'FAILED', 'States.NoChoiceMatched')
+                return None
+            return state['Default']
+        if state_type == 'Wait':
+            seconds = read_path(execution.data, state['SecondsPath']) if 'SecondsPath' in state else state['Seconds']
+            self.schedule(self.clock.now + seconds, lambda: self.__enter(execution, state['Next']))
+            return None
+        if state_type == 'Succeed':
+            self.__end(execution, 'SUCCEEDED')
+            return None
+        if state_type == 'Fail':
+            self.__end(execution, 'FAILED', state.get('Error'))
+            return None
+        if state_type == 'Task':
+            self.__start_task(execution, state_name, state)
+            return None
+        raise SimulationError(f"Unsupported state type {state_type} of {state_name}")
+
+    def __next(self, execution, state):
+        if state.get('End'):
+            self.__end(execution, 'SUCCEEDED')
+            return None
+        return state['Next']
+
+    def __end(self, execution, status, error=None):
+        execution.status = status
+        execution.ended_at = self.clock.now
+        if error and self.args.verbose:
+            print(f"{execution.execution_id} {status}: {error}")
+
+    # Tasks
+
+    def __start_task(self, execution, state_name, state):
+        resource = state['Resource']
+        task_token = f'{execution.execution_id}:{next(self.task_tokens)}'
+        parameters = apply_parameters(state.get('Parameters', {}), execution.data, {'Task': {'Token': task_token}})
+
+        if resource == 'arn:aws:states:::aws-sdk:sqs:sendMessage.waitForTaskToken':
+            self.tasks[task_token] = (execution, state_name)
+            self.queue.send(self.clock.now, parameters['MessageGroupId'], json.dumps(parameters['MessageBody']))
+            self.__schedule_poll(self.clock.now + self.args.delivery_delay_secs)
+            if 'TimeoutSeconds' in state:
+                self.schedule(self.clock.now + state['TimeoutSeconds'], lambda: self.__complete_task(task_token, error=States.TIMEOUT))
+        elif resource == 'arn:aws:states:::lambda:invoke':
+            function = self.functions[parameters['FunctionName']]
+            self.tasks[task_token] = (execution, state_name)
+            started = time.perf_counter()
+            try:
+                with self.__quiet():
+                    result = {'StatusCode': 200, 'Payload': function(parameters['Payload'], None)}
+                error = None
+            except Exception as e:
+                result, error = None, type(e).__name__
+            self.schedule(self.clock.now + time.perf_counter() - started, lambda: self.__complete_task(task_token, output=result, error=error))
+        else:
+            raise SimulationError(f"Unsupported task resource {resource} of {state_name}")
+
+    def __complete_task(self, task_token, output=None, error=None):
+        task = self.tasks.pop(task_token, None)
+        if task is None:
+            # already completed, e.g. a callback arriving after the timeout
+            return
+        execution, state_name = task
+        state = self.definition['States'][state_name]
+
+        if error is None:
+            if isinstance(output, dict) and output.get('issue_key') and execution.issue_key is None:
+                self.__issue_created(execution, output['issue_key'])
+            execution.data = write_path(execution.data, state.get('ResultPath', '$'), output)
+            self.__enter(execution, self.__next(execution, state))
+            return
+
+        for retrier in state.get('Retry', []):
+            if error_matches(error, retrier['ErrorEquals']):
+                attempt = execution.attempts.get(state_name, 0)
+                if attempt < retrier.get('MaxAttempts', 3):
+                    execution.attempts[state_name] = attempt + 1
+                    delay = retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** attempt
+                    self.schedule(self.clock.now + delay, lambda: self.__enter(execution, state_name))
+                    return
+                break
+        execution.attempts.pop(state_name, None)
+
+        for catcher in state.get('Catch', []):
+            if error_matches(error, catcher['ErrorEquals']):
+                execution.data = write_path(execution.data, catcher.get('ResultPath', '$'), {'Error': error, 'Cause': None})
+                self.__enter(execution, catcher['Next'])
+                return
+        self.__end(execution, 'FAILED', error)
+
+    def __capture_callback(self, task_token, output=None, error=None):
+        with self.callback_lock:
+            if task_token not in self.tasks or task_token in self.answered_tokens:
+                self.stats['rejected_callbacks'] += 1
+                raise ClientError({'Error': {'Code': 'TaskTimedOut', 'Message': 'Task Timed Out'}}, 'SendTaskSuccess' if error is None else 'SendTaskFailure')
+            self.answered_tokens.add(task_token)
+            # a failure callback carries the handler response as error name, matched by States.TaskFailed
+            self.callbacks.append((task_token, output, None if error is None else States.TASK_FAILED))
+        return {}
+
+    # Approvers
+
+    def __issue_created(self, execution, issue_key):
+        execution.issue_key = issue_key
+        self.executions_by_issue[issue_key] = execution
+        status = 'Rejected' if self.random.random() < self.args.reject_ratio else 'Accepted'
+        self.schedule(self.clock.now + self.random.expovariate(1 / self.args.approval_mean_secs), lambda: self.__resolve_issue(execution, status))
+
+    def __resolve_issue(self, execution, status):
+        execution.resolved_at = self.clock.now
+        self.jira_server.set_status(execution.issue_key, status)
+
+    # Event source mapping
+
+    def __schedule_poll(self, at):
+        if at not in self.scheduled_polls:
+            self.scheduled_polls.add(at)
+            self.schedule(at, lambda: self.__poll(at))
+
+    def __poll(self, at):
+        self.scheduled_polls.discard(at)
+        while self.running_invocations < self.args.max_concurrency:
+            batch = self.queue.receive(self.clock.now, self.args.batch_size)
+            if not batch:
+                break
+            self.__invoke(batch)
+        next_visible_at = self.queue.next_visible_at(self.clock.now)
+        if next_visible_at is not None:
+            self.__schedule_poll(next_visible_at)
+
+    def __invoke(self, batch):
+        self.running_invocations += 1
+        event = {'Records': [
+            {
+                'messageId': message['messageId'],
+                'attributes': {'MessageGroupId': message['group_id'], 'ApproximateReceiveCount': str(message['receive_count'])},
+                'body': message['body'],
+                'eventSource': 'aws:sqs',
+            }
+            for message in batch
+        ]}
+
+        started = time.perf_counter()
+        try:
+            with self.__quiet():
+                response = self.batch_handler(event, None)
+            failed = {item['itemIdentifier'] for item in response.get('batchItemFailures', [])}
+        except Exception:
+            # the whole batch becomes visible again after the visibility timeout
+            self.stats['invocation_errors'] += 1
+            failed = {message['messageId'] for message in batch}
+        wall_secs = time.perf_counter() - started
+
+        with self.callback_lock:
+            callbacks, self.callbacks = self.callbacks, []
+        self.stats['invocations'] += 1
+        self.stats['records'] += len(batch)
+        self.stats['failed_records'] += len(failed)
+        self.stats['invocation_wall_secs'].append(wall_secs)
+        self.schedule(self.clock.now + wall_secs, lambda: self.__invocation_completed(batch, failed, callbacks))
+
+    def __invocation_completed(self, batch, failed, callbacks):
+        for task_token, output, error in callbacks:
+            self.answered_tokens.discard(task_token)
+            self.__complete_task(task_token, output=output, error=error)
+        for message in batch:
+            if message['messageId'] in failed:
+                self.queue.release(message)
+            else:
+                self.queue.delete(message)
+        self.running_invocations -= 1
+        self.__poll(None)
+
+    @contextlib.contextmanager
+    def __quiet(self):
+        # the handlers also print some diagnostics
+        with contextlib.nullcontext() if self.args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+
+def configure_handlers(jira_server):
+    # the handler modules read their configuration at import time
+    os.environ.update({
+        'SUBSCRIPTION_DEFAULT_APPROVER_ID': 'sim-approver',
+        'SUBSCRIPTION_CHANGE_ROLE_ARN': 'arn:aws:iam::111122223333:role/sim-subscription-change',
+        'WORKFLOW_TYPE': 'JIRA',
+        'JIRA_DOMAIN': jira_server.domain,
+        'JIRA_URL_SCHEME': 'http',
+        'JIRA_PROJECT_KEY': PROJECT_KEY,
+        'JIRA_ISSUETYPE_ID': '10001',
+        'JIRA_SECRET_ARN': 'arn:aws:secretsmanager:us-east-1:111122223333:secret:sim-jira',
+        'JIRA_RATE_LIMIT_PER_SEC': '1000',
+        'JIRA_RATE_LIMIT_MAX_PER_SEC': '1000',
+        'JIRA_RATE_LIMIT_BURST': '1000',
+        'TASK_TOKEN_STORE_TYPE': 'NONE',
+        'METRICS_ENABLED': 'false',
+    })
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def format_secs(secs):
+    return str(timedelta(seconds=round(secs)))
+
+
+def report(simulator, jira_server, wall_secs):
+    executions = simulator.executions
+    stats = simulator.stats
+    outcomes = {status: sum(execution.status == status for execution in executions) for status in ('SUCCEEDED', 'FAILED', 'RUNNING')}
+    print(f"Simulated {len(executions)} subscriptions over {format_secs(simulator.clock.now)} of virtual time in {wall_secs:.1f}s")
+    print(f"Executions: {outcomes['SUCCEEDED']} succeeded, {outcomes['FAILED']} failed, {outcomes['RUNNING']} still running")
+
+    latencies = [execution.ended_at - execution.started_at for execution in executions if execution.status == 'SUCCEEDED']
+    detection = [execution.ended_at - execution.resolved_at for execution in executions if execution.status == 'SUCCEEDED' and execution.resolved_at is not None]
+    for name, values in (('End-to-end latency', latencies), ('Approval detection latency', detection)):
+        if values:
+            print(f"{name}: p50 {format_secs(percentile(values, 50))}, p95 {format_secs(percentile(values, 95))}, max {format_secs(max(values))}")
+
+    elapsed = simulator.clock.now or 1
+    print(f"Queue depth: max {stats['max_depth']}, time-weighted mean {stats['depth_area'] / elapsed:.1f}, {len(simulator.queue.dead_letters)} in the DLQ")
+
+    wall = stats['invocation_wall_secs']
+    if wall:
+        print(
+            f"Lambda: {stats['invocations']} invocations, {stats['records'] / stats['invocations']:.1f} records per batch, "
+            f"{stats['failed_records']} records failed, {stats['invocation_errors']} invocations failed, "
+            f"p50 {percentile(wall, 50) * 1000:.1f}ms p99 {percentile(wall, 99) * 1000:.1f}ms, {stats['rejected_callbacks']} callbacks for stopped tasks"
+        )
+    print(f"Jira: {jira_server.total_requests()} requests, {jira_server.total_requests() / max(len(executions), 1):.1f} per subscription, {jira_server.connection_count} connections")
+    print(f"Jira requests by endpoint: {dict(jira_server.request_counts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--definition', default=DEFINITION_PATH, help='state machine definition to interpret')
+    parser.add_argument('--subscriptions', type=int, default=1000, help='subscription requests, each starting one execution')
+    parser.add_argument('--arrival-window-secs', type=float, default=3600, help='the executions start uniformly over this window')
+    parser.add_argument('--events', help='JSONL file of DataZone events to replay instead, see dz_event_generator.py')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed of --events, 10 starts an hour of events in 6 minutes')
+    parser.add_argument('--approval-mean-secs', type=float, default=1800, help='mean time for an approver to resolve an issue')
+    parser.add_argument('--reject-ratio', type=float, default=0.1, help='share of issues resolved as Rejected, the others are Accepted')
+    parser.add_argument('--start', default='2026-01-05T09:00:00+00:00', help='virtual start time, it decides the business hours of the polling schedule')
+    parser.add_argument('--status-task-timeout', type=int, default=86400, help='TimeoutSeconds of the status polling task')
+    parser.add_argument('--batch-size', type=int, default=LAMBDA_BATCH_SIZE)
+    parser.add_argument('--max-concurrency', type=int, default=10, help='concurrent invocations of the batch handler')
+    parser.add_argument('--delivery-delay-secs', type=float, default=QUEUE_DELIVERY_DELAY_SECS)
+    parser.add_argument('--visibility-timeout-secs', type=float, default=QUEUE_VISIBILITY_TIMEOUT_SECS)
+    parser.add_argument('--max-receive-count', type=int, default=QUEUE_MAX_RECEIVE_COUNT)
+    parser.add_argument('--jira-latency-ms', type=float, default=0)
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='share of Jira requests answered with 503')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='show the handler logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    jira_server = LocalJiraServer(latency_secs=args.jira_latency_ms / 1000, rate_5xx=args.rate_5xx, project_key=PROJECT_KEY).start()
+    aws_stubs = AwsApiStubs().install()
+    configure_handlers(jira_server)
+
+    import circuit_breaker
+    import common
+    import polling_schedule
+    clock = VirtualClock(datetime.fromisoformat(args.start))
+    # the poll intervals and the circuit breaker follow the simulated time, the rate limiter keeps pacing the actual requests
+    install_virtual_clock(clock, [common, polling_schedule], [circuit_breaker])
+
+    simulator = Simulator(load_definition(args.definition, args.status_task_timeout), clock, jira_server, aws_stubs, args)
+    if args.events:
+        arrivals = [(offset / args.speed, event) for offset, event in read_events(args.events)]
+    else:
+        generator = EventGenerator(seed=args.seed)
+        draw = random.Random(args.seed)
+        arrivals = [(draw.uniform(0, args.arrival_window_secs), generator.event(clock.datetime(timezone.utc))) for _ in range(args.subscriptions)]
+    for offset, event in arrivals:
+        aws_stubs.add_subscription_request(event)
+        simulator.schedule(offset, lambda event=event: simulator.start_execution(dict(event, time=format_event_time(clock.datetime(timezone.utc)))))
+
+    started = time.perf_counter()
+    simulator.run()
+    report(simulator, jira_server, time.perf_counter() - started)
+    jira_server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Provides AWS clients using the credentials of an assumed role.
+The credentials of an assumed role are cached per role ARN across warm invocations and refreshed shortly before they expire.
+Clients come from the shared client factory, keyed by the credentials, so they are reused as long as the credentials are.
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from aws_clients import get_client
+from call_metrics import record_call
+from structured_logging import get_logger
+
+logger = get_logger()
+
+# Credentials are renewed this many seconds before their expiration, so a client is never handed out with credentials about to expire.
+ASSUMED_ROLE_REFRESH_MARGIN_SECS = int(os.environ.get('ASSUMED_ROLE_REFRESH_MARGIN_SECS', 300))
+
+
+class AssumedRoleCredentialProvider:
+    '''Assumes roles with STS and caches the resulting credentials per role ARN until shortly before they expire.'''
+    def __init__(self, role_session_name, refresh_margin_secs) -> None:
+        self.role_session_name = role_session_name
+        self.refresh_margin = timedelta(seconds=refresh_margin_secs)
+        # role ARN -> (credentials, credentials expiration)
+        self.credentials = {}
+        self.lock = threading.Lock()
+
+    def get_client(self, role_arn, service_name):
+        '''Returns a client for the service using credentials of the role, assuming the role only when no valid cached credentials exist.'''
+        with self.lock:
+            cached = self.credentials.get(role_arn)
+            if cached is None or cached[1] - self.refresh_margin <= datetime.now(timezone.utc):
+                cached = self.__assume_role(role_arn)
+                self.credentials[role_arn] = cached
+        return get_client(service_name, credentials=cached[0])
+
+    def __assume_role(self, role_arn):
+        with record_call("STS", "AssumeRole") as call:
+            assumed_role = get_client('sts').assume_role(
+                RoleArn=role_arn,
+                RoleSessionName=self.role_session_name
+            )
+            call.from_boto3_response(assumed_role)
+
+        credentials = assumed_role['Credentials']
+        logger.info("Assumed role %s, credentials expire at %s.", role_arn, credentials['Expiration'])
+        return (credentials["AccessKeyId"], credentials["SecretAccessKey"], credentials["SessionToken"]), credentials['Expiration']
+
+
+_provider = AssumedRoleCredentialProvider("AssumeRoleSessionForDZSubGrant", ASSUMED_ROLE_REFRESH_MARGIN_SECS)
+
+
+def get_assumed_role_client(role_arn, service_name):
+    return _provider.get_client(role_arn, service_name)
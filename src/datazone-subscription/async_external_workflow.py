@@ -0,0 +1,97 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+from data_zone_subscription import DataZoneSubscription
+from external_workflow import IExternalWorkflow
+from structured_logging import get_logger
+
+if TYPE_CHECKING:
+    # only for the annotations, the Jira modules are imported when a Jira workflow is created
+    from jira_routing import RoutedJiraWorkflow
+    from jira_workflow import JiraWorkflow
+
+logger = get_logger()
+
+class IAsyncExternalWorkflow():
+    '''Asynchronous counterpart of IExternalWorkflow, so several records of a batch can wait on the external workflow system at the same time.'''
+    @abstractmethod
+    async def create_issue(self, dz_subscription: DataZoneSubscription, assignee):
+        '''Creates an issue in the external workflow system. Returns an id (issue_key) for the newly created issue.'''
+        pass
+
+    @abstractmethod
+    async def get_issue_status(self, issue_key):
+        '''Retrieves the current issue status from the external workflow system. Returns a tuple of approval status and approver.'''
+        pass
+
+    @abstractmethod
+    async def get_issues_status(self, issue_keys, issues_updated=None):
+        '''Retrieves the current status of several issues at once. Returns a dict mapping each found issue key to its IssueStatus or IssueUnchanged, or to the error of that issue.'''
+        pass
+
+    @abstractmethod
+    async def create_issues(self, subscriptions):
+        '''Creates one issue per tuple of DataZone subscription and assignee. Returns one entry per tuple: the issue key or the error of that issue.'''
+        pass
+
+    @abstractmethod
+    async def find_issue(self, subscription_req_id):
+        '''Returns the key of an issue already created for the subscription request, or None.'''
+        pass
+
+
+class AsyncWorkflowAdapter(IAsyncExternalWorkflow):
+    '''Runs the blocking calls of an IExternalWorkflow on worker threads. Used for workflows without a native asynchronous client.'''
+    def __init__(self, external_workflow: IExternalWorkflow) -> None:
+        self.external_workflow = external_workflow
+
+    async def create_issue(self, dz_subscription: DataZoneSubscription, assignee):
+        return await asyncio.to_thread(self.external_workflow.create_issue, dz_subscription, assignee)
+
+    async def get_issue_status(self, issue_key):
+        return await asyncio.to_thread(self.external_workflow.get_issue_status, issue_key)
+
+    async def get_issues_status(self, issue_keys, issues_updated=None):
+        return await asyncio.to_thread(self.external_workflow.get_issues_status, issue_keys, issues_updated)
+
+    async def create_issues(self, subscriptions):
+        return await asyncio.to_thread(self.external_workflow.create_issues, subscriptions)
+
+    async def find_issue(self, subscription_req_id):
+        return await asyncio.to_thread(self.external_workflow.find_issue, subscription_req_id)
+
+
+class AsyncJiraWorkflow(AsyncWorkflowAdapter):
+    '''Asynchronous Jira workflow. Requests run concurrently on worker threads and are all paced by the rate limiter of the Jira host,
+    so concurrent records share the Jira rate budget instead of multiplying it.'''
+    def __init__(self, jira_workflow: 'JiraWorkflow') -> None:
+        super().__init__(jira_workflow)
+        self.rate_limiter = jira_workflow.rate_limiter
+        self.circuit_breaker = jira_workflow.circuit_breaker
+        self.connection_pool_stats = jira_workflow.connection_pool_stats
+
+
+class AsyncRoutedJiraWorkflow(AsyncWorkflowAdapter):
+    '''Asynchronous routed Jira workflow. The calls of a batch are split per Jira target, each target paced by its own rate limiter.'''
+    def __init__(self, routed_jira_workflow: 'RoutedJiraWorkflow') -> None:
+        super().__init__(routed_jira_workflow)
+        self.target_stats = routed_jira_workflow.target_stats
@@ -0,0 +1,77 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Provides the AWS clients shared by the handlers.
+A client is created on first use and reused across warm invocations, so a cold start only pays for the clients the invocation actually needs.
+Clients are cached per service, region and credentials, and all use the same tuned botocore configuration:
+adaptive retries with client side rate limiting on throttling, explicit timeouts, and a connection pool sized for the concurrent records.
+boto3 itself is only imported when the first client is created.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+AWS_CONNECT_TIMEOUT_SECS = float(os.environ.get('AWS_CONNECT_TIMEOUT_SECS', 3))
+AWS_READ_TIMEOUT_SECS = float(os.environ.get('AWS_READ_TIMEOUT_SECS', 10))
+# Records, DataZone lookups and callbacks all run concurrently, botocore's default of 10 connections would make them wait for each other.
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+# Clients of assumed role credentials are replaced when the credentials are renewed, the oldest clients are dropped beyond that number.
+AWS_CLIENT_CACHE_MAX_ENTRIES = int(os.environ.get('AWS_CLIENT_CACHE_MAX_ENTRIES', 32))
+
+# client by (service name, region name, credentials)
+_clients = OrderedDict()
+# creating clients from the default boto3 session is not thread safe
+_clients_lock = threading.Lock()
+_client_config = None
+
+
+def get_client_config():
+    '''Returns the botocore configuration of all clients.'''
+    global _client_config
+    if _client_config is None:
+        from botocore.config import Config
+        _client_config = Config(
+            retries={'mode': 'adaptive', 'total_max_attempts': AWS_MAX_ATTEMPTS},
+            connect_timeout=AWS_CONNECT_TIMEOUT_SECS,
+            read_timeout=AWS_READ_TIMEOUT_SECS,
+            max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        )
+    return _client_config
+
+
+def get_client(service_name, region_name=None, credentials=None):
+    '''Returns the shared client of the service, creating it on first use.
+    credentials is a tuple of access key id, secret access key and session token, e.g. of an assumed role. The default credentials are used without it.'''
+    cache_key = (service_name, region_name, credentials)
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            import boto3
+            kwargs = {}
+            if credentials is not None:
+                kwargs = dict(zip(('aws_access_key_id', 'aws_secret_access_key', 'aws_session_token'), credentials))
+            # clients are created from the default session, which loads every service model once per container
+            client = boto3.client(service_name, region_name=region_name, config=get_client_config(), **kwargs)
+            _clients[cache_key] = client
+            while len(_clients) > AWS_CLIENT_CACHE_MAX_ENTRIES:
+                _clients.popitem(last=False)
+        _clients.move_to_end(cache_key)
+        return client
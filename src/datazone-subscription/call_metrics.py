@@ -0,0 +1,172 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Records the latency and outcome of the outbound calls to Jira and AWS as CloudWatch Embedded Metric Format (EMF) log lines.
+
+Every call wrapped with record_call prints one line with its duration, status, retries and the position of the record in the SQS batch.
+A lambda handler decorated with record_invocation prints one more line with the totals per service when the invocation ends.
+CloudWatch extracts the metrics from the log lines, no call to the CloudWatch API is made.
+The lines are printed and not logged: the Lambda log format prefixes logged lines, and CloudWatch only parses lines that are plain JSON.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DataZoneSubscription')
+
+# Position of the SQS record being processed, and totals of the running invocation.
+# Context variables follow the record into its asyncio task and into asyncio.to_thread.
+_batch_position = contextvars.ContextVar('batch_position', default=None)
+_invocation_totals = contextvars.ContextVar('invocation_totals', default=None)
+
+
+class CallOutcome:
+    '''Outcome of one outbound call, filled in by the caller while the call is recorded.'''
+    def __init__(self) -> None:
+        self.status = None
+        self.retries = 0
+        self.metrics = {}
+
+    def from_http_response(self, response):
+        '''Takes the status and retry count of a urllib3 response.'''
+        self.status = response.status
+        self.retries = len(response.retries.history) if response.retries else 0
+
+    def from_boto3_response(self, response):
+        '''Takes the status and retry count of a boto3 response.'''
+        metadata = response.get('ResponseMetadata', {})
+        self.status = metadata.get('HTTPStatusCode')
+        self.retries = metadata.get('RetryAttempts', 0)
+
+    def add_metric(self, name, value, unit):
+        '''Adds a metric to the line of the call, e.g. the time the call waited for the rate limiter.'''
+        self.metrics[name] = (value, unit)
+
+    def from_exception(self, error):
+        # botocore ClientError, matched by its attribute so that this module does not import botocore
+        if isinstance(getattr(error, 'response', None), dict):
+            self.status = error.response.get('Error', {}).get('Code')
+            self.retries = error.response.get('ResponseMetadata', {}).get('RetryAttempts', self.retries)
+        elif self.status is None:
+            self.status = type(error).__name__
+
+
+class InvocationTotals:
+    '''Sums the calls of one invocation per service. Calls of concurrently processed records update it from several threads.'''
+    def __init__(self) -> None:
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.duration_ms = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def add(self, service, duration_ms, retries, failed):
+        with self.lock:
+            self.calls[service] += 1
+            self.errors[service] += int(failed)
+            self.retries[service] += retries
+            self.duration_ms[service] += duration_ms
+
+
+def emit(dimensions, metrics, properties):
+    '''Prints one EMF line. metrics maps names to (value, unit), dimensions and properties are plain fields of the line.'''
+    if not METRICS_ENABLED:
+        return
+    line = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()],
+            }],
+        },
+        **dimensions,
+        **{name: value for name, (value, _) in metrics.items()},
+        **{name: value for name, value in properties.items() if value is not None},
+    }
+    print(json.dumps(line, default=str))
+
+
+@contextmanager
+def record_call(service, operation):
+    '''Times the wrapped call and emits its metrics. The yielded CallOutcome takes the status and retries of the response.
+    An exception raised by the call is recorded as a failed call and raised again.'''
+    outcome = CallOutcome()
+    failed = False
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except Exception as e:
+        failed = True
+        outcome.from_exception(e)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        totals = _invocation_totals.get()
+        if totals is not None:
+            totals.add(service, duration_ms, outcome.retries, failed)
+        emit(
+            {'Service': service, 'Operation': operation},
+            {'Duration': (duration_ms, 'Milliseconds'), 'Retries': (outcome.retries, 'Count'), 'Errors': (int(failed), 'Count'), **outcome.metrics},
+            {'Status': outcome.status, 'BatchPosition': _batch_position.get()},
+        )
+
+
+@contextmanager
+def batch_position(position):
+    '''Tags the calls made while processing the record at this position of the SQS batch.'''
+    token = _batch_position.set(position)
+    try:
+        yield
+    finally:
+        _batch_position.reset(token)
+
+
+def record_invocation(handler_name):
+    '''Decorates a lambda handler to emit the duration of the invocation and the totals of its outbound calls per service.'''
+    def decorator(lambda_handler):
+        @functools.wraps(lambda_handler)
+        def wrapper(event, context):
+            totals = InvocationTotals()
+            token = _invocation_totals.set(totals)
+            start = time.perf_counter()
+            try:
+                return lambda_handler(event, context)
+            finally:
+                _invocation_totals.reset(token)
+                metrics = {'InvocationDuration': ((time.perf_counter() - start) * 1000, 'Milliseconds')}
+                if isinstance(event, dict) and 'Records' in event:
+                    metrics['BatchSize'] = (len(event['Records']), 'Count')
+                with totals.lock:
+                    for service in totals.calls:
+                        metrics[f'{service}Calls'] = (totals.calls[service], 'Count')
+                        metrics[f'{service}Errors'] = (totals.errors[service], 'Count')
+                        metrics[f'{service}Retries'] = (totals.retries[service], 'Count')
+                        metrics[f'{service}Duration'] = (totals.duration_ms[service], 'Milliseconds')
+                emit({'Handler': handler_name}, metrics, {'RequestId': getattr(context, 'aws_request_id', None)})
+        return wrapper
+    return decorator
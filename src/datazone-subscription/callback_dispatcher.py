@@ -0,0 +1,145 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Sends the Step Functions task callbacks of a batch concurrently, on a bounded thread pool shared by the warm invocations.
+
+A callback failing with a throttling, server or connection error is retried with exponential backoff and full jitter.
+A callback failing because the task token is no longer valid is not retried: the execution has timed out or stopped, nothing can complete it.
+flush waits for the callbacks sent so far and returns the message ids whose callback could not be delivered, so their records stay in the queue.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from enum import Enum
+
+from aws_clients import get_client
+from call_metrics import record_call
+from invocation_deadline import remaining_secs
+from structured_logging import get_logger
+
+logger = get_logger()
+
+CALLBACK_MAX_WORKERS = int(os.environ.get('CALLBACK_MAX_WORKERS', 10))
+CALLBACK_MAX_ATTEMPTS = int(os.environ.get('CALLBACK_MAX_ATTEMPTS', 4))
+CALLBACK_BACKOFF_BASE_SECS = float(os.environ.get('CALLBACK_BACKOFF_BASE_SECS', 0.2))
+CALLBACK_BACKOFF_MAX_SECS = float(os.environ.get('CALLBACK_BACKOFF_MAX_SECS', 2.0))
+
+# Step Functions errors meaning the task can no longer be completed, retrying or redelivering the record cannot help.
+PERMANENT_CALLBACK_ERRORS = {'InvalidToken', 'TaskDoesNotExist', 'TaskTimedOut', 'InvalidOutput', 'ValidationException'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Used in callback to tell statemachine if the response should be handled as success or error
+class StepFunctionCallbackStatus(Enum):
+    SUCCESS = 1
+    FAILURE = 2
+
+
+def get_executor():
+    '''Returns the callback thread pool, created on first use and kept for the next warm invocations.'''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CALLBACK_MAX_WORKERS, thread_name_prefix='callback')
+        return _executor
+
+
+def callback_error_code(error):
+    '''Returns the error code of a botocore ClientError, or None for other exceptions, e.g. connection errors.'''
+    # matched by its attribute so that this module does not import botocore
+    if isinstance(getattr(error, 'response', None), dict):
+        return error.response.get('Error', {}).get('Code')
+    return None
+
+
+class CallbackDispatcher:
+    '''Dispatches the callbacks of one invocation. Callbacks sent twice with the same task token are coalesced into the first one.'''
+    def __init__(self) -> None:
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def send(self, callback_token, messageId, callback_status, response):
+        '''Schedules the callback and returns without waiting for it.'''
+        with self.lock:
+            if callback_token in self.futures:
+                logger.info("Callback for messageId %s is already scheduled with the same task token, skipping it.", messageId)
+                return
+            # the callback keeps the batch position and invocation totals of the record that sent it
+            self.futures[callback_token] = (messageId, get_executor().submit(
+                contextvars.copy_context().run, self.__deliver, callback_token, messageId, callback_status, response, time.perf_counter()
+            ))
+
+    def flush(self):
+        '''Waits for every scheduled callback. Returns the message ids of the callbacks that could not be delivered.'''
+        with self.lock:
+            scheduled = list(self.futures.values())
+        wait([future for _, future in scheduled])
+        undelivered = [messageId for messageId, future in scheduled if not future.result()]
+        logger.info("Sent %s callbacks, %s could not be delivered.", len(scheduled) - len(undelivered), len(undelivered))
+        return undelivered
+
+    def __deliver(self, callback_token, messageId, callback_status, response, scheduled_at):
+        # Returns True when the callback is done with, either delivered or not deliverable anymore.
+        queue_wait_ms = (time.perf_counter() - scheduled_at) * 1000
+        for attempt in range(1, CALLBACK_MAX_ATTEMPTS + 1):
+            try:
+                self.__call(callback_token, callback_status, response, attempt, queue_wait_ms)
+                logger.info("Sent callback for messageId %s", messageId)
+                return True
+            except Exception as e:
+                error_code = callback_error_code(e)
+                if error_code in PERMANENT_CALLBACK_ERRORS:
+                    logger.error(
+                        "CallbackDispatcher. Dropping callback for messageId %s, %s: %s. The step function that created the taskToken is not running anymore.", messageId, error_code, e
+                    )
+                    return True
+                if attempt == CALLBACK_MAX_ATTEMPTS:
+                    logger.error("CallbackDispatcher. Could not send callback for messageId %s after %s attempts. %s. Will keep message to Q and retry.", messageId, attempt, e)
+                    return False
+                delay = random.uniform(0, min(CALLBACK_BACKOFF_MAX_SECS, CALLBACK_BACKOFF_BASE_SECS * 2 ** (attempt - 1)))
+                remaining = remaining_secs()
+                if remaining is not None and remaining <= delay:
+                    logger.error("CallbackDispatcher. No time left in the invocation to retry callback for messageId %s. %s. Will keep message to Q and retry.", messageId, e)
+                    return False
+                logger.warning("CallbackDispatcher. Callback for messageId %s failed with %s, retrying in %.2fs.", messageId, error_code or type(e).__name__, delay)
+                time.sleep(delay)
+
+    def __call(self, callback_token, callback_status, response, attempt, queue_wait_ms):
+        logger.info("Calling stepfunctions with status %s", callback_status)
+        if callback_status == StepFunctionCallbackStatus.SUCCESS:
+            with record_call("StepFunctions", "SendTaskSuccess") as call:
+                call.add_metric('Attempt', attempt, 'Count')
+                call.add_metric('QueueWait', queue_wait_ms, 'Milliseconds')
+                call.from_boto3_response(get_client("stepfunctions").send_task_success(
+                    taskToken=callback_token, output=json.dumps(response)
+                ))
+        elif callback_status == StepFunctionCallbackStatus.FAILURE:
+            with record_call("StepFunctions", "SendTaskFailure") as call:
+                call.add_metric('Attempt', attempt, 'Count')
+                call.add_metric('QueueWait', queue_wait_ms, 'Milliseconds')
+                call.from_boto3_response(get_client("stepfunctions").send_task_failure(
+                    taskToken=callback_token, error=json.dumps(response)
+                ))
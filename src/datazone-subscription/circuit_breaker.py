@@ -0,0 +1,123 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Defines a circuit breaker failing the requests to an external workflow API fast while the API is known to be unreachable.
+
+The breaker opens after a number of consecutive failures, i.e. connection errors, timeouts and 5xx responses.
+The HTTP client can report each failed attempt of a request being retried, so the breaker opens before the retries are exhausted.
+While open, requests are refused without being sent. Once the open period has elapsed, the breaker lets a single probe request through:
+it closes again if the probe succeeds and reopens otherwise. Every state transition is emitted as an EMF metric.
+"""
+import threading
+import time
+from enum import Enum
+
+from call_metrics import emit
+from structured_logging import get_logger
+
+logger = get_logger()
+
+
+class CircuitState(Enum):
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+
+class CircuitBreaker:
+    '''Tracks the consecutive failures of the requests to one API host. Shared by all invocations of a warm container.'''
+    def __init__(self, name, failure_threshold, open_secs) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_secs = open_secs
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+        self.rejected_count = 0
+        self.opened_count = 0
+
+    def acquire(self):
+        '''Returns whether a request may be sent, and whether it is the probe of a half-open breaker.
+        The caller must pass the outcome of every allowed request to release.'''
+        with self.lock:
+            if self.state == CircuitState.OPEN and time.monotonic() - self.opened_at >= self.open_secs:
+                self.__transition(CircuitState.HALF_OPEN)
+            if self.state == CircuitState.CLOSED:
+                return True, False
+            if self.state == CircuitState.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True, True
+            self.rejected_count += 1
+            return False, False
+
+    def release(self, probe, reachable):
+        '''Records the outcome of a request: True if the API answered, False if it failed, None if the request was abandoned for another reason.'''
+        with self.lock:
+            if probe:
+                self.probe_in_flight = False
+            if reachable is None:
+                return
+            if reachable:
+                self.consecutive_failures = 0
+                if self.state == CircuitState.HALF_OPEN:
+                    self.__transition(CircuitState.CLOSED)
+                return
+            self.__fail()
+
+    def record_failure(self):
+        '''Records a failed attempt of a request still in flight, e.g. one about to be retried. Returns whether the breaker is open,
+        the request should then give up. A request whose attempts were all recorded this way is released with reachable None.'''
+        with self.lock:
+            self.__fail()
+            return self.state != CircuitState.CLOSED
+
+    def retry_in_secs(self):
+        '''Returns the seconds left before an open breaker lets a probe through.'''
+        with self.lock:
+            return max(0.0, self.opened_at + self.open_secs - time.monotonic())
+
+    def stats(self):
+        '''Returns the state of the breaker and counters describing how many requests it refused so far.'''
+        with self.lock:
+            return {
+                'state': self.state.value,
+                'consecutive_failures': self.consecutive_failures,
+                'opened': self.opened_count,
+                'rejected': self.rejected_count,
+            }
+
+    def __fail(self):
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN or (self.state == CircuitState.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.opened_count += 1
+            self.__transition(CircuitState.OPEN)
+
+    def __transition(self, state):
+        logger.warning("Circuit breaker of %s goes from %s to %s, consecutive failures: %s.", self.name, self.state.value, state.value, self.consecutive_failures)
+        emit(
+            {'CircuitBreaker': self.name, 'Transition': f'{self.state.value}_TO_{state.value}'},
+            {'CircuitBreakerTransitions': (1, 'Count')},
+            {'ConsecutiveFailures': self.consecutive_failures},
+        )
+        self.state = state
@@ -20,38 +20,215 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 Defines common functions between handlers
 """
+import asyncio
+import importlib
 import os
-import logging
+from datetime import datetime, timezone
 
 from data_zone_subscription import DataZoneSubscription
-from mock_test_workflow import MockTestWorkflow
-from jira_workflow import JiraWorkflow
+from exceptions import ExternalWorkflowNotReachable
+from async_external_workflow import AsyncJiraWorkflow, AsyncRoutedJiraWorkflow, AsyncWorkflowAdapter
+from polling_schedule import recommend_next_poll_seconds
+from task_token_store import InMemoryTaskTokenStore, SqliteTaskTokenStore, DynamoDbTaskTokenStore
+from idempotency_store import InMemoryIdempotencyStore, SqliteIdempotencyStore, DynamoDbIdempotencyStore
+from structured_logging import get_logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
+
+def payload_correlation_ids(payload):
+    '''Returns the subscription request id and issue key of a command payload, to tag the log lines of its processing.'''
+    if not isinstance(payload, dict):
+        return {}
+    # CREATE_ISSUE commands carry the DataZone event, GET_ISSUE_STATUS commands the response of the previous step
+    metadata = payload.get('detail', {}).get('metadata', {})
+    return {
+        'subscription_request_id': payload.get('subscription_req_id') or metadata.get('id'),
+        'issue_key': payload.get('issue_key'),
+    }
+
+
+# Issue statuses for which the step function keeps waiting, see the Choice state of the subscription step function.
+PENDING_APPROVAL_STATUSES = ("To Do", "In Progress")
+
+def create_jira_workflow(workflow_class):
+    '''Creates the Jira workflow from the JIRA_* environment variables.'''
+    JIRA_DOMAIN = os.environ['JIRA_DOMAIN']
+    # http is only meant for a local Jira stand-in, see scripts/perf/local_jira_server.py
+    JIRA_URL_SCHEME = os.environ.get('JIRA_URL_SCHEME', 'https')
+    JIRA_URL = f"{JIRA_URL_SCHEME}://{JIRA_DOMAIN}/rest/api/latest/issue/"
+    JIRA_SEARCH_URL = f"{JIRA_URL_SCHEME}://{JIRA_DOMAIN}/rest/api/3/search/jql"
+    JIRA_PROJECT_KEY = os.environ['JIRA_PROJECT_KEY']
+    JIRA_ISSUETYPE_ID = os.environ['JIRA_ISSUETYPE_ID']
+    JIRA_SECRET_ARN = os.environ['JIRA_SECRET_ARN']
+    return workflow_class(JIRA_URL, JIRA_SECRET_ARN, JIRA_PROJECT_KEY, JIRA_ISSUETYPE_ID, JIRA_SEARCH_URL)
+
+# Workflow type -> (module, class, factory creating the instance from the class, asynchronous wrapper class).
+# The module of a workflow is only imported when that workflow is created, so e.g. the MOCK workflows never load the Jira client.
+WORKFLOW_REGISTRY = {
+    "MOCK_ACCEPT": ("mock_test_workflow", "MockTestWorkflow", lambda workflow_class: workflow_class(True), AsyncWorkflowAdapter),
+    "MOCK_REJECT": ("mock_test_workflow", "MockTestWorkflow", lambda workflow_class: workflow_class(False), AsyncWorkflowAdapter),
+    "JIRA": ("jira_workflow", "JiraWorkflow", create_jira_workflow, AsyncJiraWorkflow),
+    # several Jira instances or projects, picked per subscription from the routing table of JIRA_ROUTING_TABLE, see jira_routing.py
+    "JIRA_ROUTED": ("jira_routing", "RoutedJiraWorkflow", lambda workflow_class: workflow_class.from_environment(), AsyncRoutedJiraWorkflow),
+}
 
 def create_workflow(workflow_type_string):
-    if workflow_type_string == "MOCK_ACCEPT":
-        return MockTestWorkflow(True)
-    elif workflow_type_string ==  "MOCK_REJECT":
-        return MockTestWorkflow(False)
-    elif workflow_type_string == "JIRA":
-        JIRA_DOMAIN = os.environ['JIRA_DOMAIN']
-        JIRA_URL = f"https://{JIRA_DOMAIN}/rest/api/latest/issue/"
-        JIRA_PROJECT_KEY = os.environ['JIRA_PROJECT_KEY']
-        JIRA_ISSUETYPE_ID = os.environ['JIRA_ISSUETYPE_ID']
-        JIRA_SECRET_ARN = os.environ['JIRA_SECRET_ARN']
-        return JiraWorkflow(JIRA_URL, JIRA_SECRET_ARN, JIRA_PROJECT_KEY, JIRA_ISSUETYPE_ID)
+    if workflow_type_string not in WORKFLOW_REGISTRY:
+        raise RuntimeError(f"Unsupported workflow type {workflow_type_string}, try one of the following types: {', '.join(WORKFLOW_REGISTRY)}")
+    module_name, class_name, factory, _ = WORKFLOW_REGISTRY[workflow_type_string]
+    workflow_class = getattr(importlib.import_module(module_name), class_name)
+    return factory(workflow_class)
+
+def create_task_token_store(store_type_string):
+    '''Creates the store parking task tokens of pending issues for the Jira webhook. Returns None when webhooks are not used.'''
+    if not store_type_string or store_type_string == "NONE":
+        return None
+    elif store_type_string == "MEMORY":
+        return InMemoryTaskTokenStore()
+    elif store_type_string == "SQLITE":
+        return SqliteTaskTokenStore(os.environ.get('TASK_TOKEN_SQLITE_PATH', '/tmp/task_tokens.db'))
+    elif store_type_string == "DYNAMODB":
+        return DynamoDbTaskTokenStore(os.environ['TASK_TOKEN_TABLE_NAME'])
     else:
-        raise RuntimeError(f"Unsupported workflow type {workflow_type_string}, try one of the following types: MOCK_ACCEPT, MOCK_REJECT, JIRA")
+        raise RuntimeError(f"Unsupported task token store type {store_type_string}, try one of the following types: NONE, MEMORY, SQLITE, DYNAMODB")
 
-def create_issue_from_dz_subscription(external_workflow, event, default_approver):
-    '''Obtains more details about the subscription information from DataZone based on the input event, then creates a new issue in the external workflow system.'''
+def create_idempotency_store(store_type_string):
+    '''Creates the store remembering the issue created for each subscription request. Returns None when CREATE_ISSUE is not deduplicated.'''
+    if not store_type_string or store_type_string == "NONE":
+        return None
+    elif store_type_string == "MEMORY":
+        return InMemoryIdempotencyStore()
+    elif store_type_string == "SQLITE":
+        return SqliteIdempotencyStore(os.environ.get('IDEMPOTENCY_SQLITE_PATH', '/tmp/idempotency.db'))
+    elif store_type_string == "DYNAMODB":
+        return DynamoDbIdempotencyStore(os.environ['IDEMPOTENCY_TABLE_NAME'])
+    else:
+        raise RuntimeError(f"Unsupported idempotency store type {store_type_string}, try one of the following types: NONE, MEMORY, SQLITE, DYNAMODB")
+
+def build_issue_created_response(dz_subscription, issue_key):
+    '''Builds the CREATE_ISSUE result handed back to the step function. It carries the creation time used to schedule the polls.'''
+    issue_created_at = datetime.now(timezone.utc).isoformat()
+    return {
+        'statusCode': 200,
+        'domain_id': dz_subscription.domain_id,
+        'subscription_req_id': dz_subscription.subscription_req_id,
+        'issue_key': issue_key,
+        'issue_created_at': issue_created_at,
+        'status_changed_at': issue_created_at,
+        'next_poll_seconds': recommend_next_poll_seconds(issue_created_at, issue_created_at)
+    }
+
+def build_issue_status_response(payload, issue_key, approval_status, approver, issue_updated=None):
+    '''Builds the GET_ISSUE_STATUS result handed back to the step function, from the payload of the polling task and the current issue status.
+    The payload is the result of the previous CREATE_ISSUE or GET_ISSUE_STATUS command, it tells when the issue was created and its status last changed.
+    issue_updated is the time the issue was last updated in the external workflow system, the next poll passes it back to skip an unchanged issue.'''
+    timestamp = datetime.now(timezone.utc).isoformat()
+    status_changed_at = payload.get('status_changed_at')
+    if approval_status != payload.get('approval_status', approval_status) or not status_changed_at:
+        status_changed_at = timestamp
+    return {
+        'statusCode': 200,
+        'domain_id': payload.get('domain_id'),
+        'subscription_req_id': payload.get('subscription_req_id'),
+        'issue_key': issue_key,
+        'approver': approver,
+        'approval_status': approval_status,
+        'issue_updated': issue_updated,
+        'timestamp': timestamp,
+        'issue_created_at': payload.get('issue_created_at'),
+        'status_changed_at': status_changed_at,
+        'next_poll_seconds': recommend_next_poll_seconds(payload.get('issue_created_at'), status_changed_at)
+    }
+
+def create_async_workflow(workflow_type_string):
+    '''Creates the asynchronous variant of the external workflow, used to process several records of a batch concurrently.'''
+    external_workflow = create_workflow(workflow_type_string)
+    async_wrapper_class = WORKFLOW_REGISTRY[workflow_type_string][3]
+    return async_wrapper_class(external_workflow)
+
+def get_dz_subscription_info(event):
+    '''Parses the input event and obtains more details about the subscription information from DataZone.'''
     dz_subscription = DataZoneSubscription.fromEvent(event)
 
     dz_subscription.get_subscription_info()
-    
+
+    return dz_subscription
+
+def create_issue_from_dz_subscription(external_workflow, event, default_approver):
+    '''Obtains more details about the subscription information from DataZone based on the input event, then creates a new issue in the external workflow system.'''
+    dz_subscription = get_dz_subscription_info(event)
+
     issue_key = external_workflow.create_issue(dz_subscription, default_approver)
 
     return issue_key, dz_subscription
 
+async def create_issues_from_dz_subscriptions_async(async_external_workflow, commands, default_approver, max_concurrency, idempotency_store=None, idempotency_ttl_secs=0):
+    '''Asynchronous, batched variant of create_issue_from_dz_subscription, for a list of tuples of input event and redelivery flag.
+    Returns one entry per command, in order: a tuple of issue key and DataZoneSubscription, or the exception raised for that command.
+
+    An issue already created for the subscription request is returned instead of creating a new one. It is looked up in the idempotency store,
+    and for a redelivered command also in the external workflow, before any call to DataZone.
+    The other commands are enriched from DataZone concurrently, at most max_concurrency at a time, then their issues are created with one call.'''
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def prepare(event, redelivered):
+        async with semaphore:
+            subscription_req_id = event['detail']['metadata']['id']
+            issue_key = await find_created_issue(async_external_workflow, subscription_req_id, idempotency_store, idempotency_ttl_secs, redelivered)
+            if issue_key is not None:
+                logger.info("Issue %s was already created for subscription request %s.", issue_key, subscription_req_id)
+                return issue_key, DataZoneSubscription.fromEvent(event)
+            return None, await asyncio.to_thread(get_dz_subscription_info, event)
+
+    results = await asyncio.gather(*(prepare(event, redelivered) for event, redelivered in commands), return_exceptions=True)
+
+    to_create = [position for position, result in enumerate(results) if not isinstance(result, BaseException) and result[0] is None]
+    if not to_create:
+        return results
+
+    subscriptions = [(results[position][1], default_approver) for position in to_create]
+    try:
+        created = await async_external_workflow.create_issues(subscriptions)
+    except Exception as e:
+        # e.g. ExternalWorkflowNotReachable, no issue was created
+        created = [e] * len(to_create)
+
+    remembered = []
+    for position, (dz_subscription, _), outcome in zip(to_create, subscriptions, created):
+        if isinstance(outcome, Exception):
+            results[position] = outcome
+            continue
+        results[position] = (outcome, dz_subscription)
+        if idempotency_store is not None:
+            remembered.append(remember_created_issue(idempotency_store, dz_subscription.subscription_req_id, outcome, idempotency_ttl_secs))
+    await asyncio.gather(*remembered)
+
+    return results
+
+async def find_created_issue(async_external_workflow, subscription_req_id, idempotency_store, idempotency_ttl_secs, redelivered):
+    '''Returns the key of the issue already created for the subscription request, or None.
+    The external workflow is only searched for redelivered commands: the first delivery can not have created an issue yet.
+    It covers issues created right before the store could be updated, and deployments without a store.
+    A store that can not be read raises ExternalWorkflowNotReachable, the command is then retried rather than risking a duplicate issue.'''
+    if idempotency_store is not None:
+        try:
+            issue_key = await asyncio.to_thread(idempotency_store.get, subscription_req_id)
+        except Exception as e:
+            raise ExternalWorkflowNotReachable(f"Could not read the idempotency store for subscription request {subscription_req_id}. {e}") from e
+        if issue_key is not None:
+            return issue_key
+
+    if not redelivered:
+        return None
+
+    issue_key = await async_external_workflow.find_issue(subscription_req_id)
+    if issue_key is not None and idempotency_store is not None:
+        await remember_created_issue(idempotency_store, subscription_req_id, issue_key, idempotency_ttl_secs)
+    return issue_key
+
+async def remember_created_issue(idempotency_store, subscription_req_id, issue_key, idempotency_ttl_secs):
+    '''Stores the issue created for the subscription request. A failure is only logged: the issue exists, and a redelivered command still finds it in the external workflow.'''
+    try:
+        await asyncio.to_thread(idempotency_store.put, subscription_req_id, issue_key, idempotency_ttl_secs)
+    except Exception as e:
+        logger.warning("Could not remember issue %s of subscription request %s in the idempotency store. %s", issue_key, subscription_req_id, e)
@@ -17,9 +17,95 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import contextvars
 import json
-import boto3
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
 import botocore
+from concurrent.futures import ThreadPoolExecutor
+from assumed_role_provider import get_assumed_role_client
+from aws_clients import get_client
+from call_metrics import record_call
+from structured_logging import get_logger
+
+logger = get_logger()
+
+# The DataZone lookups enriching a subscription only depend on the parsed event, they run concurrently on a bounded pool.
+DZ_ENRICHMENT_MAX_WORKERS = 3
+# Listings of a subscription request returned without their forms are fetched with GetListing, at most that many at the same time.
+DZ_LISTING_MAX_WORKERS = int(os.environ.get('DZ_LISTING_MAX_WORKERS', 10))
+
+# DataZone metadata shared by many subscription requests is cached across warm invocations of the lambda.
+DZ_METADATA_CACHE_TTL_SECS = int(os.environ.get('DZ_METADATA_CACHE_TTL_SECS', 300))
+DZ_METADATA_CACHE_MAX_ENTRIES = int(os.environ.get('DZ_METADATA_CACHE_MAX_ENTRIES', 256))
+
+
+class TTLCache:
+    '''Bounded cache evicting the least recently used entry when full and any entry older than its TTL. Counts hits and misses.'''
+    def __init__(self, max_entries, ttl_secs) -> None:
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''Returns the cached value or None when the key is missing or expired.'''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl_secs)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+# project name by (domain id, project id)
+_project_name_cache = TTLCache(DZ_METADATA_CACHE_MAX_ENTRIES, DZ_METADATA_CACHE_TTL_SECS)
+# requester type and details by (domain id, user id)
+_requester_cache = TTLCache(DZ_METADATA_CACHE_MAX_ENTRIES, DZ_METADATA_CACHE_TTL_SECS)
+# parsed listings by (listing id, listing revision)
+_listings_cache = TTLCache(DZ_METADATA_CACHE_MAX_ENTRIES, DZ_METADATA_CACHE_TTL_SECS)
+
+
+def get_metadata_cache_stats():
+    '''Returns hit and miss counters of the DataZone metadata caches. Every hit on the project and requester caches is a DataZone API call saved.'''
+    return {
+        'project_name': _project_name_cache.stats(),
+        'requester': _requester_cache.stats(),
+        'listings': _listings_cache.stats(),
+    }
+
+
+class SubscribedListing(NamedTuple):
+    '''Details of one asset listing of a subscription request, as shown in the issue.'''
+    name: str
+    owner_project_name: str
+    data_type: str
+    account: str
+    region: str
+    table_tech_name: str
+    table_arn: str
+    db_name: str
+    bucket_location: str
 
 
 class DataZoneSubscription:
@@ -34,7 +120,8 @@ class DataZoneSubscription:
         '''Constructor getting details as parameters.'''
         try:
             if role_arn is None:
-                self.dz_client = boto3.client("datazone")
+                # the client of the lambda role is shared by all subscriptions of the container
+                self.dz_client = get_client("datazone")
             else:
                 self.dz_client = self.__assume_admin_role(role_arn)
 
@@ -44,60 +131,64 @@ class DataZoneSubscription:
         except botocore.exceptions.ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"An error occurred: {error_code} - {error_message}")
+            logger.error("An error occurred: %s - %s", error_code, error_message)
             raise e
 
     def get_subscription_info(self):
-        self.__get_project_name_from_id()
-
-        # Issue currently noticed on the documentation, this API call only works with 'SSO' as an input for both IAM and SSO objects
+        # Issue currently noticed on the documentation, get_user_profile only works with 'SSO' as an input for both IAM and SSO objects
         # I raised an issue for it
+        lookups = [
+            (self.__get_project_name_from_id, ()),
+            (self.__get_user_from_dz_id, ('SSO',)),
+            (self.__get_subscription_details, ()),
+        ]
 
-        self.__get_user_from_dz_id('SSO')
+        with ThreadPoolExecutor(max_workers=DZ_ENRICHMENT_MAX_WORKERS) as executor:
+            # each lookup runs in a copy of the caller's context, so its call metrics and log lines keep the batch position and correlation ids of the record
+            futures = [executor.submit(contextvars.copy_context().run, lookup, *args) for lookup, args in lookups]
 
-        self.__get_subscription_details()
+        # Report every failed lookup, then raise the first one in call order as the sequential calls did
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        for error in errors[1:]:
+            logger.error("An additional error occurred while getting subscription info: %s", error)
+        if errors:
+            raise errors[0]
 
     def accept_subscription(self, acceptance_reason):
         try:
-            return self.dz_client.accept_subscription_request(
-                decisionComment=acceptance_reason,
-                domainIdentifier=self.domain_id,
-                identifier=self.subscription_req_id
-            )
+            with record_call("DataZone", "AcceptSubscriptionRequest") as call:
+                response = self.dz_client.accept_subscription_request(
+                    decisionComment=acceptance_reason,
+                    domainIdentifier=self.domain_id,
+                    identifier=self.subscription_req_id
+                )
+                call.from_boto3_response(response)
+            return response
         except botocore.exceptions.ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"An error occurred: {error_code} - {error_message}")
+            logger.error("An error occurred: %s - %s", error_code, error_message)
             raise e
 
     def reject_subscription(self, rejection_reason):
         try:
-            return self.dz_client.reject_subscription_request(
-                decisionComment=rejection_reason,
-                domainIdentifier=self.domain_id,
-                identifier=self.subscription_req_id
-            )
+            with record_call("DataZone", "RejectSubscriptionRequest") as call:
+                response = self.dz_client.reject_subscription_request(
+                    decisionComment=rejection_reason,
+                    domainIdentifier=self.domain_id,
+                    identifier=self.subscription_req_id
+                )
+                call.from_boto3_response(response)
+            return response
         except botocore.exceptions.ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"An error occurred: {error_code} - {error_message}")
+            logger.error("An error occurred: %s - %s", error_code, error_message)
             raise e
 
     def __assume_admin_role(self, role_arn):
-        sts_client = boto3.client('sts')
-        assumed_role = sts_client.assume_role(
-            RoleArn=role_arn,
-            RoleSessionName="AssumeRoleSessionForDZSubGrant"
-        )
-
-        credentials = assumed_role['Credentials']
-        dz_api_client = boto3.client(
-            "datazone",
-            aws_access_key_id=credentials["AccessKeyId"],
-            aws_secret_access_key=credentials["SecretAccessKey"],
-            aws_session_token=credentials["SessionToken"]
-        )
-        return dz_api_client
+        # The assumed role session and its DataZone client are reused across warm invocations until shortly before the credentials expire
+        return get_assumed_role_client(role_arn, "datazone")
 
     def __parse_dz_event(self, event):
         # Parse metadata
@@ -107,7 +198,7 @@ class DataZoneSubscription:
 
         # Parse data
         self.requester_id = event['detail']['data']['requesterId']
-        self.data_owner_project = event['detail']['data']['subscribedListings'][0]['ownerProjectId']
+        self.data_owner_projects = [listing['ownerProjectId'] for listing in event['detail']['data']['subscribedListings']]
         self.request_date = event['time']
 
     def __get_db_from_arn(self, table_arn):
@@ -115,23 +206,67 @@ class DataZoneSubscription:
         return table_arn_splitted[1]
 
     def __get_subscription_details(self):
-        response = self.dz_client.get_subscription_request_details(
-            domainIdentifier=self.domain_id,
-            identifier=self.subscription_req_id
-        )
+        with record_call("DataZone", "GetSubscriptionRequestDetails") as call:
+            response = self.dz_client.get_subscription_request_details(
+                domainIdentifier=self.domain_id,
+                identifier=self.subscription_req_id
+            )
+            call.from_boto3_response(response)
 
         subscribed_listings = response.get('subscribedListings', [])
         if not subscribed_listings:
             raise ValueError(
                 "No subscribed listings found in the response.")
 
-        target_data_info = subscribed_listings[0].get(
-            'item', {}).get('assetListing', {})
-        if not target_data_info:
+        self.request_reason = response.get('requestReason')
+        self.listings = self.__resolve_listings(subscribed_listings)
+
+    def __resolve_listings(self, subscribed_listings):
+        # Listings are resolved from the cache, then from the forms embedded in the response.
+        # Only the listings returned without their forms need a GetListing call, those calls run concurrently.
+        listings = [None] * len(subscribed_listings)
+        detached = []
+        for position, subscribed_listing in enumerate(subscribed_listings):
+            cache_key = (subscribed_listing.get('id'), subscribed_listing.get('revision'))
+            listing = _listings_cache.get(cache_key) if None not in cache_key else None
+            if listing is not None:
+                listings[position] = listing
+                continue
+            forms = subscribed_listing.get('item', {}).get('assetListing', {}).get('forms')
+            if forms:
+                listings[position] = self.__parse_listing(subscribed_listing, forms)
+            else:
+                detached.append(position)
+
+        if detached:
+            with ThreadPoolExecutor(max_workers=min(DZ_LISTING_MAX_WORKERS, len(detached))) as executor:
+                futures = [
+                    (position, executor.submit(contextvars.copy_context().run, self.__get_listing_forms, subscribed_listings[position]))
+                    for position in detached
+                ]
+            for position, future in futures:
+                listings[position] = self.__parse_listing(subscribed_listings[position], future.result())
+
+        return listings
+
+    def __get_listing_forms(self, subscribed_listing):
+        with record_call("DataZone", "GetListing") as call:
+            response = self.dz_client.get_listing(
+                domainIdentifier=self.domain_id,
+                identifier=subscribed_listing.get('id'),
+                listingRevision=subscribed_listing.get('revision')
+            )
+            call.from_boto3_response(response)
+
+        forms = response.get('item', {}).get('assetListing', {}).get('forms')
+        if not forms:
             raise ValueError(
-                "No target data information found in the response.")
+                f"No target data information found for listing {subscribed_listing.get('id')}.")
+        return forms
 
-        target_data_form = json.loads(target_data_info.get('forms', {}))
+    def __parse_listing(self, subscribed_listing, forms):
+        # The forms of a listing revision never change, the parsed listing can be reused by every request on that revision
+        target_data_form = json.loads(forms)
         if not target_data_form:
             raise ValueError("No target data form found in the response.")
 
@@ -141,30 +276,39 @@ class DataZoneSubscription:
             raise ValueError(
                 "No target data source form found in the response.")
 
-        self.account = target_data_source_form.get(
-            'GlueConfigurationForm', {}).get('accountId')
-        self.region = target_data_form.get(
-            'GlueTableForm', {}).get('region')
-        self.table_tech_name = target_data_form.get(
-            'GlueTableForm', {}).get('tableName')
-        self.table_arn = target_data_form.get(
-            'GlueTableForm', {}).get('tableArn')
-        self.db_name = self.__get_db_from_arn(self.table_arn)
-        self.bucket_location = target_data_form.get(
-            'GlueTableForm', {}).get('sourceLocation')
-        self.owner_project_name = subscribed_listings[0].get(
-            'ownerProjectName')
-        self.table_catalog_name = subscribed_listings[0].get('name')
-        self.request_reason = response.get('requestReason')
-        self.data_type = target_data_source_form.get(
-            'DataSourceCommonForm', {}).get('type')
+        glue_table_form = target_data_form.get('GlueTableForm', {})
+        table_arn = glue_table_form.get('tableArn')
+        listing = SubscribedListing(
+            name=subscribed_listing.get('name'),
+            owner_project_name=subscribed_listing.get('ownerProjectName'),
+            data_type=target_data_source_form.get('DataSourceCommonForm', {}).get('type'),
+            account=target_data_source_form.get('GlueConfigurationForm', {}).get('accountId'),
+            region=glue_table_form.get('region'),
+            table_tech_name=glue_table_form.get('tableName'),
+            table_arn=table_arn,
+            db_name=self.__get_db_from_arn(table_arn),
+            bucket_location=glue_table_form.get('sourceLocation'),
+        )
+
+        cache_key = (subscribed_listing.get('id'), subscribed_listing.get('revision'))
+        if None not in cache_key:
+            _listings_cache.put(cache_key, listing)
+        return listing
 
     def __get_user_from_dz_id(self, user_type):
-        response = self.dz_client.get_user_profile(
-            domainIdentifier=self.domain_id,
-            type=user_type,
-            userIdentifier=self.requester_id
-        )
+        cache_key = (self.domain_id, self.requester_id)
+        cached = _requester_cache.get(cache_key)
+        if cached is not None:
+            self.requester_type, self.requester_details = cached
+            return
+
+        with record_call("DataZone", "GetUserProfile") as call:
+            response = self.dz_client.get_user_profile(
+                domainIdentifier=self.domain_id,
+                type=user_type,
+                userIdentifier=self.requester_id
+            )
+            call.from_boto3_response(response)
         self.requester_details = ''
         self.requester_type = response.get('type')
 
@@ -176,15 +320,26 @@ class DataZoneSubscription:
             self.requester_details = response.get(
                 'details', {}).get('iam', {}).get('arn')
 
+        _requester_cache.put(cache_key, (self.requester_type, self.requester_details))
+
     def __get_project_name_from_id(self):
+        cache_key = (self.domain_id, self.project_subscriber_id)
+        cached = _project_name_cache.get(cache_key)
+        if cached is not None:
+            self.project_name = cached
+            return
+
         try:
-            response = self.dz_client.get_project(
-                domainIdentifier=self.domain_id,
-                identifier=self.project_subscriber_id
-            )
+            with record_call("DataZone", "GetProject") as call:
+                response = self.dz_client.get_project(
+                    domainIdentifier=self.domain_id,
+                    identifier=self.project_subscriber_id
+                )
+                call.from_boto3_response(response)
             self.project_name = response['name']
+            _project_name_cache.put(cache_key, self.project_name)
         except botocore.exceptions.ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"An error occurred: {error_code} - {error_message}")
+            logger.error("An error occurred: %s - %s", error_code, error_message)
             raise e
@@ -27,4 +27,26 @@ class ExternalWorkflowNotReachable(Exception):
 class ExternalWorkflowRespondedWithNOK(Exception):
     # external workflow responded but the response was not 2xx.
     # pop message and ask step function to continue on fail branch.
-    pass
\ No newline at end of file
+    pass
+
+# Custom exception - the invocation ran out of time before the external workflow could be called or answered
+class InvocationDeadlineExceeded(ExternalWorkflowNotReachable):
+    # no time left in the lambda invocation.
+    # Do not pop message from queue, the next delivery processes it.
+    pass
+
+
+# Custom exception - the circuit breaker refused the request, the external workflow failed repeatedly just before
+class ExternalWorkflowCircuitOpen(ExternalWorkflowNotReachable):
+    # the request was not sent at all.
+    # Do not pop message from queue and retry.
+    pass
+
+
+# Custom exception - one target of a routed external workflow could not be reached, the other targets may be
+class ExternalWorkflowTargetNotReachable(ExternalWorkflowNotReachable):
+    # only the messages of that target are kept in the queue and retried.
+    # the messages of the other targets are processed.
+    def __init__(self, target, error) -> None:
+        super().__init__(f"Target {target} not reachable: {error}" if str(error) else f"Target {target} not reachable")
+        self.target = target
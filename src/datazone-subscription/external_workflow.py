@@ -18,11 +18,22 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 from abc import abstractmethod
+from typing import NamedTuple
 from data_zone_subscription import DataZoneSubscription
-import logging
+from exceptions import ExternalWorkflowRespondedWithNOK
+from structured_logging import get_logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
+
+class IssueStatus(NamedTuple):
+    '''Status of an issue returned by get_issues_status. updated is the time the issue was last updated, when the external workflow system reports it.'''
+    approval_status: str
+    approver: str
+    updated: str = None
+
+class IssueUnchanged(NamedTuple):
+    '''Returned by get_issues_status for an issue not updated since the time given for it in issues_updated: its status is the one read by the previous poll.'''
+    updated: str
 
 class IExternalWorkflow():
     '''Represents an external workflow system and all the interactions possible with it.'''
@@ -35,3 +46,37 @@ class IExternalWorkflow():
     def get_issue_status(self, issue_key):
         '''Retrieves the current issue status from the external workflow system. Returns a tuple of approval status and approver.'''
         pass
+
+    def get_issues_status(self, issue_keys, issues_updated=None):
+        '''Retrieves the current status of several issues at once. Returns a dict mapping each issue key to its IssueStatus,
+        or to the ExternalWorkflowRespondedWithNOK error of that issue. Issue keys that could not be found may also be left out of the result.
+        issues_updated optionally maps issue keys to the update time returned for them by a previous call. Implementations tracking update times
+        return IssueUnchanged for the issues not updated since.
+        A routed workflow maps the keys of an unreachable target to its ExternalWorkflowTargetNotReachable error.
+        Implementations should override this with a single batched call when the external workflow system supports it.'''
+        issues_status = {}
+        for issue_key in issue_keys:
+            try:
+                issues_status[issue_key] = IssueStatus(*self.get_issue_status(issue_key))
+            except ExternalWorkflowRespondedWithNOK as e:
+                logger.error("get_issues_status(). Could not get status for issue %s. %s", issue_key, e)
+                issues_status[issue_key] = e
+        return issues_status
+
+    def create_issues(self, subscriptions):
+        '''Creates one issue per tuple of DataZone subscription and assignee. Returns one entry per tuple, in order: the key of the new issue,
+        or the ExternalWorkflowRespondedWithNOK error of that issue. ExternalWorkflowNotReachable is raised for the whole call,
+        except by a routed workflow, which returns the ExternalWorkflowTargetNotReachable error of an unreachable target for the issues of that target.
+        Implementations should override this with a single bulk call when the external workflow system supports it.'''
+        results = []
+        for dz_subscription, assignee in subscriptions:
+            try:
+                results.append(self.create_issue(dz_subscription, assignee))
+            except ExternalWorkflowRespondedWithNOK as e:
+                results.append(e)
+        return results
+
+    def find_issue(self, subscription_req_id):
+        '''Returns the key of an issue already created for the subscription request, or None. Used when a CREATE_ISSUE command is delivered again.
+        Workflows that can not look up their issues keep this default and only rely on the idempotency store.'''
+        return None
@@ -20,45 +20,46 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 Defines the lambda handler triggered by the DZ subscription step function to update the subscription status when the status of the external workflow ticket has changed.
 """
-import logging
 import os
 
 from data_zone_subscription import DataZoneSubscription
+from call_metrics import record_invocation
+from structured_logging import get_logger, log_invocation, add_correlation_ids
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
 
 subscription_change_role_arn = os.environ['SUBSCRIPTION_CHANGE_ROLE_ARN']
 
 
+@record_invocation("change-subscription-status")
+@log_invocation
 def lambda_handler(event, context):
-    logger.info(f"=======================")
-    logger.info(f"change-subscription-status - Event: {str(event)}")
-    logger.info(f"=======================")
-    logger.info(f"SUBSCRIPTION_CHANGE_ROLE_ARN={subscription_change_role_arn}")
+    logger.debug("change-subscription-status - Event: %s", event)
+    logger.info("SUBSCRIPTION_CHANGE_ROLE_ARN=%s", subscription_change_role_arn)
     
     domain_id = event['Payload']['domain_id']
     issue_key = event['Payload']['issue_key']
     sub_req_id = event['Payload']['subscription_req_id']
     approver = event['Payload']['approver']
     approval_status = event['Payload']['approval_status']
+    add_correlation_ids(subscription_request_id=sub_req_id, issue_key=issue_key)
     status_change_reason = f'Status of subscription changed to {approval_status} by {approver} based on issue {issue_key}.'
 
     dz_subscription = DataZoneSubscription(domain_id, sub_req_id, subscription_change_role_arn)
 
     if approval_status == 'Rejected':
-        logger.info(f"Rejecting subscription request {sub_req_id} based on issue {issue_key}.")
+        logger.info("Rejecting subscription request %s based on issue %s.", sub_req_id, issue_key)
         response = dz_subscription.reject_subscription(status_change_reason)
-        logger.info(f"Rejection response: {str(response)}")
+        logger.debug("Rejection response: %s", response)
 
     elif approval_status == 'Accepted':
-        logger.info(f"Approving subscription request {sub_req_id} based on issue {issue_key}.")
+        logger.info("Approving subscription request %s based on issue %s.", sub_req_id, issue_key)
         response = dz_subscription.accept_subscription(status_change_reason) 
-        logger.info(f"Approval response: {str(response)}")
+        logger.debug("Approval response: %s", response)
         
     else:
-        logger.info(f"Approval status is neither 'Approved' nor 'Rejected', skipping without changing subscription status.")
+        logger.info("Approval status is neither 'Approved' nor 'Rejected', skipping without changing subscription status.")
         status_change_reason = f'No relevant change in status.'
 
     return {
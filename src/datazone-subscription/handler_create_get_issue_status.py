@@ -30,56 +30,48 @@ This function also gets called repeatedly by the step function to check if the t
 
 
 import os
-import logging
 
-from common import create_workflow, create_issue_from_dz_subscription
+from common import create_workflow, create_issue_from_dz_subscription, build_issue_created_response, build_issue_status_response, payload_correlation_ids
+from call_metrics import record_invocation
+from data_zone_subscription import get_metadata_cache_stats
+from structured_logging import get_logger, log_invocation, add_correlation_ids
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
 default_approver = os.environ['SUBSCRIPTION_DEFAULT_APPROVER_ID']
 workflow_type = os.environ['WORKFLOW_TYPE']
 
 
+@record_invocation("create-get-issue-status")
+@log_invocation
 def lambda_handler(event, context):
-    logger.info(f"=======================")
-    logger.info(f"create-get-issue-status - Event: {str(event)}")
-    logger.info(f"=======================")
-    logger.info(f"SUBSCRIPTION_DEFAULT_APPROVER_ID={default_approver}")
-    logger.info(f"WORKFLOW_TYPE={workflow_type}")
+    logger.debug("create-get-issue-status - Event: %s", event)
+    logger.info("SUBSCRIPTION_DEFAULT_APPROVER_ID=%s", default_approver)
+    logger.info("WORKFLOW_TYPE=%s", workflow_type)
     
 
     external_workflow = create_workflow(workflow_type)
 
     command = event.get('Command', None)
     event = event.get('Payload', None)
+    add_correlation_ids(**payload_correlation_ids(event))
 
-    logger.info(f"Command = {command}")
+    logger.info("Command = %s", command)
 
     if command == "CREATE_ISSUE":
         logger.info("Creating issue for DZ subscription.")
         issue_key, dz_subscription = create_issue_from_dz_subscription(external_workflow, event, default_approver)
-        response_data = {
-            'statusCode': 200,
-            'domain_id': dz_subscription.domain_id,
-            'subscription_req_id': dz_subscription.subscription_req_id,
-            'issue_key': issue_key
-        }
+        add_correlation_ids(issue_key=issue_key)
+        response_data = build_issue_created_response(dz_subscription, issue_key)
+        logger.info("DataZone metadata cache stats: %s", get_metadata_cache_stats())
     elif command == "GET_ISSUE_STATUS":
         issue_key = event.get("issue_key")
         if not issue_key:
             raise ValueError("Missing 'issue_key' in the event data.")
         
-        logger.info(f"Getting issue status for issue key {issue_key}.")
+        logger.info("Getting issue status for issue key %s.", issue_key)
         approval_status, approver = external_workflow.get_issue_status(issue_key)
-        response_data = {
-            'statusCode': 200,
-            'domain_id': event.get('domain_id'),
-            'subscription_req_id': event.get('subscription_req_id'),
-            'issue_key': issue_key,
-            'approver': approver,
-            'approval_status': approval_status
-        }
+        response_data = build_issue_status_response(event, issue_key, approval_status, approver)
     else:
         raise ValueError("Command not defined under expected key 'command' or command has invalid value. Only CREATE_ISSUE or GET_ISSUE_STATUS are allowed.")
 
@@ -16,28 +16,22 @@ COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
 IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import asyncio
 import json
 import os
-import re
 import time
-import boto3
-from botocore.exceptions import ClientError
-import logging
-import urllib3
-from urllib3._collections import HTTPHeaderDict
-from urllib3.exceptions import MaxRetryError
 # import OpenSSL
-from datetime import datetime, timezone
-from enum import Enum
-from common import create_workflow, create_issue_from_dz_subscription
-from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK
+from common import create_async_workflow, create_issues_from_dz_subscriptions_async, create_task_token_store, create_idempotency_store, build_issue_created_response, build_issue_status_response, payload_correlation_ids, PENDING_APPROVAL_STATUSES
+from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK, ExternalWorkflowTargetNotReachable, InvocationDeadlineExceeded
+from external_workflow import IssueUnchanged
+from call_metrics import record_invocation, batch_position
+from data_zone_subscription import get_metadata_cache_stats
+from callback_dispatcher import CallbackDispatcher, StepFunctionCallbackStatus
+from invocation_deadline import invocation_deadline, CostEstimator
+from structured_logging import get_logger, log_invocation, correlation_scope, add_correlation_ids
 
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-secretsmanager_client = boto3.client("secretsmanager")
-stepfunctions_client = boto3.client("stepfunctions")
+logger = get_logger()
 
 # jira token and certificate
 jira_token = ""
@@ -53,156 +47,276 @@ workflow_params = None
 URLLIB3_BACKOFF_FACTOR = 0.5
 URLLIB3_RETRIES = 10
 
-THROTTLE_SLEEP_TIME_SECS = 2
 
+# =========BATCH STATUS=============
+async def get_batch_issues_status(async_workflow, records):
+    # Resolves the status of every GET_ISSUE_STATUS record in the batch with a single call to the external workflow.
+    # Returns the statuses by issue key and the error to report to every GET_ISSUE_STATUS record if the batch call was refused.
+    # The update time each issue had on its previous poll is passed along, so issues not updated since are answered as unchanged.
+    issue_keys = []
+    issues_updated = {}
+    for record in records:
+        messageBody = json.loads(record["body"])
+        if messageBody.get("Command") == "GET_ISSUE_STATUS":
+            payload = messageBody.get("Payload", {})
+            issue_key = payload.get("issue_key")
+            if issue_key:
+                issue_keys.append(issue_key)
+                if payload.get("issue_updated") and payload.get("approval_status"):
+                    issues_updated[issue_key] = payload["issue_updated"]
+
+    if not issue_keys:
+        return {}, None
+
+    if not status_search_cost.fits():
+        raise InvocationDeadlineExceeded(f"Not enough time left in the invocation for the status search, estimated at {status_search_cost.estimate_secs:.2f}s.")
+    logger.info("Getting issue status for %s issue keys in one batch.", len(issue_keys))
+    try:
+        start = time.perf_counter()
+        issues_status = await async_workflow.get_issues_status(issue_keys, issues_updated)
+        status_search_cost.observe(time.perf_counter() - start)
+        return issues_status, None
+    except ExternalWorkflowRespondedWithNOK as e:
+        logger.error("get_batch_issues_status: Caught ExternalWorkflowRespondedWithNOK. %s", e)
+        return {}, e
+    except ExternalWorkflowNotReachable as e:
+        logger.error("get_batch_issues_status: Caught ExternalWorkflowNotReachable. %s. Will keep all messages to Q and retry.", e)
+        raise e
+
+# =========BATCH CREATE=============
+async def create_batch_issues(async_workflow, records):
+    # Creates the issues of every CREATE_ISSUE record in the batch with a single call to the external workflow.
+    # Returns by message id either a tuple of issue key and DataZone subscription, or the error to report to the record.
+    create_records = []
+    for record in records:
+        messageBody = json.loads(record["body"])
+        if messageBody.get("Command") == "CREATE_ISSUE":
+            redelivered = int(record["attributes"].get("ApproximateReceiveCount", 1)) > 1
+            create_records.append((record["messageId"], messageBody.get("Payload"), redelivered))
+
+    if not create_records:
+        return {}
+
+    if not issue_creation_cost.fits():
+        raise InvocationDeadlineExceeded(f"Not enough time left in the invocation to create the issues, estimated at {issue_creation_cost.estimate_secs:.2f}s.")
+    logger.info("Creating issues for %s CREATE_ISSUE records in one batch.", len(create_records))
+    start = time.perf_counter()
+    results = await create_issues_from_dz_subscriptions_async(
+        async_workflow,
+        [(payload, redelivered) for _, payload, redelivered in create_records],
+        default_approver,
+        BATCH_MAX_CONCURRENCY,
+        idempotency_store,
+        IDEMPOTENCY_TTL_SECS,
+    )
+    issue_creation_cost.observe(time.perf_counter() - start)
+    return {messageId: result for (messageId, _, _), result in zip(create_records, results)}
 
+default_approver = os.environ['SUBSCRIPTION_DEFAULT_APPROVER_ID']
+workflow_type = os.environ['WORKFLOW_TYPE']
+# Maximum number of records of a batch processed at the same time. Requests to Jira are additionally paced by its rate limiter.
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 5))
+# When a task token store is configured, the task of a pending issue is not called back but parked until the Jira webhook reports a change.
+# Parked tokens expire with the step function task, the step function then polls again as a fallback.
+task_token_store = create_task_token_store(os.environ.get('TASK_TOKEN_STORE_TYPE'))
+TASK_TOKEN_TTL_SECS = int(os.environ.get('TASK_TOKEN_TTL_SECS', 3600))
+# A batch that could not reach Jira is delivered again as a whole. The issues created by its other records are remembered,
+# so their CREATE_ISSUE commands return the existing issue instead of creating duplicates. Entries outlive the queue retention.
+idempotency_store = create_idempotency_store(os.environ.get('IDEMPOTENCY_STORE_TYPE'))
+IDEMPOTENCY_TTL_SECS = int(os.environ.get('IDEMPOTENCY_TTL_SECS', 86400))
+# Durations of the batch phases and of a record as observed by the warm container. The status search, the creation of the issues,
+# i.e. the DataZone enrichment and the bulk create, and each record are only started if they are expected to complete before the deadline.
+status_search_cost = CostEstimator()
+issue_creation_cost = CostEstimator()
+record_cost = CostEstimator()
+
+# =========RECORD=============
+async def process_record(async_workflow, record, issues_status, issues_status_error, issues_created, callbacks):
+    # Executes the command of one record and schedules the callback to the step function.
+    # ExternalWorkflowNotReachable is raised to the batch loop, the record then stays in the queue.
+    logger.debug("Lambda processing record: %s", record)
+
+    messageId = record["messageId"]
+    messageGroupId = record["attributes"]["MessageGroupId"]
+    messageBody = json.loads(record["body"])
+    callback_token = messageBody["TaskToken"]
+    command = messageBody["Command"]
+    payload = messageBody["Payload"]
+    add_correlation_ids(**payload_correlation_ids(payload))
+
+    logger.debug("Lambda processing payload: %s", payload)
+
+    # execute command specified in the payload
+    try:
+        if command == "CREATE_ISSUE":
+            logger.info("Creating issue for DZ subscription. %s", messageId)
+            # the issue was created with the other CREATE_ISSUE records of the batch
+            created = issues_created[messageId]
+            if isinstance(created, BaseException):
+                raise created
+            issue_key, dz_subscription = created
+            add_correlation_ids(issue_key=issue_key)
+            response_data = build_issue_created_response(dz_subscription, issue_key)
+            callbacks.send(callback_token, messageId, StepFunctionCallbackStatus.SUCCESS, response_data)
+
+        elif command == "GET_ISSUE_STATUS":
+            issue_key = payload.get("issue_key")
+            if not issue_key:
+                raise ValueError("Missing 'issue_key' in the event data.")
+
+            logger.info("Getting issue status for issue key %s.", issue_key)
+            if issue_key in issues_status:
+                # the error of this issue alone, e.g. the ExternalWorkflowTargetNotReachable error of its Jira target when routed
+                if isinstance(issues_status[issue_key], BaseException):
+                    raise issues_status[issue_key]
+                issue_status = issues_status[issue_key]
+                if isinstance(issue_status, IssueUnchanged):
+                    logger.info("Issue %s unchanged since %s.", issue_key, issue_status.updated)
+                    approval_status, approver, issue_updated = payload.get("approval_status"), payload.get("approver"), issue_status.updated
+                else:
+                    approval_status, approver, issue_updated = issue_status
+            elif issues_status_error is not None:
+                raise ExternalWorkflowRespondedWithNOK(issues_status_error)
+            else:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not get issue {issue_key}. The issue is not found or the user does not have permission to view it."
+                )
+            if task_token_store is not None and approval_status in PENDING_APPROVAL_STATUSES:
+                logger.info("Issue %s is pending, parking task token of messageId %s until the Jira webhook reports a change.", issue_key, messageId)
+                try:
+                    await asyncio.to_thread(task_token_store.put, issue_key, callback_token, payload, TASK_TOKEN_TTL_SECS)
+                    return
+                except Exception as e:
+                    # e.g. DynamoDB throttling, answer the poll as usual so the execution keeps polling instead of failing
+                    logger.warning("Could not park task token of messageId %s, answering the poll instead. %s", messageId, e)
+
+            response_data = build_issue_status_response(payload, issue_key, approval_status, approver, issue_updated)
+            callbacks.send(callback_token, messageId, StepFunctionCallbackStatus.SUCCESS, response_data)
+
+    except ExternalWorkflowRespondedWithNOK as e:
+        # let step function continue on fail branch
+        # pop the message from the queue
+        logger.error("process_record: Caught ExternalWorkflowRespondedWithNOK. %s", e)
+        response = f"ExternalWorkflowRespondedWithNOK. {e}"
+        callbacks.send(callback_token, messageId, StepFunctionCallbackStatus.FAILURE, response)
+
+    except ExternalWorkflowNotReachable as e:
+        # stop all processing and do not pop any remaining messages in batch
+        logger.error(
+            "process_record: Caught ExternalWorkflowNotReachable. %s. Will keep message %s to Q and retry.", e, messageId
+        )
+        raise e
 
-# Used in callback to tell statemachine if the response should be handled as success or error
-class StepFunctionCallbackStatus(Enum):
-    SUCCESS = 1
-    FAILURE = 2
+    except Exception as e:
+        logger.error("process_record: Caught Error. %s", e)
+        response = f"Error. {e}"
+        callbacks.send(callback_token, messageId, StepFunctionCallbackStatus.FAILURE, response)
+
+# =========BATCH=============
+async def process_batch(async_workflow, records):
+    # Processes the records concurrently, at most BATCH_MAX_CONCURRENCY at a time.
+    # As soon as one record hits an external workflow unreachable error, no new record is started.
+    # A record of an unreachable target of a routed workflow is only kept in the queue, the records of the other targets are processed.
+    # Records already in flight complete, then the error is raised so the remaining records are kept in the queue.
+    # When the invocation is about to run out of time, no new batch phase or record is started either. The remaining records are returned, not raised,
+    # so the records already processed are not delivered again.
+    # The callbacks are sent concurrently with the processing and all of them are flushed before returning.
+    # Returns the message ids of the records that were not processed or whose callback could not be delivered.
+    unprocessed = [record["messageId"] for record in records]
+    not_reachable_errors = []
+    out_of_time = []
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    callbacks = CallbackDispatcher()
 
-# =========CALLBACK=============
-def statemachine_callback(callback_token, messageId, callback_status, response):
     try:
-        logger.info(f"Calling stepfunctions with status {callback_status}")
+        # get the status of all polled issues at once
+        # an ExternalWorkflowNotReachable error stops the processing before any record is handled
+        issues_status, issues_status_error = await get_batch_issues_status(async_workflow, records)
+        # create the issues of all new subscriptions at once
+        issues_created = await create_batch_issues(async_workflow, records)
+    except InvocationDeadlineExceeded as e:
+        logger.warning("process_batch: %s. Will keep all %s messages to Q and retry.", e, len(records))
+        return unprocessed
+
+    async def process(position, record):
+        async with semaphore:
+            if not_reachable_errors or out_of_time:
+                return
+            if not record_cost.fits():
+                logger.warning("Not enough time left in the invocation for messageId %s, estimated at %.2fs. Will keep the remaining messages to Q.", record['messageId'], record_cost.estimate_secs)
+                out_of_time.append(position)
+                return
+            start = time.perf_counter()
+            try:
+                with batch_position(position), correlation_scope(message_id=record["messageId"]):
+                    await process_record(async_workflow, record, issues_status, issues_status_error, issues_created, callbacks)
+                unprocessed.remove(record["messageId"])
+                record_cost.observe(time.perf_counter() - start)
+            except InvocationDeadlineExceeded as e:
+                logger.warning("process_record: %s. Will keep message %s to Q and retry.", e, record['messageId'])
+                out_of_time.append(position)
+            except ExternalWorkflowTargetNotReachable as e:
+                logger.warning("process_record: %s. Will keep message %s to Q and retry, the other targets are processed.", e, record['messageId'])
+            except ExternalWorkflowNotReachable as e:
+                not_reachable_errors.append(e)
 
-        if callback_status == StepFunctionCallbackStatus.SUCCESS:
-            sf_response = stepfunctions_client.send_task_success(
-                taskToken=callback_token, output=json.dumps(response)
-            )
-        elif callback_status == StepFunctionCallbackStatus.FAILURE:
-            sf_response = stepfunctions_client.send_task_failure(
-                taskToken=callback_token, error=json.dumps(response)
-            )
+    await asyncio.gather(*(process(position, record) for position, record in enumerate(records)))
 
-        logger.info(f"Sent callback for messageId {messageId}")
+    # the records whose callback was not delivered are kept in the queue, their task token is not lost
+    undelivered = await asyncio.to_thread(callbacks.flush)
 
-    except Exception as e:
-        logger.error(
-            f"statemachine_callback. Error during stepfunction callback. messageId {messageId} {e}. This can happen if the taskToken is wrong Or if the step function that created the taskToken is not running anymore."
-        )
+    if not_reachable_errors:
+        raise not_reachable_errors[0]
+
+    return unprocessed + undelivered
 
-default_approver = os.environ['SUBSCRIPTION_DEFAULT_APPROVER_ID']
-workflow_type = os.environ['WORKFLOW_TYPE']
 # =========LAMBDA=============
+@record_invocation("create-get-issue-status-resilient")
+@log_invocation
 def lambda_handler(event, context):
-    # The lambda will process every record in the batch.
+    # The lambda will process every record in the batch, several records at a time.
     # As soon it hits the first jira unreachable error, it will stop processing records.
     # The remaining records will be kept in the queue.
+    # It also stops taking new records when the invocation is about to time out, the remaining records are then reported as failed items.
 
-    response = None
     batch_item_failures = []
     sqs_batch_response = {}
-    unprocessed = set()
-
-    logger.info(f"=======================")
-    logger.info(f"Lambda_jira_service - Event: {str(event)}")
-    logger.info(f"=======================")
-    logger.info(f"Batch size: {len(event['Records'])}")
-    logger.info(f"WORKFLOW_TYPE={workflow_type}")
-    external_workflow = create_workflow(workflow_type)
-    
-    # populate unprocessed set
-    for record in event["Records"]:
-        messageId = record["messageId"]
-        unprocessed.add(messageId)
-
-    # process each record
-    for record in event["Records"]:
-        logger.info(f"Lambda processing record: {record}")
-
-        # throttle api requests to Jira
-        time.sleep(THROTTLE_SLEEP_TIME_SECS)
-
-        messageId = record["messageId"]
-        messageGroupId = record["attributes"]["MessageGroupId"]
-        messageBody = json.loads(record["body"])
-        callback_token = messageBody["TaskToken"]
-        command = messageBody["Command"]
-        payload = messageBody["Payload"]
-
-        logger.info(f"Lambda processing payload: {payload}")
-
-        # execute command specified in the payload
-        try:
-            if command == "CREATE_ISSUE":
-                logger.info(f"Creating issue for DZ subscription. {messageId}")
-                #response = create_issue(payload)
-                issue_key, dz_subscription = create_issue_from_dz_subscription(external_workflow, payload, default_approver)
-                response_data = {
-                    'statusCode': 200,
-                    'domain_id': dz_subscription.domain_id,
-                    'subscription_req_id': dz_subscription.subscription_req_id,
-                    'issue_key': issue_key
-                }
-                statemachine_callback(
-                    callback_token,
-                    messageId,
-                    StepFunctionCallbackStatus.SUCCESS,
-                    response_data,
-                )
-                unprocessed.remove(record["messageId"])
 
-            elif command == "GET_ISSUE_STATUS":
-                issue_key = payload.get("issue_key")
-                if not issue_key:
-                    raise ValueError("Missing 'issue_key' in the event data.")
-                
-                logger.info(f"Getting issue status for issue key {issue_key}.")
-                #response = get_issue_status(payload)
-                approval_status, approver = external_workflow.get_issue_status(issue_key)
-                response_data = {
-                    'statusCode': 200,
-                    'domain_id': payload.get('domain_id'),
-                    'subscription_req_id': payload.get('subscription_req_id'),
-                    'issue_key': issue_key,
-                    'approver': approver,
-                    'approval_status': approval_status,
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                statemachine_callback(
-                    callback_token,
-                    messageId,
-                    StepFunctionCallbackStatus.SUCCESS,
-                    response_data,
-                )
-                unprocessed.remove(record["messageId"])
+    logger.debug("Lambda_jira_service - Event: %s", event)
+    logger.info("Batch size: %s", len(event['Records']))
+    logger.info("WORKFLOW_TYPE=%s", workflow_type)
+    async_workflow = create_async_workflow(workflow_type)
+
+    with invocation_deadline(context):
+        unprocessed = asyncio.run(process_batch(async_workflow, event["Records"]))
 
-        except ExternalWorkflowRespondedWithNOK as e:
-            # let step function continue on fail branch
-            # pop the message from the queue
-            logger.error(f"lambda_handler: Caught ExternalWorkflowRespondedWithNOK. {e}")
-            response = f"ExternalWorkflowRespondedWithNOK. {e}"
-            statemachine_callback(
-                callback_token, messageId, StepFunctionCallbackStatus.FAILURE, response
-            )
-            unprocessed.remove(record["messageId"])
-
-        except ExternalWorkflowNotReachable as e:
-            # stop all processing and do not pop any remaining messages in batch
-            logger.error(
-                f"lambda_handler: Caught ExternalWorkflowNotReachable. {e}. Will keep message {messageId} to Q and retry."
-            )
-            raise e
-
-        except Exception as e:
-            logger.error(f"lambda_handler: Caught Error. {e}")
-            response = f"Error. {e}"
-            statemachine_callback(
-                callback_token, messageId, StepFunctionCallbackStatus.FAILURE, response
-            )
-            unprocessed.remove(record["messageId"])
-
-    # all records have been processed OR ExternalWorkflowNotReachable was detected
+    # all records have been processed
+    logger.info("Unprocessed messages: %s", len(unprocessed))
     for messageId in unprocessed:
-        logger.info(f"Unprocessed messages: {len(unprocessed)}")
         batch_item_failures.append({"itemIdentifier": messageId})
 
     sqs_batch_response["batchItemFailures"] = batch_item_failures
-    logger.info(f"Jira service lambda finished processing batch.")
+
+    # the DataZone metadata of the subscriptions is cached across warm invocations, report how often it was found there
+    logger.info("DataZone metadata cache stats: %s", get_metadata_cache_stats())
+    # requests to Jira are paced by the workflow's rate limiter, report how long it delayed them
+    rate_limiter = getattr(async_workflow, "rate_limiter", None)
+    if rate_limiter is not None:
+        logger.info("Jira rate limiter stats: %s", rate_limiter.stats())
+    circuit_breaker = getattr(async_workflow, "circuit_breaker", None)
+    if circuit_breaker is not None:
+        logger.info("Jira circuit breaker stats: %s", circuit_breaker.stats())
+    # a routed workflow has a rate limiter, circuit breaker and connection pool per Jira target
+    target_stats = getattr(async_workflow, "target_stats", None)
+    if target_stats is not None:
+        logger.info("Jira target stats: %s", target_stats())
+    # connections to Jira are kept alive across warm invocations, new connections should stop growing once the container is warm
+    connection_pool_stats = getattr(async_workflow, "connection_pool_stats", None)
+    if connection_pool_stats is not None:
+        logger.info("Jira connection pool stats: %s", connection_pool_stats())
+    logger.info("Jira service lambda finished processing batch.")
     logger.info(
-        f"Records in batch = {len(event['Records'])}. Unprocessed records = {len(batch_item_failures)}"
+        "Records in batch = %s. Unprocessed records = %s", len(event['Records']), len(batch_item_failures)
     )
 
     return sqs_batch_response
@@ -0,0 +1,135 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Defines the lambda handler receiving Jira "issue updated" webhooks through a function URL.
+
+When the resilient handler finds an issue still pending, it parks the step function task token in the task token store instead of calling back.
+On a webhook for that issue, this handler reads the issue status from Jira and completes the waiting task with the same result as the GET_ISSUE_STATUS command.
+The webhook body is only used as a trigger, the status sent to the step function always comes from Jira itself.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+
+from common import create_workflow, create_task_token_store, build_issue_status_response, payload_correlation_ids, PENDING_APPROVAL_STATUSES
+from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK
+from call_metrics import record_invocation
+from aws_clients import get_client
+from callback_dispatcher import CallbackDispatcher, StepFunctionCallbackStatus
+from structured_logging import get_logger, log_invocation, add_correlation_ids
+
+logger = get_logger()
+
+workflow_type = os.environ['WORKFLOW_TYPE']
+task_token_store = create_task_token_store(os.environ['TASK_TOKEN_STORE_TYPE'])
+TASK_TOKEN_TTL_SECS = int(os.environ.get('TASK_TOKEN_TTL_SECS', 3600))
+# Optional secret configured on the Jira webhook. Jira then signs every delivery in the X-Hub-Signature header.
+JIRA_WEBHOOK_SECRET_ARN = os.environ.get('JIRA_WEBHOOK_SECRET_ARN')
+
+webhook_secret = None
+
+
+def get_webhook_secret():
+    global webhook_secret
+    if webhook_secret is None:
+        webhook_secret = get_client("secretsmanager").get_secret_value(SecretId=JIRA_WEBHOOK_SECRET_ARN)["SecretString"]
+    return webhook_secret
+
+
+def is_signature_valid(headers, body):
+    if not JIRA_WEBHOOK_SECRET_ARN:
+        return True
+
+    signature = {key.lower(): value for key, value in headers.items()}.get('x-hub-signature', '')
+    method, _, received_digest = signature.partition('=')
+    if method != 'sha256' or not received_digest:
+        return False
+
+    expected_digest = hmac.new(get_webhook_secret().encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected_digest, received_digest)
+
+
+def webhook_response(status_code, message):
+    logger.info("Webhook response %s: %s", status_code, message)
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'message': message})
+    }
+
+
+@record_invocation("jira-webhook")
+@log_invocation
+def lambda_handler(event, context):
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+
+    if not is_signature_valid(event.get('headers') or {}, body):
+        return webhook_response(401, "Invalid webhook signature.")
+
+    try:
+        webhook = json.loads(body)
+    except json.JSONDecodeError:
+        return webhook_response(400, "Webhook body is not valid JSON.")
+
+    issue = webhook.get('issue') or {}
+    issue_key = issue.get('key')
+    if not issue_key:
+        return webhook_response(400, "Missing issue key in webhook.")
+    add_correlation_ids(issue_key=issue_key)
+
+    logger.info("Received webhook %s for issue %s.", webhook.get('webhookEvent'), issue_key)
+
+    # the webhook reports a status the step function would keep waiting for, no need to ask Jira
+    webhook_status = ((issue.get('fields') or {}).get('status') or {}).get('name')
+    if webhook_status in PENDING_APPROVAL_STATUSES:
+        return webhook_response(200, f"Issue {issue_key} is still pending.")
+
+    parked = task_token_store.pop(issue_key)
+    if parked is None:
+        return webhook_response(200, f"No task waiting for issue {issue_key}.")
+    task_token, payload = parked
+    add_correlation_ids(**payload_correlation_ids(payload))
+
+    try:
+        approval_status, approver = create_workflow(workflow_type).get_issue_status(issue_key)
+    except (ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK) as e:
+        # keep the task waiting, the next webhook delivery or the fallback polling will resolve it
+        logger.error("lambda_handler: Could not get status of issue %s. %s", issue_key, e)
+        task_token_store.put(issue_key, task_token, payload, TASK_TOKEN_TTL_SECS)
+        return webhook_response(503, f"Could not get status of issue {issue_key}.")
+
+    if approval_status in PENDING_APPROVAL_STATUSES:
+        task_token_store.put(issue_key, task_token, payload, TASK_TOKEN_TTL_SECS)
+        return webhook_response(200, f"Issue {issue_key} is still pending.")
+
+    response_data = build_issue_status_response(payload, issue_key, approval_status, approver)
+    # retried on throttling and server errors, dropped when the task token is not valid anymore
+    callbacks = CallbackDispatcher()
+    callbacks.send(task_token, issue_key, StepFunctionCallbackStatus.SUCCESS, response_data)
+    if callbacks.flush():
+        # keep the task waiting, Jira delivers the webhook again after an error response
+        task_token_store.put(issue_key, task_token, payload, TASK_TOKEN_TTL_SECS)
+        return webhook_response(503, f"Task waiting for issue {issue_key} could not be completed.")
+
+    return webhook_response(200, f"Completed task waiting for issue {issue_key} with status {approval_status}.")
@@ -0,0 +1,58 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Defines the stores remembering the issue created for each subscription request.
+When SQS delivers a CREATE_ISSUE record again, e.g. because a later record of its batch could not reach Jira,
+the resilient handler finds the issue created on the first delivery instead of creating a duplicate.
+"""
+from ttl_store import ITtlStore, InMemoryTtlStore, SqliteTtlStore, DynamoDbTtlStore
+
+
+class IdempotencyStore():
+    '''Stores the key of the issue created for a subscription request, in a TTL store keyed by subscription request id.'''
+    def __init__(self, ttl_store: ITtlStore) -> None:
+        self.ttl_store = ttl_store
+
+    def get(self, subscription_req_id):
+        '''Returns the key of the issue created for the subscription request, or None if no unexpired entry is stored.'''
+        entry = self.ttl_store.get(subscription_req_id)
+        return entry['issue_key'] if entry is not None else None
+
+    def put(self, subscription_req_id, issue_key, ttl_secs):
+        '''Stores the key of the issue created for the subscription request. The entry expires after ttl_secs.'''
+        self.ttl_store.put(subscription_req_id, {'issue_key': issue_key}, ttl_secs)
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    '''Keeps the entries in the memory of the process. Only covers redeliveries handled by the same warm container.'''
+    def __init__(self) -> None:
+        super().__init__(InMemoryTtlStore())
+
+
+class SqliteIdempotencyStore(IdempotencyStore):
+    '''Keeps the entries in a local SQLite database. Stand-in for the DynamoDB store when testing locally with several processes.'''
+    def __init__(self, db_path) -> None:
+        super().__init__(SqliteTtlStore(db_path, 'created_issues', 'subscription_req_id', ['issue_key']))
+
+
+class DynamoDbIdempotencyStore(IdempotencyStore):
+    '''Keeps the entries in a DynamoDB table with partition key subscription_req_id and TTL attribute expires_at.'''
+    def __init__(self, table_name) -> None:
+        super().__init__(DynamoDbTtlStore(table_name, 'subscription_req_id'))
@@ -0,0 +1,78 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Tracks the time left in the running Lambda invocation, so that a batch stops before the function times out.
+
+The deadline is the end of the invocation minus DEADLINE_SAFETY_MARGIN_MS, kept for sending the callbacks and returning the batch response.
+It is held in a context variable and follows the records into their asyncio tasks and worker threads.
+The outbound calls cap their timeouts, retries and rate limiter waits to the time left. The batch loop only starts a batch phase,
+i.e. the status search or the creation of the issues, or a record when its estimated cost still fits.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEADLINE_SAFETY_MARGIN_MS = int(os.environ.get('DEADLINE_SAFETY_MARGIN_MS', 3000))
+# Duration assumed for a batch phase or a record until one has been observed, and weight of the latest observation in the moving average.
+RECORD_COST_INITIAL_MS = int(os.environ.get('RECORD_COST_INITIAL_MS', 5000))
+RECORD_COST_EWMA_ALPHA = float(os.environ.get('RECORD_COST_EWMA_ALPHA', 0.3))
+
+_deadline = contextvars.ContextVar('invocation_deadline', default=None)
+
+
+@contextmanager
+def invocation_deadline(context):
+    '''Sets the deadline of the calls made in the block from the Lambda context. Without a context, e.g. in a local run, there is no deadline.'''
+    get_remaining_time_in_millis = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining_time_in_millis is None:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + (get_remaining_time_in_millis() - DEADLINE_SAFETY_MARGIN_MS) / 1000)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_secs():
+    '''Returns the seconds left before the deadline, negative once it has passed, or None when there is no deadline.'''
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class CostEstimator:
+    '''Exponentially weighted moving average of the duration of one unit of work, e.g. a batch phase or a record, kept across warm invocations.'''
+    def __init__(self, initial_secs=RECORD_COST_INITIAL_MS / 1000, alpha=RECORD_COST_EWMA_ALPHA) -> None:
+        self.estimate_secs = initial_secs
+        self.alpha = alpha
+        self.lock = threading.Lock()
+
+    def observe(self, duration_secs):
+        with self.lock:
+            self.estimate_secs = self.alpha * duration_secs + (1 - self.alpha) * self.estimate_secs
+
+    def fits(self):
+        '''Tells whether a unit of work started now is expected to complete before the deadline.'''
+        remaining = remaining_secs()
+        return remaining is None or remaining >= self.estimate_secs
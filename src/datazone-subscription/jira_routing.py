@@ -0,0 +1,307 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Routes each subscription request to one of several Jira targets, a target being a Jira instance, project and issue type.
+
+The routing table is read from JIRA_ROUTING_TABLE as JSON, or from the JSON file at JIRA_ROUTING_TABLE_PATH:
+
+{
+  "targets": {
+    "finance": {"domain": "finance.atlassian.net", "project_key": "FIN", "issue_type_id": "10004",
+                "secret_arn": "arn:aws:secretsmanager:...", "rate_limit_per_sec": 2, "rate_limit_burst": 5, "pool_maxsize": 5},
+    "shared": {"domain": "example.atlassian.net", "project_key": "DZ", "issue_type_id": "10004", "secret_arn": "arn:aws:secretsmanager:..."}
+  },
+  "routes": [
+    {"target": "finance", "owner_project_id": ["prj_1", "prj_2"]},
+    {"target": "finance", "domain_id": "dzd_finance"},
+    {"target": "finance", "owner_project_name": "finance-data"}
+  ],
+  "default_target": "shared"
+}
+
+A route matches when every attribute it names matches, an attribute listing several values matches any of them.
+The first matching route wins, subscriptions matching no route go to the default target.
+Routes can match the domain_id, the subscriber_project_id, and the owner_project_id or owner_project_name of any subscribed listing,
+the owner project names being the labels of the Jira issue.
+
+Issues are routed back to their target by the project key prefix of the issue key, project keys are unique across targets.
+Each target has its own rate limiter and connection pool, and its own credentials when its secret differs, so one target being
+slow, throttled or down does not hold back the others: the calls of a batch run concurrently per target, and the records of an
+unreachable target fail with ExternalWorkflowTargetNotReachable while the records of the other targets complete.
+"""
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from data_zone_subscription import DataZoneSubscription
+from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK, ExternalWorkflowTargetNotReachable
+from external_workflow import IExternalWorkflow
+from jira_workflow import JiraWorkflow
+from structured_logging import get_logger
+
+logger = get_logger()
+
+ROUTE_ATTRIBUTES = ('domain_id', 'subscriber_project_id', 'owner_project_id', 'owner_project_name')
+
+# The routing table is parsed once per container
+_routing_table = None
+_routing_table_lock = threading.Lock()
+
+
+class JiraTarget(NamedTuple):
+    name: str
+    domain: str
+    project_key: str
+    issue_type_id: str
+    secret_arn: str
+    url_scheme: str = 'https'
+    rate_limit_per_sec: float = None
+    rate_limit_burst: int = None
+    pool_maxsize: int = None
+
+
+class JiraRoute(NamedTuple):
+    target: str
+    # attribute -> accepted values
+    conditions: dict
+
+    def matches(self, attributes):
+        return all(attributes[attribute] & values for attribute, values in self.conditions.items())
+
+
+def subscription_route_attributes(dz_subscription: DataZoneSubscription):
+    '''Returns the values of the route attributes of a subscription, each as a set since a subscription can have several listings.'''
+    listings = getattr(dz_subscription, 'listings', None) or []
+    return {
+        'domain_id': {dz_subscription.domain_id},
+        'subscriber_project_id': {getattr(dz_subscription, 'project_subscriber_id', None)},
+        'owner_project_id': set(getattr(dz_subscription, 'data_owner_projects', None) or []),
+        'owner_project_name': {listing.owner_project_name for listing in listings},
+    }
+
+
+class JiraRoutingTable:
+    '''Targets and routes of a routed Jira workflow. Raises ValueError for an inconsistent table.'''
+    def __init__(self, targets, routes, default_target=None) -> None:
+        self.targets = {target.name: target for target in targets}
+        self.routes = routes
+        self.default_target = default_target
+
+        for name in [route.target for route in routes] + ([default_target] if default_target else []):
+            if name not in self.targets:
+                raise ValueError(f"Jira routing table routes to unknown target {name}.")
+        self.targets_by_project_key = {}
+        for target in targets:
+            if target.project_key in self.targets_by_project_key:
+                raise ValueError(f"Jira routing table has several targets with project key {target.project_key}, issues could not be routed back.")
+            self.targets_by_project_key[target.project_key] = target.name
+
+    @classmethod
+    def from_dict(cls, table):
+        url_scheme = os.environ.get('JIRA_URL_SCHEME', 'https')
+        targets = []
+        for name, target in table.get('targets', {}).items():
+            missing = [field for field in ('domain', 'project_key', 'issue_type_id', 'secret_arn') if not target.get(field)]
+            if missing:
+                raise ValueError(f"Jira target {name} is missing {', '.join(missing)}.")
+            targets.append(JiraTarget(
+                name, target['domain'], target['project_key'], str(target['issue_type_id']), target['secret_arn'],
+                target.get('url_scheme', url_scheme), target.get('rate_limit_per_sec'), target.get('rate_limit_burst'), target.get('pool_maxsize'),
+            ))
+
+        routes = []
+        for route in table.get('routes', []):
+            conditions = {attribute: value for attribute, value in route.items() if attribute != 'target'}
+            unknown = set(conditions) - set(ROUTE_ATTRIBUTES)
+            if unknown or not conditions:
+                raise ValueError(f"Jira route to {route.get('target')} must match on some of {', '.join(ROUTE_ATTRIBUTES)}, got {', '.join(sorted(unknown)) or 'nothing'}.")
+            routes.append(JiraRoute(route['target'], {
+                attribute: set(value) if isinstance(value, list) else {value} for attribute, value in conditions.items()
+            }))
+        return cls(targets, routes, table.get('default_target'))
+
+    @classmethod
+    def from_environment(cls):
+        '''Returns the routing table of JIRA_ROUTING_TABLE or JIRA_ROUTING_TABLE_PATH, parsed on first use.'''
+        global _routing_table
+        with _routing_table_lock:
+            if _routing_table is None:
+                if os.environ.get('JIRA_ROUTING_TABLE'):
+                    table = json.loads(os.environ['JIRA_ROUTING_TABLE'])
+                else:
+                    with open(os.environ['JIRA_ROUTING_TABLE_PATH']) as table_file:
+                        table = json.load(table_file)
+                _routing_table = cls.from_dict(table)
+                logger.info("Jira routing table loaded with targets %s and %s routes.", ', '.join(_routing_table.targets), len(_routing_table.routes))
+            return _routing_table
+
+    def route(self, dz_subscription: DataZoneSubscription):
+        '''Returns the name of the target of the subscription.'''
+        attributes = subscription_route_attributes(dz_subscription)
+        for route in self.routes:
+            if route.matches(attributes):
+                return route.target
+        if self.default_target is None:
+            raise ExternalWorkflowRespondedWithNOK(
+                f"Error. No Jira target for subscription request {dz_subscription.subscription_req_id}, no route matches and there is no default target."
+            )
+        return self.default_target
+
+    def target_of_issue(self, issue_key):
+        '''Returns the name of the target whose project key prefixes the issue key.'''
+        target = self.targets_by_project_key.get(issue_key.rsplit('-', 1)[0])
+        if target is None:
+            raise ExternalWorkflowRespondedWithNOK(f"Error. Issue {issue_key} does not belong to the project of any Jira target.")
+        return target
+
+
+class RoutedJiraWorkflow(IExternalWorkflow):
+    '''Jira workflow sending each subscription to the Jira target its routing table picks. The Jira client of a target is created on first use.'''
+    def __init__(self, routing_table: JiraRoutingTable) -> None:
+        self.routing_table = routing_table
+        self.workflows = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls):
+        return cls(JiraRoutingTable.from_environment())
+
+    def workflow(self, target_name):
+        with self.lock:
+            if target_name not in self.workflows:
+                target = self.routing_table.targets[target_name]
+                base_url = f"{target.url_scheme}://{target.domain}/rest/api"
+                self.workflows[target_name] = JiraWorkflow(
+                    f"{base_url}/latest/issue/", target.secret_arn, target.project_key, target.issue_type_id, f"{base_url}/3/search/jql",
+                    target_name=target.name, rate_limit_per_sec=target.rate_limit_per_sec,
+                    rate_limit_burst=target.rate_limit_burst, pool_maxsize=target.pool_maxsize,
+                )
+            return self.workflows[target_name]
+
+    def target_stats(self):
+        '''Returns the rate limiter, circuit breaker and connection pool stats of every target used so far.'''
+        with self.lock:
+            workflows = dict(self.workflows)
+        return {
+            name: {
+                'rate_limiter': workflow.rate_limiter.stats(),
+                'circuit_breaker': workflow.circuit_breaker.stats(),
+                'connection_pool': workflow.connection_pool_stats(),
+            }
+            for name, workflow in workflows.items()
+        }
+
+    def create_issue(self, dz_subscription: DataZoneSubscription, assignee):
+        target_name = self.routing_table.route(dz_subscription)
+        logger.info("Subscription request %s routed to Jira target %s.", dz_subscription.subscription_req_id, target_name)
+        return self.__call_target(target_name, lambda workflow: workflow.create_issue(dz_subscription, assignee))
+
+    def get_issue_status(self, issue_key):
+        target_name = self.routing_table.target_of_issue(issue_key)
+        return self.__call_target(target_name, lambda workflow: workflow.get_issue_status(issue_key))
+
+    def create_issues(self, subscriptions):
+        '''Creates the issues of each target with one call per target, the targets concurrently.
+        The issues of an unreachable target get its ExternalWorkflowTargetNotReachable error, those of the other targets are created.'''
+        results = [None] * len(subscriptions)
+        positions_by_target = {}
+        for position, (dz_subscription, _) in enumerate(subscriptions):
+            try:
+                positions_by_target.setdefault(self.routing_table.route(dz_subscription), []).append(position)
+            except ExternalWorkflowRespondedWithNOK as e:
+                results[position] = e
+
+        def create(workflow, positions):
+            return workflow.create_issues([subscriptions[position] for position in positions])
+
+        for target_name, positions, outcome in self.__for_each_target(positions_by_target, create):
+            created = outcome if isinstance(outcome, list) else [outcome] * len(positions)
+            for position, result in zip(positions, created):
+                results[position] = result
+        return results
+
+    def get_issues_status(self, issue_keys, issues_updated=None):
+        '''Returns the statuses of the issues found, with one call per target, the targets concurrently.
+        The keys of an unreachable target are mapped to its ExternalWorkflowTargetNotReachable error, the keys of a target that refused the search
+        and the keys of no target to their ExternalWorkflowRespondedWithNOK error.'''
+        issues_status = {}
+        keys_by_target = {}
+        for issue_key in dict.fromkeys(issue_keys):
+            try:
+                keys_by_target.setdefault(self.routing_table.target_of_issue(issue_key), []).append(issue_key)
+            except ExternalWorkflowRespondedWithNOK as e:
+                logger.error("get_issues_status(). %s", e)
+                issues_status[issue_key] = e
+
+        def search(workflow, target_keys):
+            return workflow.get_issues_status(target_keys, issues_updated)
+
+        for target_name, target_keys, outcome in self.__for_each_target(keys_by_target, search):
+            if isinstance(outcome, (ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK)):
+                if isinstance(outcome, ExternalWorkflowRespondedWithNOK):
+                    logger.error("get_issues_status(). Could not get status of the issues of Jira target %s. %s", target_name, outcome)
+                issues_status.update({issue_key: outcome for issue_key in target_keys})
+            elif isinstance(outcome, Exception):
+                raise outcome
+            else:
+                issues_status.update(outcome)
+        return issues_status
+
+    def find_issue(self, subscription_req_id):
+        '''Searches every target, the target of the subscription is only known once it is enriched from DataZone.
+        An unreachable target is skipped: a subscription routed to it can not be created there before it is reachable again.'''
+        def find(workflow, _):
+            return workflow.find_issue(subscription_req_id)
+
+        for target_name, _, outcome in self.__for_each_target({name: None for name in self.routing_table.targets}, find):
+            if isinstance(outcome, ExternalWorkflowNotReachable):
+                logger.warning("find_issue(). Skipping unreachable Jira target %s. %s", target_name, outcome)
+            elif isinstance(outcome, Exception):
+                raise outcome
+            elif outcome is not None:
+                return outcome
+        return None
+
+    def __call_target(self, target_name, call):
+        try:
+            return call(self.workflow(target_name))
+        except ExternalWorkflowTargetNotReachable:
+            raise
+        except ExternalWorkflowNotReachable as e:
+            raise ExternalWorkflowTargetNotReachable(target_name, e) from e
+
+    def __for_each_target(self, work_by_target, call):
+        # Calls call(workflow, work) for the work of each target, the targets concurrently.
+        # Yields (target, work, outcome) once every target completed. The outcome is the result of call or the exception it raised,
+        # an ExternalWorkflowNotReachable error being turned into the ExternalWorkflowTargetNotReachable error of the target.
+        if not work_by_target:
+            return
+        with ThreadPoolExecutor(max_workers=len(work_by_target)) as executor:
+            # each target runs in a copy of the caller's context, so its calls keep the metrics and log correlation of the invocation
+            futures = [
+                (target_name, work, executor.submit(contextvars.copy_context().run, self.__call_target, target_name, lambda workflow, work=work: call(workflow, work)))
+                for target_name, work in work_by_target.items()
+            ]
+        for target_name, work, future in futures:
+            error = future.exception()
+            yield target_name, work, error if error is not None else future.result()
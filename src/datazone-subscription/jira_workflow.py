@@ -17,58 +17,283 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-from enum import Enum
 import json
-import logging
+import os
+import threading
+import time
 import urllib3
 from urllib3._collections import HTTPHeaderDict
 import base64
-import boto3
 from botocore.exceptions import ClientError
-from urllib3.exceptions import MaxRetryError
-from external_workflow import IExternalWorkflow
+from urllib3.exceptions import MaxRetryError, ProtocolError, TimeoutError as Urllib3TimeoutError
+from external_workflow import IExternalWorkflow, IssueStatus, IssueUnchanged
 from data_zone_subscription import DataZoneSubscription
-from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK
+from exceptions import ExternalWorkflowNotReachable, ExternalWorkflowRespondedWithNOK, InvocationDeadlineExceeded, ExternalWorkflowCircuitOpen
+from rate_limiter import TokenBucketRateLimiter
+from circuit_breaker import CircuitBreaker
+from call_metrics import record_call
+from invocation_deadline import remaining_secs
+from aws_clients import get_client
+from structured_logging import get_logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
 URLLIB3_RETRIES = 10
 URLLIB3_BACKOFF_FACTOR = 0.5
 
+# JQL searches use the enhanced search endpoint of Jira Cloud, /rest/api/latest/search is deprecated.
+JIRA_SEARCH_PATH = '/rest/api/3/search/jql'
+# Maximum number of issues requested in one JQL search. Jira caps maxResults, larger batches are split.
+JIRA_SEARCH_MAX_RESULTS = 50
+# Maximum number of issues created in one bulk create request, as accepted by Jira.
+JIRA_BULK_CREATE_MAX_ISSUES = 50
+
+# Errors of a request that Jira may or may not have processed: retries exhausted, a read timeout, or a connection dropped mid-response.
+# urllib3 does not retry reads of a POST, its read timeout is raised as is. The record stays in the queue, a created issue is found again on redelivery.
+JIRA_CONNECTION_ERRORS = (MaxRetryError, Urllib3TimeoutError, ProtocolError)
+
+# Jira credentials and auth headers are cached per secret across warm invocations of the lambda.
+# They are read again from Secrets Manager after the TTL expires or as soon as Jira answers 401 (rotated secret).
+# A 401 triggers at most one read per TTL window, so credentials Jira keeps rejecting do not cost a secret read per request.
+JIRA_CREDENTIALS_TTL_SECS = int(os.environ.get('JIRA_CREDENTIALS_TTL_SECS', 900))
+
+# secret arn -> (admin, headers, expiry, monotonic time before which a 401 does not read the secret again)
+_jira_credentials_cache = {}
+_jira_credentials_lock = threading.Lock()
+
+# Requests to Jira are paced by a token bucket shared by all invocations of a warm container, one per Jira host.
+# The rate adapts to the rate limit headers returned by Jira within the min and max bounds.
+# A routed workflow gets one token bucket per Jira target instead, with the rate and burst of the target, see jira_routing.py.
+JIRA_RATE_LIMIT_PER_SEC = float(os.environ.get('JIRA_RATE_LIMIT_PER_SEC', 1.0))
+JIRA_RATE_LIMIT_BURST = int(os.environ.get('JIRA_RATE_LIMIT_BURST', 5))
+JIRA_RATE_LIMIT_MIN_PER_SEC = float(os.environ.get('JIRA_RATE_LIMIT_MIN_PER_SEC', 0.05))
+JIRA_RATE_LIMIT_MAX_PER_SEC = float(os.environ.get('JIRA_RATE_LIMIT_MAX_PER_SEC', 10.0))
+
+# Status fetches only request the fields they read, not the description, comments and custom fields of the issue.
+# Status searches also read the time each issue was last updated, the handler carries it to the next poll of the issue
+# and issues not updated since are answered as unchanged.
+JIRA_STATUS_FIELDS = "status,assignee"
+JIRA_SEARCH_STATUS_FIELDS = "status,assignee,updated"
+
+# Every issue is labelled with the id of its subscription request, so an issue created before a redelivery can be found again.
+JIRA_SUBSCRIPTION_LABEL_PREFIX = os.environ.get('JIRA_SUBSCRIPTION_LABEL_PREFIX', 'dz-subscription-')
+
+_jira_rate_limiters = {}
+_jira_rate_limiters_lock = threading.Lock()
+
+
+def get_jira_rate_limiter(key, rate_per_sec=None, burst=None):
+    '''Returns the token bucket of a Jira host or target. The rate and burst only apply when the bucket is created.'''
+    with _jira_rate_limiters_lock:
+        if key not in _jira_rate_limiters:
+            burst = JIRA_RATE_LIMIT_BURST if burst is None else burst
+            if rate_per_sec is None:
+                _jira_rate_limiters[key] = TokenBucketRateLimiter(
+                    JIRA_RATE_LIMIT_PER_SEC, burst, JIRA_RATE_LIMIT_MIN_PER_SEC, JIRA_RATE_LIMIT_MAX_PER_SEC
+                )
+            else:
+                # the rate of a target is its budget, the adaptive rate never goes above it
+                _jira_rate_limiters[key] = TokenBucketRateLimiter(
+                    rate_per_sec, burst, min(JIRA_RATE_LIMIT_MIN_PER_SEC, rate_per_sec), rate_per_sec
+                )
+        return _jira_rate_limiters[key]
+
+# Requests to an unreachable Jira fail fast once JIRA_CIRCUIT_FAILURE_THRESHOLD attempts in a row failed. Every retry of a request counts as an attempt,
+# and a request stops retrying as soon as the breaker opens. After JIRA_CIRCUIT_OPEN_SECS a single probe request without retries tells whether Jira is back.
+# One breaker per Jira host.
+JIRA_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('JIRA_CIRCUIT_FAILURE_THRESHOLD', 3))
+JIRA_CIRCUIT_OPEN_SECS = float(os.environ.get('JIRA_CIRCUIT_OPEN_SECS', 30))
+
+_jira_circuit_breakers = {}
+_jira_circuit_breakers_lock = threading.Lock()
+
+
+def get_jira_circuit_breaker(host):
+    with _jira_circuit_breakers_lock:
+        if host not in _jira_circuit_breakers:
+            _jira_circuit_breakers[host] = CircuitBreaker(f"Jira {host}", JIRA_CIRCUIT_FAILURE_THRESHOLD, JIRA_CIRCUIT_OPEN_SECS)
+        return _jira_circuit_breakers[host]
+
+# Connections to Jira are pooled per host and kept alive across warm invocations, so that only the first requests pay the TCP and TLS handshakes.
+# JIRA_POOL_MAXSIZE connections are kept per host, it should cover the records and callbacks processed concurrently.
+# A routed workflow gets one pool per Jira target, so a target saturated with slow requests does not hold the connections of the others.
+JIRA_POOL_MAXSIZE = int(os.environ.get('JIRA_POOL_MAXSIZE', 10))
+JIRA_CONNECT_TIMEOUT_SECS = float(os.environ.get('JIRA_CONNECT_TIMEOUT_SECS', 5))
+JIRA_READ_TIMEOUT_SECS = float(os.environ.get('JIRA_READ_TIMEOUT_SECS', 30))
+
+_jira_pool_managers = {}
+_jira_pool_managers_lock = threading.Lock()
+
+
+def get_jira_pool_manager(key, maxsize=None):
+    '''Returns the connection pool manager of a Jira host or target. The maximum size only applies when the pool manager is created.'''
+    with _jira_pool_managers_lock:
+        if key not in _jira_pool_managers:
+            _jira_pool_managers[key] = urllib3.PoolManager(
+                # Retry-After is honoured by the rate limiter, which caps its wait to the invocation deadline, not by sleeping in urllib3
+                retries=urllib3.Retry(total=URLLIB3_RETRIES, backoff_factor=URLLIB3_BACKOFF_FACTOR, respect_retry_after_header=False),
+                timeout=urllib3.Timeout(connect=JIRA_CONNECT_TIMEOUT_SECS, read=JIRA_READ_TIMEOUT_SECS),
+                maxsize=JIRA_POOL_MAXSIZE if maxsize is None else maxsize,
+                cert_reqs='CERT_REQUIRED', # endorce use of certificate
+                # you can add your certificate bundle if requireed
+            )
+        return _jira_pool_managers[key]
+
+
+class CircuitBreakerRetry(urllib3.Retry):
+    '''urllib3 retries reporting every failed attempt to a circuit breaker, instead of only the failure of the whole retry sequence.
+    The remaining retries are given up as soon as the breaker opens.'''
+    def __init__(self, *args, circuit_breaker=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker = circuit_breaker
+
+    def new(self, **kw):
+        return super().new(circuit_breaker=self.circuit_breaker, **kw)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if error is not None and self.circuit_breaker is not None:
+            remaining = remaining_secs()
+            # an attempt cut off by the invocation deadline says nothing about Jira
+            if (remaining is None or remaining > 0) and self.circuit_breaker.record_failure():
+                raise MaxRetryError(_pool, url, error) from error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def retries_within(secs):
+    '''Returns the number of urllib3 retries whose backoff sleeps all fit in the given number of seconds.'''
+    allowed, backoff = 0, 0.0
+    while allowed < URLLIB3_RETRIES:
+        # urllib3 does not sleep before the first retry, then backoff_factor * 2 ** (n - 1) before the n-th one
+        sleep = URLLIB3_BACKOFF_FACTOR * 2 ** allowed if allowed else 0
+        if backoff + sleep >= secs:
+            break
+        backoff += sleep
+        allowed += 1
+    return allowed
+
 # Create a class that implements the interface
 class JiraWorkflow(IExternalWorkflow):
-    def __init__(self, url, secret_arn, project_key, issue_type):
+    def __init__(self, url, secret_arn, project_key, issue_type, search_url=None, target_name=None, rate_limit_per_sec=None, rate_limit_burst=None, pool_maxsize=None):
+        '''Jira client for one project. A target_name gives the client the rate limiter and connection pool of that Jira target
+        instead of those shared by the Jira host, with the given rate, burst and pool size. The circuit breaker is always the one of the host.'''
         self.url = url
-        self.admin, token = self.__get_jira_creds(secret_arn)
+        self.search_url = search_url if search_url else urllib3.util.parse_url(url)._replace(path=JIRA_SEARCH_PATH, query=None).url
+        self.bulk_url = url.rstrip('/') + '/bulk'
+        self.secret_arn = secret_arn
+        host = urllib3.util.parse_url(url).host
+        self.rate_limiter = get_jira_rate_limiter(target_name or host, rate_limit_per_sec, rate_limit_burst)
+        self.circuit_breaker = get_jira_circuit_breaker(host)
+        self.http = get_jira_pool_manager(target_name or host, pool_maxsize)
+        self.admin, self.headers = self.__get_cached_credentials()
         self.project_key = project_key
         self.issue_type = issue_type
 
-        retries = urllib3.Retry(
-            total=URLLIB3_RETRIES, backoff_factor=URLLIB3_BACKOFF_FACTOR
-        )
-        self.http = urllib3.PoolManager(
-            retries=retries,
-        )
-        self.http = urllib3.PoolManager(
-            retries=retries,
-            cert_reqs='CERT_REQUIRED', # endorce use of certificate 
-            # you can add your certificate bundle if requireed 
-        )
-        
         """
         # certificate authentification
         # add the certificate if required (example: in case of a Jira instance on-premises)
         http = urllib3.PoolManager(
                 cert_reqs="CERT_REQUIRED", key_file=key_file, cert_file=cert_file
         )"""
-        self.headers = self.__get_headers(self.admin, token)
+
+    def connection_pool_stats(self):
+        '''Returns the requests sent to the Jira host by this container so far, and how many of them needed a new connection.'''
+        pool = self.http.connection_from_url(self.url)
+        return {
+            'requests': pool.num_requests,
+            'new_connections': pool.num_connections,
+            'reused_connections': pool.num_requests - pool.num_connections,
+            'idle_connections': pool.pool.qsize() if pool.pool is not None else 0,
+        }
+
+    def __get_cached_credentials(self, rejected_headers=None):
+        '''Returns the Jira admin and auth headers, reading the secret only when the cached entry is missing, expired or was rejected by Jira.
+        Rejected credentials are read again at most once per JIRA_CREDENTIALS_TTL_SECS, until then the rejected headers are returned.'''
+        with _jira_credentials_lock:
+            now = time.monotonic()
+            cached = _jira_credentials_cache.get(self.secret_arn)
+            rejected_refresh_after = 0
+            if cached is not None:
+                if rejected_headers is None and cached[2] > now:
+                    return cached[0], cached[1]
+                if rejected_headers is not None and cached[1] is not rejected_headers:
+                    # another request already refreshed the credentials
+                    return cached[0], cached[1]
+                if rejected_headers is not None and cached[3] > now:
+                    # the secret was already read again after a 401 in this window and Jira still rejects it
+                    return cached[0], cached[1]
+                rejected_refresh_after = cached[3]
+
+            admin, token = self.__get_jira_creds(self.secret_arn)
+            headers = self.__get_headers(admin, token)
+            if rejected_headers is not None:
+                rejected_refresh_after = now + JIRA_CREDENTIALS_TTL_SECS
+            _jira_credentials_cache[self.secret_arn] = (admin, headers, now + JIRA_CREDENTIALS_TTL_SECS, rejected_refresh_after)
+            logger.info("Jira credentials read from Secrets Manager and cached.")
+            return admin, headers
+
+    def __request(self, operation, method, url, **kwargs):
+        '''Sends a request to Jira. If Jira answers 401 the secret may have been rotated, so credentials are read again and the request is sent one more time.
+        The 401 response is returned as is when the credentials were already read again recently.'''
+        response = self.__paced_request(operation, method, url, **kwargs)
+        if response.status == 401:
+            rejected_headers = self.headers
+            self.admin, self.headers = self.__get_cached_credentials(rejected_headers=rejected_headers)
+            if self.headers is rejected_headers:
+                logger.warning("Jira responded with 401. The credentials were already refreshed within %ss, not retrying.", JIRA_CREDENTIALS_TTL_SECS)
+                return response
+            logger.warning("Jira responded with 401. Refreshed the cached credentials, retrying once.")
+            response = self.__paced_request(operation, method, url, **kwargs)
+        return response
+
+    def __paced_request(self, operation, method, url, **kwargs):
+        allowed, probe = self.circuit_breaker.acquire()
+        if not allowed:
+            raise ExternalWorkflowCircuitOpen(
+                f"Jira {operation} request not sent, Jira failed repeatedly. Next attempt in {self.circuit_breaker.retry_in_secs():.1f}s."
+            )
+        # None when the request is abandoned before Jira could answer, e.g. at the invocation deadline,
+        # or when its failed attempts were already reported to the breaker by the retries
+        reachable = None
+        try:
+            # within a lambda invocation, the wait for the rate limiter, the request and its retries must end before the invocation deadline
+            waited = self.rate_limiter.acquire(remaining_secs())
+            if waited > 0:
+                logger.info("Rate limiter delayed Jira %s request by %.3fs.", method, waited)
+            remaining = remaining_secs()
+            retries = URLLIB3_RETRIES
+            if remaining is not None:
+                if remaining <= 0:
+                    raise InvocationDeadlineExceeded(f"No time left in the invocation to send Jira {operation} request.")
+                kwargs["timeout"] = urllib3.Timeout(connect=JIRA_CONNECT_TIMEOUT_SECS, read=JIRA_READ_TIMEOUT_SECS, total=remaining)
+                retries = retries_within(remaining)
+            if probe:
+                # the probe of a half-open breaker tells quickly whether Jira is back
+                retries = 0
+            kwargs["retries"] = CircuitBreakerRetry(
+                total=retries, backoff_factor=URLLIB3_BACKOFF_FACTOR, respect_retry_after_header=False, circuit_breaker=self.circuit_breaker
+            )
+            with record_call("Jira", operation) as call:
+                call.add_metric("RateLimiterWait", waited * 1000, "Milliseconds")
+                try:
+                    response = self.http.request(method, url, headers=self.headers, **kwargs)
+                except JIRA_CONNECTION_ERRORS as err:
+                    if remaining is not None and remaining_secs() <= 0:
+                        raise InvocationDeadlineExceeded(f"Jira {operation} request did not complete before the invocation deadline. {err}") from err
+                    raise
+                call.from_http_response(response)
+            reachable = response.status < 500
+        finally:
+            self.circuit_breaker.release(probe, reachable)
+        self.rate_limiter.update_from_response(response.status, response.headers)
+        return response
 
     def __get_jira_creds(self, secret_arn):
 
         try:
-            secretsmanager_client = boto3.client("secretsmanager")
-            response = secretsmanager_client.get_secret_value(SecretId=secret_arn)
+            secretsmanager_client = get_client("secretsmanager")
+            with record_call("SecretsManager", "GetSecretValue") as call:
+                response = secretsmanager_client.get_secret_value(SecretId=secret_arn)
+                call.from_boto3_response(response)
             secret = json.loads(response["SecretString"])
             jira_token = secret["Token"]
             admin = secret["Admin"]
@@ -100,62 +325,62 @@ class JiraWorkflow(IExternalWorkflow):
             headers.add("Authorization", f"Basic {credentials}")
             return headers
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.error("An unexpected error occurred: %s", e)
             return None
 
+    def __issue_fields(self, dz_subscription: DataZoneSubscription, assignee):
+        listings = dz_subscription.listings
+        summary = listings[0].name if len(listings) == 1 else f"{listings[0].name} and {len(listings) - 1} more listings"
+        # one label per distinct owner project, in the order of the listings
+        owner_project_names = list(dict.fromkeys(listing.owner_project_name for listing in listings))
+        return {
+            "project": {"key": self.project_key},
+            "assignee": {"id": assignee},
+            "summary": "DataZone Subscription Request Created for "
+            + summary,
+            "description": "{*}Request type:{*} DataZone Subscription Request Created on "
+            + "{*}domain Id:{*} "
+            + dz_subscription.domain_id
+            + "\n \n {*}With request information{*} : \n{*}Request Id:{*} "
+            + dz_subscription.subscription_req_id
+            + " \n{*}Requester Details:{*} "
+            + dz_subscription.requester_details
+            + " \n{*}Requester Type:{*} "
+            + dz_subscription.requester_type
+            + " \n{*}Project subscriber:{*} "
+            + dz_subscription.project_name
+            + " \n{*}Request Date:{*}: "
+            + dz_subscription.request_date
+            + " \n{*}Request Reason:{*} "
+            + dz_subscription.request_reason
+            + f" \n\n{{*}}Details about target data ({len(listings)} listings):{{*}}  \n"
+            + "".join(self.__listing_description(position, listing) for position, listing in enumerate(listings, 1)),
+            "issuetype": {"id": self.issue_type},
+            "labels": owner_project_names + [self.__subscription_label(dz_subscription.subscription_req_id)],
+        }
+
+    def __listing_description(self, position, listing):
+        return (
+            f" \n{{*}}Listing {position}:{{*}} {listing.name}"
+            + f" \n{{*}}Target Data Type:{{*}} {listing.data_type}"
+            + f"\n{{*}}Data Technical Name:{{*}} {listing.table_tech_name}"
+            + f"\n{{*}}Data Table Arn:{{*}} {listing.table_arn}"
+            + f"\n{{*}}Data Database Name:{{*}} {listing.db_name}"
+            + f"\n{{*}}Data Bucket:{{*}} {listing.bucket_location}"
+            + f"\n{{*}}Data Project Name:{{*}} {listing.owner_project_name}\n"
+        )
+
     def create_issue(self, dz_subscription: DataZoneSubscription, assignee):
 
         url = self.url
         try:
-            payload = json.dumps(
-                {
-                    "fields": {
-                        "project": {"key": self.project_key},
-                        "assignee": {"id": assignee},
-                        "summary": "DataZone Subscription Request Created for "
-                        + dz_subscription.table_catalog_name,
-                        "description": "{*}Request type:{*} DataZone Subscription Request Created on "
-                        + "{*}domain Id:{*} "
-                        + dz_subscription.domain_id
-                        + "\n \n {*}With request information{*} : \n{*}Request Id:{*} "
-                        + dz_subscription.subscription_req_id
-                        + " \n{*}Requester Details:{*} "
-                        + dz_subscription.requester_details
-                        + " \n{*}Requester Type:{*} "
-                        + dz_subscription.requester_type
-                        + " \n{*}Project subscriber:{*} "
-                        + dz_subscription.project_name
-                        + " \n{*}Request Date:{*}: "
-                        + dz_subscription.request_date
-                        + " \n{*}Request Reason:{*} "
-                        + dz_subscription.request_reason
-                        + " \n\n{*}Details about target data:{*}  \n"
-                        + " \n{*}Target Data Type:{*} "
-                        + dz_subscription.data_type
-                        + "\n{*}Data Technical Name:{*} "
-                        + dz_subscription.table_tech_name
-                        + "\n{*}Data Table Arn:{*} "
-                        + dz_subscription.table_arn
-                        + "\n{*}Data Database Name:{*} "
-                        + dz_subscription.db_name
-                        + "\n{*}Data Bucket:{*} "
-                        + dz_subscription.bucket_location
-                        + "\n{*}Data Project Name:{*} "
-                        + dz_subscription.owner_project_name,
-                        "issuetype": {"id": self.issue_type},
-                        "labels": [dz_subscription.owner_project_name],
-                    }
-                }
-            )
-
-            http = self.http
-            headers = self.headers
+            payload = json.dumps({"fields": self.__issue_fields(dz_subscription, assignee)})
 
-            response = http.request("POST", url, body=payload, headers=headers)
+            response = self.__request("CreateIssue", "POST", url, body=payload)
 
             if response.status == 201:
                 json_data = json.loads(response.data.decode("utf-8"))
-                logger.info(f"Created new issue. Issue key: {json_data['key']}")
+                logger.info("Created new issue. Issue key: %s", json_data['key'])
                 return json_data["key"]
             elif response.status == 400:
                 # put metric for data access request
@@ -178,36 +403,94 @@ class JiraWorkflow(IExternalWorkflow):
                 raise ExternalWorkflowRespondedWithNOK(
                     f"Error. Could not create a jira issue. Server responded with {response.status}."
                 )
-        except MaxRetryError as err:
-            logger.error(f"Jira request failed. MaxRetryError Exception {err}")
+        except JIRA_CONNECTION_ERRORS as err:
+            logger.error("Jira request failed. %s Exception %s", type(err).__name__, err)
             raise ExternalWorkflowNotReachable
         except Exception as e:
             logger.error(
-                f"create_issue(). General exception during issue creation: {e}.")
+                "create_issue(). General exception during issue creation: %s.", e)
             raise e
             # return 'PROBLEM IN EXECUTING ISSUE CREATION'
 
+    def create_issues(self, subscriptions):
+        '''Creates the issues of several subscriptions with Jira's bulk create endpoint, JIRA_BULK_CREATE_MAX_ISSUES per request.
+        A single subscription is created with the regular create endpoint.'''
+        if len(subscriptions) == 1:
+            return super().create_issues(subscriptions)
+
+        results = []
+        for i in range(0, len(subscriptions), JIRA_BULK_CREATE_MAX_ISSUES):
+            chunk = subscriptions[i:i + JIRA_BULK_CREATE_MAX_ISSUES]
+            try:
+                results.extend(self.__bulk_create_issues(chunk))
+            except ExternalWorkflowRespondedWithNOK as e:
+                # the whole request was refused, e.g. unauthorized
+                results.extend([e] * len(chunk))
+        return results
+
+    def __bulk_create_issues(self, subscriptions):
+        try:
+            payload = json.dumps({
+                "issueUpdates": [{"fields": self.__issue_fields(dz_subscription, assignee)} for dz_subscription, assignee in subscriptions]
+            })
+
+            response = self.__request("BulkCreateIssues", "POST", self.bulk_url, body=payload)
+
+            if response.status in (201, 400):
+                # Jira creates the valid issues and reports the others by their position in the request, 400 means that none was created.
+                # The created issues are listed in request order.
+                response_json = json.loads(response.data.decode("utf-8"))
+                errors = {error.get("failedElementNumber"): error for error in response_json.get("errors", [])}
+                if response.status == 400 and not errors:
+                    raise ExternalWorkflowRespondedWithNOK(
+                        f"Error. Could not create jira issues. Server responded with {response.status}. Bad request. {response_json.get('errorMessages')}"
+                    )
+
+                created_issues = iter(response_json.get("issues", []))
+                results = []
+                for position in range(len(subscriptions)):
+                    if position in errors:
+                        results.append(ExternalWorkflowRespondedWithNOK(
+                            f"Error. Could not create a jira issue. Server responded with {errors[position].get('status')}. {errors[position].get('elementErrors')}"
+                        ))
+                        continue
+                    issue = next(created_issues, None)
+                    if issue is None:
+                        results.append(ExternalWorkflowRespondedWithNOK("Error. Could not create a jira issue. The issue is missing from the bulk create response."))
+                    else:
+                        results.append(issue["key"])
+                logger.info("Created %s new issues in bulk, %s failed.", len(subscriptions) - len(errors), len(errors))
+                return results
+            elif response.status == 401:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not create jira issues. Server responded with {response.status}. Unauthorized. The authentication credentials are incorrect or missing."
+                )
+            elif response.status == 403:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not create jira issues. Server responded with {response.status}. Forbidden. The user does not have the necessary permission to create a ticket."
+                )
+            elif response.status == 429:
+                raise ExternalWorkflowNotReachable(
+                    f"Error. Could not create jira issues. Server responded with {response.status}. Jira Rate Limit Response."
+                )
+            else:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not create jira issues. Server responded with {response.status}."
+                )
+        except JIRA_CONNECTION_ERRORS as err:
+            logger.error("Jira request failed. %s Exception %s", type(err).__name__, err)
+            raise ExternalWorkflowNotReachable
+
     def get_issue_status(self, issue_key):
         try:
             url = self.url + issue_key
             approval_status = None
             approver = None
 
-            http = self.http
-            headers = self.headers
-
-            response = http.request("GET", url, headers=headers)
-            print(f"response status {response.status}")
+            response = self.__request("GetIssue", "GET", url, fields={"fields": JIRA_STATUS_FIELDS})
+            logger.debug("Jira responded with status %s.", response.status)
             if response.status == 200:
-                response_json = json.loads(response.data)
-                approval_status = (
-                    response_json.get("fields", {}).get("status", {}).get("name", None)
-                )
-                approver = (
-                    response_json.get("fields", {})
-                    .get("assignee", {})
-                    .get("displayName", None)
-                )
+                approval_status, approver, _ = self.__get_status_from_issue(json.loads(response.data))
 
             elif response.status == 401:
                 raise ExternalWorkflowRespondedWithNOK(
@@ -218,9 +501,13 @@ class JiraWorkflow(IExternalWorkflow):
                     f"Error. Could not get issue. Server responded with {response.status}. Not Found. Returned if the issue is not found or the user does not have permission to view it."
                 )
             elif response.status == 429:
-                raise ExternalWorkflowRespondedWithNOK(
+                raise ExternalWorkflowNotReachable(
                     f"Error. Could not get issue. Server responded with {response.status}. Jira Rate Limit Response."
                 )
+            elif response.status >= 500:
+                raise ExternalWorkflowNotReachable(
+                    f"Error. Could not get issue. Server responded with {response.status}. Jira is unavailable."
+                )
             else:
                 raise ExternalWorkflowRespondedWithNOK(
                     f"Error. Could not create a jira issue. Server responded with {response.status}."
@@ -228,6 +515,108 @@ class JiraWorkflow(IExternalWorkflow):
 
             return approval_status, approver
 
-        except MaxRetryError as err:
-            logger.error(f"Jira request failed. MaxRetryError Exception {err}")
+        except JIRA_CONNECTION_ERRORS as err:
+            logger.error("Jira request failed. %s Exception %s", type(err).__name__, err)
+            raise ExternalWorkflowNotReachable
+
+    def __get_status_from_issue(self, issue, known_updated=None):
+        '''Returns the IssueStatus of an issue resource, or IssueUnchanged when it was not updated since known_updated. Unassigned issues have no approver.'''
+        issue_fields = issue.get("fields") or {}
+        updated = issue_fields.get("updated")
+        if updated is not None and updated == known_updated:
+            return IssueUnchanged(updated)
+        approval_status = (issue_fields.get("status") or {}).get("name", None)
+        approver = (issue_fields.get("assignee") or {}).get("displayName", None)
+        return IssueStatus(approval_status, approver, updated)
+
+    def __subscription_label(self, subscription_req_id):
+        return f"{JIRA_SUBSCRIPTION_LABEL_PREFIX}{subscription_req_id}"
+
+    def find_issue(self, subscription_req_id):
+        '''Returns the key of the issue labelled with the subscription request id, or None.
+        Jira indexes new issues asynchronously, an issue created a few seconds earlier may not be found yet.'''
+        try:
+            fields = {
+                "jql": f'project = "{self.project_key}" AND labels = "{self.__subscription_label(subscription_req_id)}" ORDER BY created ASC',
+                "fields": "created",
+                "maxResults": "1",
+            }
+
+            response = self.__request("FindIssue", "GET", self.search_url, fields=fields)
+            if response.status == 200:
+                issues = json.loads(response.data).get("issues", [])
+                return issues[0]["key"] if issues else None
+            elif response.status == 429:
+                # without the lookup a duplicate issue could be created, retry later instead
+                raise ExternalWorkflowNotReachable(
+                    f"Error. Could not search issue of subscription request {subscription_req_id}. Server responded with {response.status}. Jira Rate Limit Response."
+                )
+            else:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not search issue of subscription request {subscription_req_id}. Server responded with {response.status}."
+                )
+
+        except JIRA_CONNECTION_ERRORS as err:
+            logger.error("Jira request failed. %s Exception %s", type(err).__name__, err)
+            raise ExternalWorkflowNotReachable
+
+    def get_issues_status(self, issue_keys, issues_updated=None):
+        '''Returns the statuses of the issues with one JQL search per JIRA_SEARCH_MAX_RESULTS issues.
+        When Jira refuses a search, e.g. because one of the keys does not exist anymore, the issues of that search are fetched one by one.'''
+        issues_status = {}
+        issue_keys = list(dict.fromkeys(issue_keys))
+        for i in range(0, len(issue_keys), JIRA_SEARCH_MAX_RESULTS):
+            chunk = issue_keys[i:i + JIRA_SEARCH_MAX_RESULTS]
+            try:
+                issues_status.update(self.__search_issues_status(chunk, issues_updated or {}))
+            except ExternalWorkflowRespondedWithNOK as e:
+                logger.warning("get_issues_status(). %s Getting the status of the %s issues one by one.", e, len(chunk))
+                issues_status.update(super().get_issues_status(chunk))
+        return issues_status
+
+    def __search_issues_status(self, issue_keys, issues_updated):
+        try:
+            fields = {
+                "jql": f"key in ({','.join(issue_keys)})",
+                "fields": JIRA_SEARCH_STATUS_FIELDS,
+                "maxResults": str(len(issue_keys)),
+            }
+
+            response = self.__request("SearchIssues", "GET", self.search_url, fields=fields)
+            logger.debug("Jira responded with status %s.", response.status)
+            if response.status == 200:
+                response_json = json.loads(response.data)
+                issues_status = {}
+                for issue in response_json.get("issues", []):
+                    issues_status[issue["key"]] = self.__get_status_from_issue(issue, issues_updated.get(issue["key"]))
+
+                missing_keys = set(issue_keys) - set(issues_status)
+                if missing_keys:
+                    logger.warning("Issues not found or not visible to the Jira user: %s", sorted(missing_keys))
+                return issues_status
+
+            elif response.status == 400:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not search issues. Server responded with {response.status}. Bad request. The JQL query is invalid."
+                )
+            elif response.status == 401:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not search issues. Server responded with {response.status}. Unauthorized. The authentication credentials are incorrect or missing."
+                )
+            elif response.status == 429:
+                # the search answers for the whole batch, keep its records in the queue instead of failing all of them
+                raise ExternalWorkflowNotReachable(
+                    f"Error. Could not search issues. Server responded with {response.status}. Jira Rate Limit Response."
+                )
+            elif response.status >= 500:
+                raise ExternalWorkflowNotReachable(
+                    f"Error. Could not search issues. Server responded with {response.status}. Jira is unavailable."
+                )
+            else:
+                raise ExternalWorkflowRespondedWithNOK(
+                    f"Error. Could not search issues. Server responded with {response.status}."
+                )
+
+        except JIRA_CONNECTION_ERRORS as err:
+            logger.error("Jira request failed. %s Exception %s", type(err).__name__, err)
             raise ExternalWorkflowNotReachable
@@ -17,13 +17,12 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-import logging
 
-from external_workflow import IExternalWorkflow
+from external_workflow import IExternalWorkflow, IssueStatus
 from data_zone_subscription import DataZoneSubscription
+from structured_logging import get_logger
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
 
 class MockTestWorkflow(IExternalWorkflow):
@@ -32,12 +31,17 @@ class MockTestWorkflow(IExternalWorkflow):
         self.accept = accept
 
     def create_issue(self, dz_subscription: DataZoneSubscription, assignee):
-        logger.info(f"Mock Test Workflow: create_issue for assignee {assignee}")
+        logger.info("Mock Test Workflow: create_issue for assignee %s", assignee)
 
         return 'IssueId1234567'
 
 
     def get_issue_status(self, issue_key):
-        logger.info(f"Mock Test Workflow: get_issue_status for issue_key {issue_key}")
+        logger.info("Mock Test Workflow: get_issue_status for issue_key %s", issue_key)
 
         return ('Accepted' if self.accept else 'Rejected', 'assignee')
+
+    def get_issues_status(self, issue_keys, issues_updated=None):
+        logger.info("Mock Test Workflow: get_issues_status for issue_keys %s", issue_keys)
+
+        return {issue_key: IssueStatus('Accepted' if self.accept else 'Rejected', 'assignee') for issue_key in issue_keys}
@@ -0,0 +1,66 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Computes how long the step function waits before polling an issue again.
+Issues with recent activity are polled every POLLING_MIN_SECONDS. The interval doubles for every POLLING_BACKOFF_STEP_SECONDS
+without a status change, is multiplied by POLLING_OFF_HOURS_FACTOR outside business hours, and never exceeds POLLING_MAX_SECONDS.
+"""
+import os
+from datetime import datetime, timezone
+
+POLLING_MIN_SECONDS = int(os.environ.get('POLLING_MIN_SECONDS', 60))
+POLLING_MAX_SECONDS = int(os.environ.get('POLLING_MAX_SECONDS', 3600))
+POLLING_BACKOFF_STEP_SECONDS = int(os.environ.get('POLLING_BACKOFF_STEP_SECONDS', 3600))
+# Business hours in UTC, as "<first hour>-<last hour>"
+POLLING_BUSINESS_HOURS = os.environ.get('POLLING_BUSINESS_HOURS', '7-19')
+POLLING_OFF_HOURS_FACTOR = int(os.environ.get('POLLING_OFF_HOURS_FACTOR', 4))
+
+# Caps the exponent, the interval is bounded by POLLING_MAX_SECONDS long before
+MAX_BACKOFF_DOUBLINGS = 16
+
+
+def is_business_hour(now):
+    first_hour, last_hour = (int(hour) for hour in POLLING_BUSINESS_HOURS.split('-'))
+    return first_hour <= now.hour <= last_hour
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def recommend_next_poll_seconds(issue_created_at=None, status_changed_at=None, now=None):
+    '''Returns the number of seconds to wait before the next poll, from the ISO 8601 timestamps of issue creation and last status change.'''
+    if now is None:
+        now = datetime.now(timezone.utc)
+
+    activity = [timestamp for timestamp in (parse_timestamp(issue_created_at), parse_timestamp(status_changed_at)) if timestamp]
+    idle_secs = max(0.0, (now - max(activity)).total_seconds()) if activity else 0.0
+
+    doublings = min(int(idle_secs // POLLING_BACKOFF_STEP_SECONDS), MAX_BACKOFF_DOUBLINGS)
+    next_poll_seconds = POLLING_MIN_SECONDS * 2 ** doublings
+    if not is_business_hour(now):
+        next_poll_seconds *= POLLING_OFF_HOURS_FACTOR
+
+    return max(POLLING_MIN_SECONDS, min(POLLING_MAX_SECONDS, next_poll_seconds))
@@ -0,0 +1,144 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Defines a token bucket rate limiter pacing the requests sent to an external workflow API.
+The rate adapts to the rate limit headers returned by the API (Retry-After, X-RateLimit-Remaining, X-RateLimit-Reset).
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from exceptions import InvocationDeadlineExceeded
+from structured_logging import get_logger
+
+logger = get_logger()
+
+# Fraction of the configured rate given back after each response without rate limit headers.
+RATE_RECOVERY_STEP = 0.1
+
+
+class TokenBucketRateLimiter:
+    '''Paces requests with a token bucket. The refill rate is lowered when the API signals throttling and recovers progressively afterwards.'''
+    def __init__(self, rate_per_sec, burst, min_rate_per_sec, max_rate_per_sec) -> None:
+        self.configured_rate = rate_per_sec
+        self.rate = rate_per_sec
+        self.min_rate = min_rate_per_sec
+        self.max_rate = max_rate_per_sec
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+        self.acquired_count = 0
+        self.throttled_count = 0
+        self.total_wait_secs = 0.0
+
+    def acquire(self, max_wait_secs=None):
+        '''Blocks until a request may be sent. Returns the number of seconds spent waiting.
+        Raises InvocationDeadlineExceeded without waiting when the request could not be sent within max_wait_secs, e.g. after a long Retry-After.'''
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.__refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.acquired_count += 1
+                        self.total_wait_secs += waited
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            if max_wait_secs is not None and waited + wait > max_wait_secs:
+                raise InvocationDeadlineExceeded(f"Rate limiter would delay the request by {waited + wait:.2f}s, only {max(0.0, max_wait_secs):.2f}s left.")
+            time.sleep(wait)
+            waited += wait
+
+    def update_from_response(self, status, headers):
+        '''Adapts the rate to the response of the API. A 429 or a Retry-After header halves the rate and blocks all requests until the API allows them again.
+        X-RateLimit-Remaining and X-RateLimit-Reset spread the remaining quota over the time left until the quota resets.'''
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_in = parse_rate_limit_reset(headers.get('X-RateLimit-Reset'))
+
+        with self.lock:
+            now = time.monotonic()
+            if status == 429 or retry_after is not None:
+                self.throttled_count += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = 0.0
+                self.blocked_until = max(self.blocked_until, now + (retry_after if retry_after is not None else 1 / self.rate))
+                logger.warning("Rate limited by the API. Blocking requests for %.2fs, rate lowered to %.3f req/s.", self.blocked_until - now, self.rate)
+            elif remaining is not None and remaining.isdigit() and reset_in is not None and reset_in > 0:
+                remaining = int(remaining)
+                if remaining == 0:
+                    self.tokens = 0.0
+                    self.blocked_until = max(self.blocked_until, now + reset_in)
+                else:
+                    self.rate = min(self.max_rate, max(self.min_rate, remaining / reset_in))
+            elif self.rate < self.configured_rate:
+                self.rate = min(self.configured_rate, self.rate + self.configured_rate * RATE_RECOVERY_STEP)
+
+    def stats(self):
+        '''Returns counters describing how the limiter paced the requests so far.'''
+        with self.lock:
+            return {
+                'rate_per_sec': round(self.rate, 3),
+                'acquired': self.acquired_count,
+                'throttled': self.throttled_count,
+                'total_wait_secs': round(self.total_wait_secs, 3),
+            }
+
+    def __refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+
+def parse_retry_after(value):
+    '''Parses a Retry-After header given either in seconds or as an HTTP date. Returns seconds to wait or None.'''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        logger.warning("Ignoring unparsable Retry-After header %s", value)
+        return None
+
+
+def parse_rate_limit_reset(value):
+    '''Parses a X-RateLimit-Reset header given either as an ISO 8601 timestamp (Jira Cloud) or as epoch seconds. Returns seconds until reset or None.'''
+    if not value:
+        return None
+    try:
+        if value.isdigit():
+            reset_at = datetime.fromtimestamp(int(value), timezone.utc)
+        else:
+            reset_at = datetime.fromisoformat(value)
+            if reset_at.tzinfo is None:
+                reset_at = reset_at.replace(tzinfo=timezone.utc)
+        return (reset_at - datetime.now(timezone.utc)).total_seconds()
+    except (OverflowError, ValueError):
+        logger.warning("Ignoring unparsable X-RateLimit-Reset header %s", value)
+        return None
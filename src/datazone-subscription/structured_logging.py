@@ -0,0 +1,162 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Logging configuration shared by the handlers: one compact JSON object per log line.
+
+Each line carries the correlation ids of the work in progress: the lambda request id, and the SQS message id, subscription request id
+and issue key of the record being processed. They are set with correlation_scope and follow the record into its asyncio task
+and into the threads started with a copied context.
+
+Lines are sampled per level with LOG_SAMPLE_RATES, e.g. "INFO=0.1,DEBUG=0.01". A dropped line is never formatted:
+the message arguments are only rendered, then redacted, for the lines that are written.
+Task tokens, Jira credentials and AWS credentials are masked in every line, exception tracebacks included.
+Full events and payloads are logged at DEBUG level only, set LOG_LEVEL=DEBUG to see them.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+
+# Libraries logging their requests and responses at DEBUG level, headers and signatures included
+QUIET_LIBRARIES = ('botocore', 'boto3', 'urllib3', 's3transfer')
+
+REDACTED = '***'
+SECRET_KEYS = (
+    'TaskToken|taskToken|task_token|callback_token|Token|token|SecretString|Authorization|authorization'
+    '|password|AccessKeyId|SecretAccessKey|SessionToken'
+)
+# 'key': 'value' and "key": "value", as in the repr of a dict or in JSON
+QUOTED_SECRET = re.compile(rf'''(['"](?:{SECRET_KEYS})['"]\s*:\s*)(['"])(?:\\.|(?!\2).)*\2''')
+# key=value, as in a log message or a query string
+ASSIGNED_SECRET = re.compile(rf'''\b((?:{SECRET_KEYS})=)[^\s,;&'")]+''')
+BASIC_CREDENTIALS = re.compile(r'\b(Basic|Bearer)\s+[A-Za-z0-9+/=._-]{8,}')
+
+_correlation_ids = contextvars.ContextVar('correlation_ids', default={})
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def redact(text):
+    '''Masks the values of the task tokens and credentials found in the text.'''
+    text = QUOTED_SECRET.sub(rf'\1\2{REDACTED}\2', text)
+    text = ASSIGNED_SECRET.sub(rf'\1{REDACTED}', text)
+    return BASIC_CREDENTIALS.sub(rf'\1 {REDACTED}', text)
+
+
+def parse_sample_rates(value):
+    '''Parses "LEVEL=rate,..." into rates by level number. Levels without a rate are always logged.'''
+    rates = {}
+    for item in filter(None, (item.strip() for item in value.split(','))):
+        level, _, rate = item.partition('=')
+        level_number = logging.getLevelName(level.strip().upper())
+        if not isinstance(level_number, int):
+            raise ValueError(f"Unknown log level {level} in LOG_SAMPLE_RATES.")
+        rates[level_number] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    '''Keeps a random share of the lines of each level. Runs before the line is formatted.'''
+    def __init__(self, rates) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    '''Formats a line as compact JSON with its correlation ids, the message and traceback redacted.'''
+    def format(self, record):
+        line = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'message': redact(record.getMessage()),
+        }
+        # the lambda runtime adds the request id to the lines it handles, outside a correlation scope too
+        aws_request_id = getattr(record, 'aws_request_id', None)
+        if aws_request_id:
+            line['aws_request_id'] = aws_request_id
+        line.update(_correlation_ids.get())
+        if record.levelno >= logging.WARNING:
+            line['location'] = f'{record.module}:{record.lineno}'
+        if record.exc_info:
+            line['exception'] = redact(self.formatException(record.exc_info))
+        return json.dumps(line, separators=(',', ':'), default=str)
+
+
+def configure_logging(logger):
+    '''Sets the level, JSON format and sampling of the handlers of the root logger, adding one to stdout if there is none.'''
+    logger.setLevel(LOG_LEVEL)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler(sys.stdout))
+    sampling_filter = SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES))
+    for handler in logger.handlers:
+        handler.setFormatter(JsonFormatter())
+        # on the handlers so that the lines of the library loggers are sampled too
+        handler.addFilter(sampling_filter)
+    for library in QUIET_LIBRARIES:
+        logging.getLogger(library).setLevel(max(logging.INFO, logger.level))
+
+
+def get_logger():
+    '''Returns the root logger, configured on first use. Every module logs through it.'''
+    global _configured
+    logger = logging.getLogger()
+    with _configure_lock:
+        if not _configured:
+            configure_logging(logger)
+            _configured = True
+    return logger
+
+
+@contextmanager
+def correlation_scope(**correlation_ids):
+    '''Adds the given correlation ids to the lines logged in the block. Ids set to None are left out.'''
+    token = _correlation_ids.set({**_correlation_ids.get(), **{name: value for name, value in correlation_ids.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _correlation_ids.reset(token)
+
+
+def add_correlation_ids(**correlation_ids):
+    '''Adds correlation ids learnt while processing, e.g. the key of a created issue, until the end of the enclosing scope.'''
+    _correlation_ids.set({**_correlation_ids.get(), **{name: value for name, value in correlation_ids.items() if value is not None}})
+
+
+def log_invocation(lambda_handler):
+    '''Decorates a lambda handler to tag every line of the invocation with its request id.'''
+    @functools.wraps(lambda_handler)
+    def wrapper(event, context):
+        with correlation_scope(aws_request_id=getattr(context, 'aws_request_id', None)):
+            return lambda_handler(event, context)
+    return wrapper
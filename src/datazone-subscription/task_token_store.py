@@ -0,0 +1,62 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Defines the stores keeping the step function task tokens waiting for an issue to be resolved.
+The resilient handler parks the task token of a pending issue, the Jira webhook handler completes the task when the issue changes.
+"""
+import json
+
+from ttl_store import ITtlStore, InMemoryTtlStore, SqliteTtlStore, DynamoDbTtlStore
+
+
+class TaskTokenStore():
+    '''Stores one waiting step function task token per issue key, together with the payload of the task, in a TTL store keyed by issue key.'''
+    def __init__(self, ttl_store: ITtlStore) -> None:
+        self.ttl_store = ttl_store
+
+    def put(self, issue_key, task_token, payload, ttl_secs):
+        '''Stores the task token waiting for the issue. Replaces any token previously stored for the issue. The entry expires after ttl_secs.'''
+        self.ttl_store.put(issue_key, {'task_token': task_token, 'payload': json.dumps(payload)}, ttl_secs)
+
+    def pop(self, issue_key):
+        '''Removes and returns a tuple of task token and payload stored for the issue, or None if no unexpired token is stored.
+        Only one of concurrent pops for the same issue gets the token, so two webhook deliveries can not complete the same task twice.'''
+        entry = self.ttl_store.pop(issue_key)
+        if entry is None:
+            return None
+        return entry['task_token'], json.loads(entry['payload'])
+
+
+class InMemoryTaskTokenStore(TaskTokenStore):
+    '''Keeps the task tokens in the memory of the process. Only for local testing, tokens are lost with the container.'''
+    def __init__(self) -> None:
+        super().__init__(InMemoryTtlStore())
+
+
+class SqliteTaskTokenStore(TaskTokenStore):
+    '''Keeps the task tokens in a local SQLite database. Stand-in for the DynamoDB store when testing locally with several processes.'''
+    def __init__(self, db_path) -> None:
+        super().__init__(SqliteTtlStore(db_path, 'task_tokens', 'issue_key', ['task_token', 'payload']))
+
+
+class DynamoDbTaskTokenStore(TaskTokenStore):
+    '''Keeps the task tokens in a DynamoDB table with partition key issue_key and TTL attribute expires_at.'''
+    def __init__(self, table_name) -> None:
+        super().__init__(DynamoDbTtlStore(table_name, 'issue_key'))
@@ -0,0 +1,157 @@
+"""
+MIT No Attribution
+
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+"""
+Defines the key-value stores with expiring entries behind the idempotency store and the task token store.
+Each entry maps a key to a dict of string attributes. Expired entries are never returned, whether or not the backend has deleted them yet.
+"""
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+
+from aws_clients import get_client
+
+
+class ITtlStore():
+    '''Stores a dict of string attributes per key, until the entry expires.'''
+    @abstractmethod
+    def get(self, key):
+        '''Returns the attributes stored for the key, or None if no unexpired entry is stored.'''
+        pass
+
+    @abstractmethod
+    def put(self, key, attributes, ttl_secs):
+        '''Stores the attributes for the key. Replaces any entry previously stored for the key. The entry expires after ttl_secs.'''
+        pass
+
+    @abstractmethod
+    def pop(self, key):
+        '''Removes and returns the attributes stored for the key, or None if no unexpired entry is stored.'''
+        pass
+
+
+class InMemoryTtlStore(ITtlStore):
+    '''Keeps the entries in the memory of the process, they are lost with the container.'''
+    def __init__(self) -> None:
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        return self.__unexpired(entry)
+
+    def put(self, key, attributes, ttl_secs):
+        with self.lock:
+            self.entries[key] = (dict(attributes), time.time() + ttl_secs)
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return self.__unexpired(entry)
+
+    def __unexpired(self, entry):
+        if entry is None or entry[1] <= time.time():
+            return None
+        return dict(entry[0])
+
+
+class SqliteTtlStore(ITtlStore):
+    '''Keeps the entries in a table of a local SQLite database, one TEXT column per attribute.
+    Stand-in for the DynamoDB store when testing locally with several processes.'''
+    def __init__(self, db_path, table_name, key_name, attribute_names) -> None:
+        self.db_path = db_path
+        self.table_name = table_name
+        self.key_name = key_name
+        self.attribute_names = list(attribute_names)
+        columns = ''.join(f", {name} TEXT NOT NULL" for name in self.attribute_names)
+        with self.__connect() as connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name} ({key_name} TEXT PRIMARY KEY{columns}, expires_at REAL NOT NULL)"
+            )
+
+    def __connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key):
+        with self.__connect() as connection:
+            row = self.__select(connection, key)
+        return self.__unexpired(row)
+
+    def put(self, key, attributes, ttl_secs):
+        names = [self.key_name, *self.attribute_names, 'expires_at']
+        values = [key, *(attributes[name] for name in self.attribute_names), time.time() + ttl_secs]
+        with self.__connect() as connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.table_name} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})", values
+            )
+
+    def pop(self, key):
+        with self.__connect() as connection:
+            row = self.__select(connection, key)
+            connection.execute(f"DELETE FROM {self.table_name} WHERE {self.key_name} = ?", (key,))
+        return self.__unexpired(row)
+
+    def __select(self, connection, key):
+        return connection.execute(
+            f"SELECT {', '.join(self.attribute_names)}, expires_at FROM {self.table_name} WHERE {self.key_name} = ?", (key,)
+        ).fetchone()
+
+    def __unexpired(self, row):
+        if row is None or row[-1] <= time.time():
+            return None
+        return dict(zip(self.attribute_names, row))
+
+
+class DynamoDbTtlStore(ITtlStore):
+    '''Keeps the entries in a DynamoDB table with partition key key_name and TTL attribute expires_at, one string attribute per attribute.'''
+    def __init__(self, table_name, key_name) -> None:
+        self.table_name = table_name
+        self.key_name = key_name
+        self.dynamodb_client = get_client("dynamodb")
+
+    def get(self, key):
+        # an entry is often read right after it was written, e.g. on a redelivery, an eventually consistent read could miss it
+        response = self.dynamodb_client.get_item(
+            TableName=self.table_name,
+            Key={self.key_name: {'S': key}},
+            ConsistentRead=True
+        )
+        return self.__unexpired(response.get('Item'))
+
+    def put(self, key, attributes, ttl_secs):
+        item = {name: {'S': value} for name, value in attributes.items()}
+        item[self.key_name] = {'S': key}
+        item['expires_at'] = {'N': str(int(time.time() + ttl_secs))}
+        self.dynamodb_client.put_item(TableName=self.table_name, Item=item)
+
+    def pop(self, key):
+        # delete and read in one call, so two concurrent pops can not both get the entry
+        response = self.dynamodb_client.delete_item(
+            TableName=self.table_name,
+            Key={self.key_name: {'S': key}},
+            ReturnValues='ALL_OLD'
+        )
+        return self.__unexpired(response.get('Attributes'))
+
+    def __unexpired(self, item):
+        # DynamoDB deletes expired items lazily, expired items may still be returned
+        if item is None or int(item['expires_at']['N']) <= time.time():
+            return None
+        return {name: value['S'] for name, value in item.items() if name not in (self.key_name, 'expires_at')}